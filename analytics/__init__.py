@@ -0,0 +1,5 @@
+"""Python analytics tooling for the claims extracts.
+
+Shares its CSV parsing with the validation suite in tests/ so that every tool
+agrees with the figures the tests codify.
+"""
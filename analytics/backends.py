@@ -0,0 +1,345 @@
+"""The core claim computations behind one small interface, with a pandas and a
+DuckDB implementation and a harness that checks they agree and times them.
+
+Every operation returns a small pandas DataFrame in a canonical order, so
+results from different engines compare directly. DuckDB is optional; install
+it with `pip install duckdb`.
+
+    python -m analytics.backends                       # every available backend
+    python -m analytics.backends --backend duckdb --repeat 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import (
+    CLAIMS_PATH, DRUGS_PATH, FLAGGED_NDCS, load_claims, load_drugs, merge_drugs,
+)
+from analytics.filters import claims_mask, parse_filters
+from analytics.parallel_csv import CLAIMS_SCHEMA, DRUGS_SCHEMA
+
+# May (Kryptonite), September (spike), November (dip) — see test_monthly_volumes.py
+ANOMALOUS_MONTHS = (5, 9, 11)
+
+
+class PandasBackend:
+    name = "pandas"
+
+    def load(self, claims_path=CLAIMS_PATH, drugs_path=DRUGS_PATH):
+        self.claims = load_claims(claims_path)
+        self.drugs = load_drugs(drugs_path)
+        return pd.DataFrame({"claims": [len(self.claims)], "drugs": [len(self.drugs)]})
+
+    def filtered(self, query=""):
+        """Row count and net claims for a dashboard filter query string."""
+        filters = parse_filters(query)
+        df = merge_drugs(self.claims, self.drugs) if filters.needs_drug_join else self.claims
+        matched = df.loc[claims_mask(df, filters), "NET_CLAIM_COUNT"]
+        return pd.DataFrame({"rows": [len(matched)], "net_claims": [matched.sum()]})
+
+    def join_coverage(self):
+        """Claim rows with and without a drug_info match, and the unmatched NDCs."""
+        matched = self.claims["NDC"].isin(self.drugs["NDC"])
+        return pd.DataFrame({
+            "matched_rows": [matched.sum()],
+            "unmatched_rows": [(~matched).sum()],
+            "unmatched_ndcs": [self.claims.loc[~matched, "NDC"].nunique()],
+        })
+
+    def group_reversals(self, state=None, month=None):
+        """Claims, reversals and reversal rate (%) per group."""
+        df = self.claims
+        if state:
+            df = df[df["PHARMACY_STATE"] == state]
+        if month:
+            df = df[df["MONTH"] == month]
+        grouped = (df["NET_CLAIM_COUNT"] == -1).groupby(df["GROUP_ID"], sort=True)
+        out = pd.DataFrame({"total": grouped.size(), "reversed": grouped.sum()})
+        out["rate"] = out["reversed"] / out["total"] * 100
+        return out.reset_index()
+
+    def monthly_baselines(self, by="PHARMACY_STATE"):
+        """Monthly claims per `by` value vs its normal-month average (flagged NDCs excluded)."""
+        real = self.claims[~self.claims["NDC"].isin(FLAGGED_NDCS)]
+        counts = real.groupby([by, "MONTH"], sort=True).size().rename("claims").reset_index()
+        normal = counts[~counts["MONTH"].isin(ANOMALOUS_MONTHS)]
+        baseline = (normal.groupby(by)["claims"].sum() / (12 - len(ANOMALOUS_MONTHS))).rename("baseline")
+        out = counts.join(baseline, on=by)
+        out["pct_vs_baseline"] = (out["claims"] / out["baseline"] - 1) * 100
+        return out
+
+
+_DUCKDB_TYPES = {"bool": "BOOLEAN", "int64": "BIGINT", "str": "VARCHAR"}
+
+
+def _columns(schema):
+    return "{" + ", ".join(f"'{c}': '{_DUCKDB_TYPES[t]}'" for c, t in schema.items()) + "}"
+
+
+def _literal(path):
+    return "'" + str(path).replace("'", "''") + "'"
+
+
+class DuckDBBackend:
+    """Same operations as SQL over an in-process DuckDB database."""
+
+    name = "duckdb"
+
+    def __init__(self, threads=None):
+        import duckdb
+
+        self.con = duckdb.connect(":memory:")
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+
+    def _frame(self, sql, params=()):
+        return self.con.execute(sql, list(params)).df()
+
+    def load(self, claims_path=CLAIMS_PATH, drugs_path=DRUGS_PATH):
+        self.con.execute(f"""
+            CREATE OR REPLACE TABLE claims AS
+            SELECT *, strptime(CAST(DATE_FILLED AS VARCHAR), '%Y%m%d')::DATE AS DATE,
+                   month(strptime(CAST(DATE_FILLED AS VARCHAR), '%Y%m%d')) AS MONTH
+            FROM read_csv({_literal(claims_path)}, delim='~', header=true, quote='',
+                          columns={_columns(CLAIMS_SCHEMA)})
+        """)
+        self.con.execute(f"""
+            CREATE OR REPLACE TABLE drugs AS
+            SELECT * FROM read_csv({_literal(drugs_path)}, delim='~', header=true, quote='',
+                                   columns={_columns(DRUGS_SCHEMA)})
+        """)
+        return self._frame("SELECT (SELECT count(*) FROM claims) AS claims, (SELECT count(*) FROM drugs) AS drugs")
+
+    def _where(self, filters):
+        clauses, params = ["TRUE"], []
+
+        def add(clause, value):
+            clauses.append(clause)
+            params.append(value)
+
+        if not filters.include_flagged_ndcs:
+            clauses.append(f"c.NDC NOT IN ({', '.join('?' * len(FLAGGED_NDCS))})")
+            params.extend(FLAGGED_NDCS)
+        if filters.formulary:
+            add("c.FORMULARY = ?", filters.formulary)
+        if filters.state:
+            add("c.PHARMACY_STATE = ?", filters.state)
+        if filters.group_id:
+            add("c.GROUP_ID = ?", filters.group_id)
+        if filters.ndc:
+            add("CAST(c.NDC AS VARCHAR) = ?", filters.ndc)
+        if filters.date_start:
+            add("c.DATE >= ?", filters.date_start)
+        if filters.date_end:
+            add("c.DATE <= ?", filters.date_end)
+        if filters.mony:
+            add("d.MONY = ?", filters.mony)
+        if filters.manufacturer:
+            add("d.MANUFACTURER_NAME = ?", filters.manufacturer)
+        if filters.drug:
+            add("d.DRUG_NAME = ?", filters.drug)
+        return " AND ".join(clauses), params
+
+    def filtered(self, query=""):
+        filters = parse_filters(query)
+        where, params = self._where(filters)
+        join = "LEFT JOIN drugs d ON c.NDC = d.NDC" if filters.needs_drug_join else ""
+        return self._frame(f"""
+            SELECT count(*) AS rows, coalesce(sum(c.NET_CLAIM_COUNT), 0) AS net_claims
+            FROM claims c {join} WHERE {where}
+        """, params)
+
+    def join_coverage(self):
+        return self._frame("""
+            SELECT count(*) FILTER (WHERE d.NDC IS NOT NULL) AS matched_rows,
+                   count(*) FILTER (WHERE d.NDC IS NULL) AS unmatched_rows,
+                   count(DISTINCT c.NDC) FILTER (WHERE d.NDC IS NULL) AS unmatched_ndcs
+            FROM claims c LEFT JOIN (SELECT DISTINCT NDC FROM drugs) d ON c.NDC = d.NDC
+        """)
+
+    def group_reversals(self, state=None, month=None):
+        return self._frame("""
+            SELECT GROUP_ID, count(*) AS total, count(*) FILTER (WHERE NET_CLAIM_COUNT = -1) AS reversed,
+                   reversed / total * 100 AS rate
+            FROM claims
+            WHERE (? IS NULL OR PHARMACY_STATE = ?) AND (? IS NULL OR MONTH = ?)
+            GROUP BY GROUP_ID ORDER BY GROUP_ID
+        """, [state, state, month, month])
+
+    def monthly_baselines(self, by="PHARMACY_STATE"):
+        if by not in CLAIMS_SCHEMA:
+            raise ValueError(f"Unknown column: {by}")
+        anomalous = ", ".join(str(m) for m in ANOMALOUS_MONTHS)
+        flagged = ", ".join(str(n) for n in FLAGGED_NDCS)
+        return self._frame(f"""
+            WITH counts AS (
+                SELECT {by}, MONTH, count(*) AS claims FROM claims
+                WHERE NDC NOT IN ({flagged}) GROUP BY {by}, MONTH
+            ),
+            baselines AS (
+                SELECT {by}, sum(claims) / {12 - len(ANOMALOUS_MONTHS)} AS baseline
+                FROM counts WHERE MONTH NOT IN ({anomalous}) GROUP BY {by}
+            )
+            SELECT c.{by}, c.MONTH, c.claims, b.baseline, (c.claims / b.baseline - 1) * 100 AS pct_vs_baseline
+            FROM counts c LEFT JOIN baselines b USING ({by})
+            ORDER BY c.{by}, c.MONTH
+        """)
+
+
+BACKENDS = {"pandas": PandasBackend, "duckdb": DuckDBBackend}
+
+# Operation name -> (method, args); "load" always runs first
+OPERATIONS = [
+    ("load", ()),
+    ("filtered", ("",)),
+    ("filtered", ("state=KS&dateStart=2021-08-01&dateEnd=2021-08-31",)),
+    ("filtered", ("formulary=OPEN&mony=N",)),
+    ("join_coverage", ()),
+    ("group_reversals", ("KS", 8)),
+    ("group_reversals", ()),
+    ("monthly_baselines", ("PHARMACY_STATE",)),
+    ("monthly_baselines", ("FORMULARY",)),
+]
+
+
+def available_backends():
+    """Names of backends whose engine is importable here."""
+    names = ["pandas"]
+    try:
+        import duckdb  # noqa: F401
+        names.append("duckdb")
+    except ImportError:
+        pass
+    return names
+
+
+class _PeakRSS:
+    """Samples resident memory in a background thread; peak growth in bytes (Linux only)."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+
+    @staticmethod
+    def _rss():
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    def __enter__(self):
+        self._stop = threading.Event()
+        try:
+            self._start = self._rss()
+        except OSError:
+            self._thread = None
+            self.peak = float("nan")
+            return self
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss() - self._start)
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, self._rss() - self._start)
+
+
+@dataclass(frozen=True)
+class Timing:
+    backend: str
+    operation: str
+    seconds: float       # best of `repeat`
+    python_peak: int     # tracemalloc peak (Python and numpy allocations)
+    rss_peak: float      # resident-set growth, catches native engines too
+    matches: bool        # same result as the reference backend
+
+
+def _label(method, args):
+    return f"{method}({', '.join(repr(a) for a in args)})"
+
+
+def _same(a, b):
+    a, b = a.reset_index(drop=True), b.reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, check_exact=False, rtol=1e-9)
+    except AssertionError:
+        return False
+    return True
+
+
+def _run(backend, method, args, repeat):
+    best, result, python_peak, rss_peak = np.inf, None, 0, 0.0
+    for _ in range(repeat):
+        tracemalloc.start()
+        with _PeakRSS() as rss:
+            started = time.perf_counter()
+            result = getattr(backend, method)(*args)
+            elapsed = time.perf_counter() - started
+        python_peak = max(python_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best, rss_peak = min(best, elapsed), max(rss_peak, rss.peak)
+    return result, best, python_peak, rss_peak
+
+
+def benchmark(names=None, operations=OPERATIONS, repeat=3, claims_path=CLAIMS_PATH, drugs_path=DRUGS_PATH):
+    """Timings for every operation on every backend; the first backend is the reference."""
+    names = names or available_backends()
+    reference, timings = {}, []
+    for name in names:
+        backend = BACKENDS[name]()
+        for method, args in operations:
+            if method == "load":
+                args = (claims_path, drugs_path)
+            label = _label(method, args if method != "load" else ())
+            result, seconds, python_peak, rss_peak = _run(backend, method, args, repeat)
+            matches = _same(result, reference[label]) if label in reference else True
+            reference.setdefault(label, result)
+            timings.append(Timing(name, label, seconds, python_peak, rss_peak, matches))
+    return timings
+
+
+def format_timings(timings):
+    """One row per operation, one column group per backend."""
+    frame = pd.DataFrame([t.__dict__ for t in timings])
+    frame["ms"] = (frame["seconds"] * 1000).round(1)
+    frame["py_MB"] = (frame["python_peak"] / 2**20).round(1)
+    frame["rss_MB"] = (frame["rss_peak"] / 2**20).round(1)
+    table = frame.pivot(index="operation", columns="backend", values=["ms", "py_MB", "rss_MB", "matches"])
+    order = list(dict.fromkeys(t.operation for t in timings))
+    table = table.reindex(order)
+    table.columns = [f"{backend} {metric}" for metric, backend in table.columns]
+    return table.to_string()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", action="append", choices=list(BACKENDS),
+                        help="Repeatable; the first is the reference (default: all available)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--claims", default=CLAIMS_PATH)
+    parser.add_argument("--drugs", default=DRUGS_PATH)
+    args = parser.parse_args(argv)
+
+    timings = benchmark(args.backend, repeat=args.repeat, claims_path=args.claims, drugs_path=args.drugs)
+    with pd.option_context("display.width", 200):
+        print(format_timings(timings))
+    mismatched = [f"{t.backend}: {t.operation}" for t in timings if not t.matches]
+    for m in mismatched:
+        print(f"MISMATCH {m}", file=sys.stderr)
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
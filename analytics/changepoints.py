@@ -0,0 +1,193 @@
+"""Level-shift detection over the daily claim series of every slice at once.
+
+Builds one (series × day) count matrix for all groups, states and formularies,
+removes the first-of-month cycle-fill spike, standardizes each row against its
+own robust baseline, and runs a two-sided tabular CUSUM over the whole matrix.
+The CUSUM recursion S_t = max(0, S_{t-1} + z_t - k) is evaluated in closed form
+as the cumulative sum minus its running minimum, so there is no per-series or
+per-day Python loop; each pass finds the next episode of every series at once.
+
+    python -m analytics.changepoints                # groups, states, formularies
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import exclude_flagged, load_claims
+
+DEFAULT_DIMENSIONS = ("GROUP_ID", "PHARMACY_STATE", "FORMULARY")
+
+# 1.4826 * MAD estimates the standard deviation of normally distributed data
+MAD_SCALE = 1.4826
+
+
+def daily_matrix(claims, dimensions=DEFAULT_DIMENSIONS, date_col="DATE"):
+    """Daily claim counts for every value of every dimension, stacked row-wise.
+
+    Each dimension is a column name or a tuple of column names (e.g.
+    ("ENTITY_ID", "GROUP_ID") for per-entity groups). Returns the series index
+    (dimension, key), the calendar of days, and an int64 (series × day) matrix.
+    """
+    days = pd.date_range(claims[date_col].min(), claims[date_col].max(), freq="D")
+    day_idx = (claims[date_col].to_numpy() - days[0].to_datetime64()) // np.timedelta64(1, "D")
+    n_days = len(days)
+
+    blocks, index = [], []
+    for dim in dimensions:
+        cols = list(dim) if isinstance(dim, tuple) else [dim]
+        grouped = claims.groupby(cols, sort=True, observed=True)
+        codes = grouped.ngroup().to_numpy()
+        keys = grouped.size().index
+        flat = np.bincount(codes * n_days + day_idx, minlength=len(keys) * n_days)
+        blocks.append(flat.reshape(len(keys), n_days))
+        name = "+".join(cols)
+        index.extend((name, key) for key in keys)
+    series = pd.MultiIndex.from_tuples(index, names=["dimension", "key"])
+    return series, days, np.vstack(blocks)
+
+
+def cycle_fill_factor(counts, days):
+    """Median day-1 / other-day volume ratio of the total series (the LTC cycle fill)."""
+    total = counts.sum(axis=0).astype(float)
+    ratios = []
+    months = days.to_period("M")
+    for month in months.unique():
+        in_month = months == month
+        first = in_month & (days.day == 1)
+        rest = total[in_month & (days.day != 1)]
+        if first.any() and len(rest) and np.median(rest) > 0:
+            ratios.append(total[first][0] / np.median(rest))
+    return float(np.median(ratios)) if ratios else 1.0
+
+
+def cusum(z, k, start=None):
+    """Upper tabular CUSUM for every row of z, computed without a time loop.
+
+    `start` optionally gives, per row, the column at which the statistic
+    (re)starts from zero; earlier columns are 0.
+    """
+    y = z - k
+    if start is not None:
+        y = np.where(np.arange(z.shape[1]) < start[:, None], 0.0, y)
+    c = np.cumsum(y, axis=1)
+    return c - np.minimum.accumulate(np.minimum(c, 0.0), axis=1)
+
+
+def detect(claims, dimensions=DEFAULT_DIMENSIONS, k=0.5, h=8.0, min_level=1.0,
+           min_days=3, min_shift=0.15):
+    """Level shifts in every daily series, one row per episode.
+
+    k and h are the CUSUM allowance and decision threshold in robust standard
+    deviations. Series averaging fewer than `min_level` claims a day are
+    skipped; episodes shorter than `min_days` or smaller than `min_shift` are
+    dropped. onset is the first shifted day, recovery the first day back at
+    baseline (NaT if the shift runs to the end of the data).
+    """
+    series, days, counts = daily_matrix(claims, dimensions)
+    factor = np.where(days.day == 1, cycle_fill_factor(counts, days), 1.0)
+    adjusted = counts / factor
+
+    level = np.median(adjusted, axis=1, keepdims=True)
+    mad = np.median(np.abs(adjusted - level), axis=1, keepdims=True)
+    sigma = np.maximum(MAD_SCALE * mad, np.sqrt(np.maximum(level, 1.0)))
+    z = (adjusted - level) / sigma
+
+    rows = np.flatnonzero(level[:, 0] >= min_level)
+    # Stack upward and downward statistics so both directions share each pass
+    src = np.concatenate([rows, rows])
+    direction = np.repeat([1, -1], len(rows))
+    signed = np.vstack([z[rows], -z[rows]])
+
+    found = {"row": [], "start": [], "peak": [], "max": []}
+    active = np.arange(len(src))
+    start = np.zeros(len(src), dtype=int)
+    while len(active):
+        ep = _first_episode(cusum(signed[active], k, start[active]), h)
+        for key in found:
+            found[key].append(ep[key] if key != "row" else active[ep["row"]])
+        active = active[ep["row"]]
+        start[active] = ep["peak"] + 1
+
+    row = np.concatenate(found["row"])
+    onset, peak = np.concatenate(found["start"]), np.concatenate(found["peak"])
+    stat = np.concatenate(found["max"])
+
+    ratio = adjusted / np.maximum(level, 1e-9)
+    cum = np.concatenate([np.zeros((len(ratio), 1)), np.cumsum(ratio, axis=1)], axis=1)
+    length = peak - onset + 1
+    shift = (cum[src[row], peak + 1] - cum[src[row], onset]) / np.maximum(length, 1) - 1.0
+
+    ok = (length >= min_days) & (np.abs(shift) >= min_shift) & (np.sign(shift) == direction[row])
+    row, onset, peak, shift, stat = row[ok], onset[ok], peak[ok], shift[ok], stat[ok]
+    return _frame(
+        [series[i][0] for i in src[row]],
+        [series[i][1] for i in src[row]],
+        np.where(direction[row] > 0, "spike", "dip"),
+        days[onset],
+        [days[p + 1] if p + 1 < len(days) else pd.NaT for p in peak],
+        shift * 100,
+        level[src[row], 0],
+        stat,
+    )
+
+
+def _first_episode(stats, h):
+    """First excursion per row whose CUSUM crosses h.
+
+    The episode opens the day after the statistic was last zero before the
+    alarm, peaks at its maximum, and is closed once the statistic has fallen h
+    below that maximum. Returns the rows that had one, with onset and peak
+    columns and the peak statistic.
+    """
+    n_cols = stats.shape[1]
+    cols = np.arange(n_cols)
+    over = stats > h
+    row = np.flatnonzero(over.any(axis=1))
+    stats, over = stats[row], over[row]
+
+    alarm = over.argmax(axis=1)
+    last_zero = np.maximum.accumulate(np.where(stats == 0, cols, -1), axis=1)
+    onset = last_zero[np.arange(len(row)), alarm] + 1
+
+    running_max = np.maximum.accumulate(stats, axis=1)
+    fallen = (stats < running_max - h) & (cols > alarm[:, None])
+    end = np.where(fallen.any(axis=1), fallen.argmax(axis=1), n_cols)
+    peak = np.where(cols < end[:, None], stats, -np.inf).argmax(axis=1)
+    return {"row": row, "start": onset, "peak": peak, "max": stats[np.arange(len(row)), peak]}
+
+
+def _frame(dimension, key, direction, onset, recovery, shift_pct, baseline, statistic):
+    return pd.DataFrame({
+        "dimension": dimension,
+        "key": key,
+        "direction": direction,
+        "onset": pd.to_datetime(onset),
+        "recovery": pd.to_datetime(recovery),
+        "shift_pct": np.round(np.asarray(shift_pct, dtype=float), 1),
+        "baseline_daily": np.round(np.asarray(baseline, dtype=float), 1),
+        "statistic": np.round(np.asarray(statistic, dtype=float), 1),
+    }).sort_values(["dimension", "key", "onset"], ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dimension", action="append", help="Column to split by; repeatable")
+    parser.add_argument("--include-flagged", action="store_true", help="Keep Kryptonite XR claims")
+    parser.add_argument("-k", type=float, default=0.5)
+    parser.add_argument("--threshold", type=float, default=8.0)
+    args = parser.parse_args(argv)
+
+    claims = load_claims()
+    if not args.include_flagged:
+        claims = exclude_flagged(claims)
+    dims = tuple(args.dimension) if args.dimension else DEFAULT_DIMENSIONS
+    episodes = detect(claims, dims, k=args.k, h=args.threshold)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(episodes.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Verify that the seeded Postgres tables match the source CSVs.
+
+Every check pairs an aggregate SQL query with the equivalent pandas computation
+over the raw extract. All queries run concurrently over an asyncpg pool, and any
+disagreement is reported as a per-key diff.
+
+    python -m analytics.consistency                 # entity 1 vs Case Study - Data/
+    python -m analytics.consistency --entity 2=path/to/Claims_Export.csv
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import asyncpg
+
+from analytics.data import CLAIMS_PATH, KRYPTONITE_NDC, load_claims, load_drugs
+from analytics.periods import month_keys
+
+
+@dataclass(frozen=True)
+class Check:
+    name: str
+    sql: str
+    source: object  # callable(claims, drugs) -> {key: value}
+    per_entity: bool = True
+
+
+@dataclass(frozen=True)
+class Diff:
+    entity_id: object
+    check: str
+    key: str
+    source: object
+    database: object
+
+
+@dataclass
+class Report:
+    diffs: list = field(default_factory=list)
+    checks_run: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.diffs
+
+
+def _scalar(value):
+    return {"": value}
+
+
+def _counts(series):
+    return {str(k): int(v) for k, v in series.value_counts().items()}
+
+
+def _month_key(claims):
+    return month_keys(claims)
+
+
+CHECKS = [
+    Check(
+        "row_count",
+        "SELECT '' AS key, COUNT(*)::bigint AS value FROM claims WHERE entity_id = $1",
+        lambda c, d: _scalar(len(c)),
+    ),
+    Check(
+        "net_claim_count",
+        """SELECT net_claim_count::text AS key, COUNT(*)::bigint AS value
+           FROM claims WHERE entity_id = $1 GROUP BY net_claim_count""",
+        lambda c, d: _counts(c["NET_CLAIM_COUNT"]),
+    ),
+    Check(
+        "adjudicated",
+        """SELECT '' AS key, COUNT(*) FILTER (WHERE adjudicated)::bigint AS value
+           FROM claims WHERE entity_id = $1""",
+        lambda c, d: _scalar(int(c["ADJUDICATED"].sum())),
+    ),
+    Check(
+        "date_range",
+        """SELECT 'min' AS key, MIN(date_filled)::text AS value FROM claims WHERE entity_id = $1
+           UNION ALL
+           SELECT 'max', MAX(date_filled)::text FROM claims WHERE entity_id = $1""",
+        lambda c, d: {
+            "min": c["DATE"].min().strftime("%Y-%m-%d"),
+            "max": c["DATE"].max().strftime("%Y-%m-%d"),
+        },
+    ),
+    Check(
+        "distinct_dates",
+        "SELECT '' AS key, COUNT(DISTINCT date_filled)::bigint AS value FROM claims WHERE entity_id = $1",
+        lambda c, d: _scalar(c["DATE"].nunique()),
+    ),
+    Check(
+        "days_supply_range",
+        """SELECT 'min' AS key, MIN(days_supply)::bigint AS value FROM claims WHERE entity_id = $1
+           UNION ALL
+           SELECT 'max', MAX(days_supply)::bigint FROM claims WHERE entity_id = $1""",
+        lambda c, d: {"min": int(c["DAYS_SUPPLY"].min()), "max": int(c["DAYS_SUPPLY"].max())},
+    ),
+    Check(
+        "unique_ndcs",
+        "SELECT '' AS key, COUNT(DISTINCT ndc)::bigint AS value FROM claims WHERE entity_id = $1",
+        lambda c, d: _scalar(c["NDC"].nunique()),
+    ),
+    Check(
+        "unique_groups",
+        "SELECT '' AS key, COUNT(DISTINCT group_id)::bigint AS value FROM claims WHERE entity_id = $1",
+        lambda c, d: _scalar(c["GROUP_ID"].nunique()),
+    ),
+    Check(
+        "state_volumes",
+        """SELECT pharmacy_state AS key, COUNT(*)::bigint AS value
+           FROM claims WHERE entity_id = $1 GROUP BY pharmacy_state""",
+        lambda c, d: _counts(c["PHARMACY_STATE"]),
+    ),
+    Check(
+        "formulary_volumes",
+        """SELECT formulary AS key, COUNT(*)::bigint AS value
+           FROM claims WHERE entity_id = $1 GROUP BY formulary""",
+        lambda c, d: _counts(c["FORMULARY"]),
+    ),
+    Check(
+        "mailretail",
+        """SELECT mail_retail AS key, COUNT(*)::bigint AS value
+           FROM claims WHERE entity_id = $1 GROUP BY mail_retail""",
+        lambda c, d: _counts(c["MAILRETAIL"]),
+    ),
+    Check(
+        "group_volumes",
+        """SELECT group_id AS key, COUNT(*)::bigint AS value
+           FROM claims WHERE entity_id = $1 GROUP BY group_id""",
+        lambda c, d: _counts(c["GROUP_ID"].astype(str)),
+    ),
+    Check(
+        "monthly_volumes",
+        """SELECT TO_CHAR(date_filled, 'YYYY-MM') AS key, COUNT(*)::bigint AS value
+           FROM claims WHERE entity_id = $1 GROUP BY 1""",
+        lambda c, d: _counts(_month_key(c)),
+    ),
+    Check(
+        "monthly_net_claims",
+        """SELECT TO_CHAR(date_filled, 'YYYY-MM') AS key, SUM(net_claim_count)::bigint AS value
+           FROM claims WHERE entity_id = $1 GROUP BY 1""",
+        lambda c, d: {
+            k: int(v) for k, v in c.groupby(_month_key(c))["NET_CLAIM_COUNT"].sum().items()
+        },
+    ),
+    Check(
+        "ks_august",
+        """SELECT 'rows' AS key, COUNT(*)::bigint AS value FROM claims
+           WHERE entity_id = $1 AND pharmacy_state = 'KS'
+             AND date_filled >= '2021-08-01' AND date_filled < '2021-09-01'
+           UNION ALL
+           SELECT 'net', COALESCE(SUM(net_claim_count), 0)::bigint FROM claims
+           WHERE entity_id = $1 AND pharmacy_state = 'KS'
+             AND date_filled >= '2021-08-01' AND date_filled < '2021-09-01'""",
+        lambda c, d: _ks_august(c),
+    ),
+    Check(
+        "kryptonite_claims",
+        f"""SELECT '' AS key, COUNT(*)::bigint AS value FROM claims
+            WHERE entity_id = $1 AND ndc = '{KRYPTONITE_NDC}'""",
+        lambda c, d: _scalar(int((c["NDC"] == KRYPTONITE_NDC).sum())),
+    ),
+    Check(
+        "unmatched_claim_rows",
+        """SELECT '' AS key, COUNT(*)::bigint AS value
+           FROM claims c LEFT JOIN drug_info d ON c.ndc = d.ndc
+           WHERE c.entity_id = $1 AND d.ndc IS NULL""",
+        lambda c, d: _scalar(int((~c["NDC"].isin(d["NDC"])).sum())),
+    ),
+    Check(
+        "mony_claims",
+        """SELECT COALESCE(d.mony, '') AS key, COUNT(*)::bigint AS value
+           FROM claims c LEFT JOIN drug_info d ON c.ndc = d.ndc
+           WHERE c.entity_id = $1 GROUP BY d.mony""",
+        lambda c, d: _counts(c["NDC"].map(d.drop_duplicates("NDC").set_index("NDC")["MONY"]).fillna("")),
+    ),
+    Check(
+        "drug_info_rows",
+        "SELECT '' AS key, COUNT(*)::bigint AS value FROM drug_info",
+        lambda c, d: _scalar(d["NDC"].nunique()),
+        per_entity=False,
+    ),
+    Check(
+        "drug_info_mony",
+        "SELECT mony AS key, COUNT(*)::bigint AS value FROM drug_info GROUP BY mony",
+        lambda c, d: _counts(d.drop_duplicates("NDC")["MONY"]),
+        per_entity=False,
+    ),
+]
+
+
+def _ks_august(claims):
+    in_august = (claims["DATE"] >= "2021-08-01") & (claims["DATE"] < "2021-09-01")
+    ks_aug = claims[(claims["PHARMACY_STATE"] == "KS") & in_august]
+    return {"rows": len(ks_aug), "net": int(ks_aug["NET_CLAIM_COUNT"].sum())}
+
+
+def _normalize(value):
+    """Coerce DB and pandas scalars to comparable Python values."""
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def compare(entity_id, check, source, database):
+    """Per-key diffs between a source result and a database result."""
+    diffs = []
+    for key in sorted(set(source) | set(database), key=str):
+        s = _normalize(source.get(key))
+        db = _normalize(database.get(key))
+        if s != db:
+            diffs.append(Diff(entity_id, check, key, s, db))
+    return diffs
+
+
+async def _fetch(pool, check, entity_id):
+    args = (entity_id,) if check.per_entity else ()
+    rows = await pool.fetch(check.sql, *args)
+    return {("" if r["key"] is None else str(r["key"])): r["value"] for r in rows}
+
+
+async def validate(dsn, sources, drugs, checks=CHECKS, pool_size=8):
+    """Run every check against the database concurrently and diff against sources.
+
+    `sources` maps entity_id -> claims dataframe (as returned by load_claims).
+    Global checks (drug_info) run once, against `drugs`.
+    """
+    start = time.perf_counter()
+    jobs = []
+    for check in checks:
+        if check.per_entity:
+            jobs.extend((check, entity_id, claims) for entity_id, claims in sources.items())
+        else:
+            jobs.append((check, None, None))
+
+    # Source aggregates are computed on a worker thread while the queries are in flight
+    source_task = asyncio.to_thread(lambda: [check.source(claims, drugs) for check, _, claims in jobs])
+    async with asyncpg.create_pool(dsn, min_size=1, max_size=pool_size) as pool:
+        source_results, *db_results = await asyncio.gather(
+            source_task, *(_fetch(pool, check, eid) for check, eid, _ in jobs)
+        )
+
+    report = Report(checks_run=len(jobs))
+    for (check, entity_id, _), source, database in zip(jobs, source_results, db_results):
+        report.diffs.extend(compare(entity_id, check.name, source, database))
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def format_report(report):
+    """Human-readable diff report."""
+    lines = [f"{report.checks_run} checks in {report.elapsed:.2f}s — {len(report.diffs)} differences"]
+    for d in report.diffs:
+        scope = "global" if d.entity_id is None else f"entity {d.entity_id}"
+        key = f"[{d.key}]" if d.key else ""
+        lines.append(f"  {scope:<10} {d.check}{key}: source={d.source!r} database={d.database!r}")
+    return "\n".join(lines)
+
+
+def _parse_entity(arg):
+    entity_id, _, path = arg.partition("=")
+    return int(entity_id), path or CLAIMS_PATH
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument(
+        "--entity", action="append", type=_parse_entity, metavar="ID[=CLAIMS_CSV]",
+        help="Entity to validate; repeatable (default: 1 against Claims_Export.csv)",
+    )
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    entities = args.entity or [(1, CLAIMS_PATH)]
+    sources = {entity_id: load_claims(path) for entity_id, path in entities}
+    report = asyncio.run(validate(args.dsn, sources, load_drugs(), pool_size=args.pool_size))
+    print(format_report(report))
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
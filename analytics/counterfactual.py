@@ -0,0 +1,165 @@
+"""Counterfactual exclusions ("what if we drop these NDCs / groups / months") by subtraction.
+
+The claims are aggregated once into contribution cells, one per distinct
+(entity,) NDC, group, period, state and formulary, each holding its claims,
+net claims, reversals and adjudicated claims. Totals per dimension value are
+cached too, with an index from every value to its cells. An exclusion set —
+any mix of values of those dimensions — is applied by collecting the cells it
+touches and subtracting their contributions from the cached totals, so the
+work is proportional to what is excluded, not to the claims, and no filtered
+copy of the frame is ever made. Excluded values that don't occur are ignored.
+
+    python -m analytics.counterfactual                                  # with vs without flagged NDCs
+    python -m analytics.counterfactual --group 400127 --month 2021-11 --by PHARMACY_STATE
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import FLAGGED_NDCS, load_claims
+from analytics.periods import parse_period, period_labels, periods_of
+
+DIMENSIONS = ["NDC", "GROUP_ID", "PERIOD", "PHARMACY_STATE", "FORMULARY"]
+METRICS = ["claims", "net_claims", "reversals", "adjudicated"]
+
+
+@dataclass
+class Contributions:
+    dims: list              # dimension names, ENTITY_ID first when present
+    keys: dict              # dim -> pd.Index of its values
+    codes: dict             # dim -> value code of every cell
+    values: np.ndarray      # (cells x METRICS) int64 contributions
+    totals: dict            # dim -> (values x METRICS) totals
+    members: dict           # dim -> (cell ids ordered by value, offsets): the cells of each value
+
+    @property
+    def total(self):
+        return self.values.sum(axis=0)
+
+
+def build(claims):
+    """Contribution cells and per-value totals for `claims`."""
+    dims = (["ENTITY_ID"] if "ENTITY_ID" in claims.columns else []) + DIMENSIONS
+    columns = {**{d: claims[d] for d in dims if d != "PERIOD"}, "PERIOD": periods_of(claims)}
+    row_codes, keys = {}, {}
+    for dim in dims:
+        row_codes[dim], keys[dim] = pd.factorize(columns[dim], sort=True)  # -1: missing value
+        keys[dim] = pd.Index(keys[dim])
+    cell = pd.DataFrame(row_codes).groupby(dims, sort=False).ngroup().to_numpy()
+    _, first = np.unique(cell, return_index=True)  # a representative row per cell
+
+    net = claims["NET_CLAIM_COUNT"].to_numpy()
+    per_row = np.column_stack([np.ones(len(claims)), net, net == -1, claims["ADJUDICATED"].to_numpy(dtype=bool)])
+    values = np.column_stack([np.bincount(cell, per_row[:, i], minlength=len(first))
+                              for i in range(len(METRICS))]).astype(np.int64)
+
+    codes = {dim: row_codes[dim][first] for dim in dims}
+    totals, members = {}, {}
+    for dim in dims:
+        valid = codes[dim] >= 0
+        totals[dim] = np.column_stack([np.bincount(codes[dim][valid], values[valid, i], minlength=len(keys[dim]))
+                                       for i in range(len(METRICS))]).astype(np.int64)
+        order = np.flatnonzero(valid)[np.argsort(codes[dim][valid], kind="stable")]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[dim][valid], minlength=len(keys[dim])))])
+        members[dim] = (order, offsets)
+    return Contributions(dims, keys, codes, values, totals, members)
+
+
+def _normalize(exclude):
+    """{dim: list of values}, with "YYYY-MM" strings accepted for PERIOD."""
+    out = {}
+    for dim, values in (exclude or {}).items():
+        values = [values] if np.isscalar(values) else list(values)
+        if dim == "PERIOD":
+            values = [parse_period(v) if isinstance(v, str) else v for v in values]
+        out[dim] = values
+    return out
+
+
+def excluded_cells(contrib, exclude):
+    """Ids of the cells touched by any value in `exclude` ({dim: values})."""
+    parts = []
+    for dim, values in _normalize(exclude).items():
+        if dim not in contrib.keys:
+            raise KeyError(f"{dim} is not an exclusion dimension ({contrib.dims})")
+        order, offsets = contrib.members[dim]
+        found = contrib.keys[dim].get_indexer(values)
+        parts += [order[offsets[k]:offsets[k + 1]] for k in found[found >= 0]]
+    return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+def _rates(frame):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["reversal_rate"] = np.round(frame["reversals"] / frame["claims"] * 100, 2)
+        frame["adjudication_rate"] = np.round(frame["adjudicated"] / frame["claims"] * 100, 2)
+    return frame
+
+
+def kpis(contrib, exclude=None):
+    """The anomalies route's KPIs with `exclude` removed: claims, net, reversals, rates, unique drugs."""
+    cells = excluded_cells(contrib, exclude)
+    remaining = contrib.total - contrib.values[cells].sum(axis=0)
+    ndc = contrib.codes["NDC"][cells]
+    ndc_claims = contrib.totals["NDC"][:, 0] - np.bincount(ndc[ndc >= 0], contrib.values[cells][ndc >= 0, 0],
+                                                           minlength=len(contrib.keys["NDC"]))
+    out = dict(zip(METRICS, (int(v) for v in remaining)))
+    claims = max(out["claims"], 1)
+    out["reversal_rate"] = round(out["reversals"] / claims * 100, 2)
+    out["adjudication_rate"] = round(out["adjudicated"] / claims * 100, 2)
+    out["unique_drugs"] = int((ndc_claims > 0).sum())
+    return out
+
+
+def breakdown(contrib, dim, exclude=None):
+    """Per value of `dim` with `exclude` removed: the METRICS and rates (values with no claims left dropped)."""
+    cells = excluded_cells(contrib, exclude)
+    code = contrib.codes[dim][cells]
+    valid = code >= 0
+    removed = np.column_stack([np.bincount(code[valid], contrib.values[cells][valid, i],
+                                           minlength=len(contrib.keys[dim])) for i in range(len(METRICS))])
+    remaining = contrib.totals[dim] - removed.astype(np.int64)
+    labels = period_labels(contrib.keys[dim]) if dim == "PERIOD" else np.asarray(contrib.keys[dim], dtype=object)
+    frame = _rates(pd.DataFrame(remaining, columns=METRICS).assign(**{dim: labels})[[dim, *METRICS]])
+    return frame[frame["claims"] > 0].reset_index(drop=True)
+
+
+def compare(contrib, exclude, by="PERIOD"):
+    """(kpis, breakdown): side by side with and without `exclude`, plus the change."""
+    before, after = kpis(contrib), kpis(contrib, exclude)
+    table = pd.DataFrame({"with": before, "without": after})
+    table["change"] = table["without"] - table["with"]
+    columns = [by, "claims", "reversal_rate"]
+    merged = breakdown(contrib, by)[columns].merge(breakdown(contrib, by, exclude)[columns], on=by, how="left",
+                                                   suffixes=("", "_without"))
+    merged["claims_without"] = merged["claims_without"].fillna(0).astype(np.int64)
+    return table, merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ndc", type=int, action="append", help="NDC to exclude (default: the flagged NDCs)")
+    parser.add_argument("--group", action="append", help="GROUP_ID to exclude")
+    parser.add_argument("--month", action="append", help="Month to exclude, YYYY-MM")
+    parser.add_argument("--state", action="append")
+    parser.add_argument("--formulary", action="append")
+    parser.add_argument("--by", default="PERIOD", choices=DIMENSIONS)
+    args = parser.parse_args(argv)
+
+    claims = load_claims()
+    claims["GROUP_ID"] = claims["GROUP_ID"].astype(str)
+    exclude = {dim: values for dim, values in [
+        ("NDC", args.ndc), ("GROUP_ID", args.group), ("PERIOD", args.month),
+        ("PHARMACY_STATE", args.state), ("FORMULARY", args.formulary)] if values}
+    table, by = compare(build(claims), exclude or {"NDC": FLAGGED_NDCS}, args.by)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(table.to_string())
+        print()
+        print(by.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
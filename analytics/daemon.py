@@ -0,0 +1,324 @@
+"""Long-lived local process that keeps the extracts parsed and joined in memory.
+
+Clients talk to it over a Unix socket: aggregate queries (dashboard filter
+query string plus group-by columns) and whole-frame fetches. Results come back
+as typed column buffers — numeric columns as raw bytes, string columns as
+int32 dictionary codes plus the dictionary — so a client rebuilds a DataFrame
+without parsing. The source files are polled and reloaded in a background
+thread; queries keep using the previous snapshot until the new one is ready.
+
+    python -m analytics.daemon serve &
+    python -m analytics.daemon status
+    python -m analytics.daemon query "state=KS" --by MONTH
+    ANALYTICS_SOCKET=.cache/analytics.sock python -m pytest tests/
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import CLAIMS_PATH, DRUGS_PATH, load_claims, load_drugs, merge_drugs
+from analytics.drug_dimension import DrugDimension
+from analytics.filters import claims_mask, parse_filters
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.environ.get("ANALYTICS_SOCKET", ".cache/analytics.sock")
+POLL_SECONDS = 2.0
+
+FRAMES = ("claims", "drugs", "merged")
+
+# Metric -> (column, how) over the filtered claims
+METRICS = {
+    "claims": ("NET_CLAIM_COUNT", "size"),
+    "net_claims": ("NET_CLAIM_COUNT", "sum"),
+    "incurred": ("INCURRED", "sum"),
+    "reversals": ("REVERSED", "sum"),
+}
+
+_LENGTH = struct.Struct("!Q")
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    claims: pd.DataFrame
+    drugs: pd.DataFrame
+    merged: pd.DataFrame
+    dimension: DrugDimension
+    signature: tuple
+    loaded_at: float
+    generation: int
+
+
+def _signature(paths):
+    """(mtime_ns, size) per source file; a change triggers a reload."""
+    return tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in paths)
+
+
+def load_snapshot(claims_path=CLAIMS_PATH, drugs_path=DRUGS_PATH, generation=1):
+    signature = _signature([claims_path, drugs_path])
+    claims = load_claims(claims_path)
+    drugs = load_drugs(drugs_path)
+    merged = merge_drugs(claims, drugs)
+    merged["INCURRED"] = merged["NET_CLAIM_COUNT"] == 1
+    merged["REVERSED"] = merged["NET_CLAIM_COUNT"] == -1
+    return Snapshot(claims, drugs, merged, DrugDimension.build(drugs), signature, time.time(), generation)
+
+
+def aggregate(snapshot, query="", by=(), metrics=tuple(METRICS)):
+    """Metrics over the claims matching a dashboard filter query, grouped by `by`."""
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+    df = snapshot.merged
+    df = df[claims_mask(df, parse_filters(query))]
+    spec = {m: METRICS[m] for m in metrics}
+    if not by:
+        return pd.DataFrame({m: [df[col].agg(how)] for m, (col, how) in spec.items()})
+    grouped = df.groupby(list(by), sort=True, dropna=False, observed=True)
+    return grouped.agg(**spec).reset_index()
+
+
+# --- wire format -------------------------------------------------------------
+
+def encode_frame(df):
+    """Header dict and payload bytes for a DataFrame."""
+    columns, chunks = [], []
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy(dtype=np.int32)
+            entry = {"kind": "category", "categories": list(series.cat.categories)}
+        elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            codes = codes.astype(np.int32)
+            entry = {"kind": "strings", "dtype": str(series.dtype), "categories": list(uniques)}
+        else:
+            codes = np.ascontiguousarray(series.to_numpy())
+            entry = {"kind": "array", "dtype": codes.dtype.str}
+        entry.update(name=str(name), nbytes=codes.nbytes)
+        columns.append(entry)
+        chunks.append(codes.tobytes())
+    return {"rows": len(df), "columns": columns}, b"".join(chunks)
+
+
+def decode_frame(header, payload):
+    rows, offset, data = header["rows"], 0, {}
+    for col in header["columns"]:
+        buf = payload[offset:offset + col["nbytes"]]
+        offset += col["nbytes"]
+        if col["kind"] == "array":
+            data[col["name"]] = np.frombuffer(buf, dtype=col["dtype"], count=rows)
+            continue
+        codes = np.frombuffer(buf, dtype=np.int32, count=rows)
+        if col["kind"] == "category":
+            data[col["name"]] = pd.Categorical.from_codes(codes, categories=col["categories"])
+        else:
+            values = np.array(col["categories"] + [np.nan], dtype=object)[codes]
+            data[col["name"]] = pd.Series(values, dtype=col["dtype"])
+    return pd.DataFrame(data)
+
+
+async def _read_message(reader):
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def _pack(*parts):
+    return b"".join(_LENGTH.pack(len(p)) + p for p in parts)
+
+
+# --- server ------------------------------------------------------------------
+
+class Daemon:
+    """Owns the current snapshot and serves requests against it."""
+
+    def __init__(self, claims_path=CLAIMS_PATH, drugs_path=DRUGS_PATH, poll=POLL_SECONDS):
+        self.paths = (claims_path, drugs_path)
+        self.poll = poll
+        self.snapshot = None
+
+    async def reload_if_changed(self):
+        """Load a new snapshot off the event loop if the sources changed; True if swapped."""
+        current = self.snapshot
+        try:
+            if current is not None and _signature(self.paths) == current.signature:
+                return False
+            generation = current.generation + 1 if current else 1
+            self.snapshot = await asyncio.to_thread(load_snapshot, *self.paths, generation)
+        except (OSError, ValueError, pd.errors.ParserError) as exc:
+            # Keep serving the last good snapshot (e.g. file mid-write)
+            log.warning("Reload failed: %s", exc)
+            return False
+        log.info("Loaded generation %d (%d claims)", self.snapshot.generation, len(self.snapshot.claims))
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll)
+            await self.reload_if_changed()
+
+    def handle(self, request):
+        """(header, payload) for one request dict."""
+        snap = self.snapshot
+        op = request.get("op")
+        if op == "status":
+            return {
+                "generation": snap.generation,
+                "loaded_at": snap.loaded_at,
+                "claims": len(snap.claims),
+                "drugs": len(snap.drugs),
+            }, b""
+        if op == "fetch":
+            if request.get("frame") not in FRAMES:
+                raise ValueError(f"frame must be one of {FRAMES}")
+            df = getattr(snap, request["frame"])
+            if request["frame"] == "merged":
+                df = df.drop(columns=["INCURRED", "REVERSED"])
+            return encode_frame(df)
+        if op == "aggregate":
+            result = aggregate(snap, request.get("query", ""), request.get("by", ()),
+                               request.get("metrics", tuple(METRICS)))
+            return encode_frame(result)
+        if op == "distinct":
+            codes = snap.dimension.encode(snap.claims["NDC"].to_numpy())[request["attribute"]]
+            return {"values": snap.dimension.distinct(request["attribute"], codes)}, b""
+        raise ValueError(f"Unknown op: {op!r}")
+
+    async def _serve_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = json.loads(await _read_message(reader))
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    header, payload = self.handle(request)
+                except (KeyError, ValueError) as exc:
+                    header, payload = {"error": str(exc)}, b""
+                except Exception as exc:  # report it, keep serving other requests
+                    log.exception("Request failed: %s", request)
+                    header, payload = {"error": f"{type(exc).__name__}: {exc}"}, b""
+                writer.write(_pack(json.dumps(header).encode(), payload))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, path=DEFAULT_SOCKET):
+        await self.reload_if_changed()
+        if self.snapshot is None:
+            raise RuntimeError("Could not load the source extracts")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self._serve_client, path=str(path))
+        watcher = asyncio.create_task(self.watch())
+        log.info("Serving on %s", path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            path.unlink(missing_ok=True)
+
+
+# --- client ------------------------------------------------------------------
+
+class Client:
+    """Blocking client; one connection reused across calls."""
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=60.0):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(str(path))
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recv(self, n):
+        buf = bytearray(n)
+        view, got = memoryview(buf), 0
+        while got < n:
+            k = self._sock.recv_into(view[got:])
+            if not k:
+                raise ConnectionError("Daemon closed the connection")
+            got += k
+        return buf
+
+    def _call(self, **request):
+        body = json.dumps(request).encode()
+        self._sock.sendall(_LENGTH.pack(len(body)) + body)
+        header = json.loads(self._recv(_LENGTH.unpack(self._recv(_LENGTH.size))[0]))
+        payload = self._recv(_LENGTH.unpack(self._recv(_LENGTH.size))[0])
+        if "error" in header:
+            raise ValueError(header["error"])
+        return header, payload
+
+    def status(self):
+        return self._call(op="status")[0]
+
+    def fetch(self, frame):
+        """Full "claims", "drugs" or "merged" frame, as load_claims()/load_drugs()/merge_drugs() return it."""
+        return decode_frame(*self._call(op="fetch", frame=frame))
+
+    def aggregate(self, query="", by=(), metrics=tuple(METRICS)):
+        return decode_frame(*self._call(op="aggregate", query=query, by=list(by), metrics=list(metrics)))
+
+    def distinct(self, attribute):
+        return self._call(op="distinct", attribute=attribute)[0]["values"]
+
+
+async def _serve_until_terminated(daemon, path):
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    await daemon.serve(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    sub = parser.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("serve")
+    s.add_argument("--claims", default=CLAIMS_PATH)
+    s.add_argument("--drugs", default=DRUGS_PATH)
+    s.add_argument("--poll", type=float, default=POLL_SECONDS)
+    sub.add_parser("status")
+    q = sub.add_parser("query")
+    q.add_argument("query", nargs="?", default="", help="Dashboard filter query string")
+    q.add_argument("--by", action="append", default=[])
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+        try:
+            asyncio.run(_serve_until_terminated(Daemon(args.claims, args.drugs, args.poll), args.socket))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+        return 0
+    with Client(args.socket) as client:
+        if args.command == "status":
+            print(json.dumps(client.status(), indent=2))
+        else:
+            print(client.aggregate(args.query, args.by).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
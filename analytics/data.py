@@ -0,0 +1,76 @@
+"""Shared loaders and constants for Claims_Export.csv and Drug_Info.csv."""
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from analytics.periods import encode
+
+DATA_DIR = Path(__file__).parent.parent / "Case Study - Data"
+CLAIMS_PATH = DATA_DIR / "Claims_Export.csv"
+DRUGS_PATH = DATA_DIR / "Drug_Info.csv"
+
+SEP = "~"
+ENCODING = "utf-8-sig"
+
+CLAIM_COLUMNS = [
+    "ADJUDICATED", "FORMULARY", "DATE_FILLED", "NDC", "DAYS_SUPPLY",
+    "GROUP_ID", "PHARMACY_STATE", "MAILRETAIL", "NET_CLAIM_COUNT",
+]
+
+# Kryptonite XR — synthetic test drug, mirrors FLAGGED_NDCS in src/lib/api-types.ts
+KRYPTONITE_NDC = 65862020190
+FLAGGED_NDCS = [KRYPTONITE_NDC]
+
+# Extracts at least this large are parsed with analytics.parallel_csv by default
+PARALLEL_MIN_BYTES = 256 * 1024 * 1024
+
+DRUG_COLUMNS = ["NDC", "DRUG_NAME", "LABEL_NAME", "MONY", "MANUFACTURER_NAME"]
+
+RATES = ("adjudication", "reversal")
+
+
+def _read(path, schema_name, workers):
+    if workers is None:
+        workers = 0 if os.path.getsize(path) < PARALLEL_MIN_BYTES else os.cpu_count()
+    if workers and workers > 1:
+        from analytics import parallel_csv
+        return parallel_csv.read_tilde(str(path), getattr(parallel_csv, schema_name), workers)
+    return pd.read_csv(path, sep=SEP, encoding=ENCODING)
+
+
+def load_claims(path=CLAIMS_PATH, workers=None):
+    """Raw claims dataframe with parsed DATE and MONTH, and integer PERIOD / DAY (analytics.periods).
+
+    `workers` > 1 parses byte ranges in a process pool; by default only
+    extracts over PARALLEL_MIN_BYTES are.
+    """
+    df = _read(path, "CLAIMS_SCHEMA", workers)
+    df["DATE"] = pd.to_datetime(df["DATE_FILLED"], format="%Y%m%d")
+    df["MONTH"] = df["DATE"].dt.month
+    df["PERIOD"], df["DAY"] = encode(df["DATE"])
+    return df
+
+
+def load_drugs(path=DRUGS_PATH, workers=None):
+    """Raw drug_info dataframe."""
+    return _read(path, "DRUGS_SCHEMA", workers)
+
+
+def exclude_flagged(claims):
+    """Claims excluding flagged NDCs (Kryptonite XR)."""
+    return claims[~claims["NDC"].isin(FLAGGED_NDCS)]
+
+
+def successes(claims, rate):
+    """Boolean array: adjudicated claims, or reversals (NET_CLAIM_COUNT == -1)."""
+    if rate == "adjudication":
+        return claims["ADJUDICATED"].to_numpy(dtype=bool)
+    if rate == "reversal":
+        return claims["NET_CLAIM_COUNT"].to_numpy() == -1
+    raise ValueError(f"rate must be one of {RATES}")
+
+
+def merge_drugs(claims, drugs):
+    """Claims left-joined to drug_info on NDC."""
+    return claims.merge(drugs[DRUG_COLUMNS], on="NDC", how="left")
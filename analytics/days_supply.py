@@ -0,0 +1,178 @@
+"""Mergeable days-supply distributions per (entity, state, formulary, group, month) cell.
+
+DAYS_SUPPLY is an integer day count, so each cell keeps an exact count per
+distinct value (claims and net claims), clipped at MAX_DAYS. Cells merge by
+addition: any filtered distribution — the Explorer's days-supply bins, the
+median, p90, the short-supply share — is the sum of the matching cells'
+counts, and a new extract is folded in by merging its sketch into the stored
+one. Size is bounded by cells x distinct values, not by the number of claims.
+Flagged NDCs are a cell dimension, so the default view and `flagged=true`
+both resolve.
+
+    python -m analytics.days_supply build
+    python -m analytics.days_supply add path/to/Claims_Export.csv
+    python -m analytics.days_supply query "state=KS&formulary=OPEN"
+"""
+import argparse
+import gzip
+import os
+import sys
+from calendar import monthrange
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import CLAIMS_PATH, FLAGGED_NDCS, load_claims
+from analytics.filters import parse_filters
+from analytics.periods import month_keys
+
+DEFAULT_PATH = Path(".cache/days_supply/sketch.csv.gz")
+CELL = ["ENTITY_ID", "PHARMACY_STATE", "FORMULARY", "GROUP_ID", "MONTH_KEY", "FLAGGED"]
+MAX_DAYS = 365
+
+# Explorer days-supply chart bins (src/app/api/claims/route.ts)
+BINS = [(7, "7"), (14, "14"), (30, "30"), (60, "60"), (90, "90")]
+
+
+def build(claims, entity_id=1):
+    """Sketch rows: CELL + DAYS_SUPPLY with `claims` (row count) and `net` (SUM(net_claim_count))."""
+    entity = claims["ENTITY_ID"] if "ENTITY_ID" in claims.columns else entity_id
+    df = pd.DataFrame({
+        "ENTITY_ID": entity,
+        "PHARMACY_STATE": claims["PHARMACY_STATE"],
+        "FORMULARY": claims["FORMULARY"],
+        "GROUP_ID": claims["GROUP_ID"].astype(str),
+        "MONTH_KEY": month_keys(claims),
+        "FLAGGED": claims["NDC"].isin(FLAGGED_NDCS),
+        "DAYS_SUPPLY": claims["DAYS_SUPPLY"].clip(upper=MAX_DAYS),
+        "claims": 1,
+        "net": claims["NET_CLAIM_COUNT"],
+    })
+    return _collapse(df)
+
+
+def _collapse(df):
+    out = df.groupby(CELL + ["DAYS_SUPPLY"], sort=True, dropna=False)[["claims", "net"]].sum()
+    return out.reset_index().astype({"claims": np.int64, "net": np.int64})
+
+
+def merge(*sketches):
+    """One sketch holding the counts of all of `sketches`."""
+    return _collapse(pd.concat(sketches, ignore_index=True))
+
+
+def _month_keys(filters):
+    """(first, last) YYYY-MM covered by the date filters, or None if they cut a month."""
+    start, end = filters.date_start, filters.date_end
+    if start and start.day != 1:
+        return None
+    if end and end.day != monthrange(end.year, end.month)[1]:
+        return None
+    return (start.strftime("%Y-%m") if start else "", end.strftime("%Y-%m") if end else "9999-12")
+
+
+def histogram(sketch, query):
+    """Counts per days-supply value for a dashboard filter query, or None if cells can't answer it.
+
+    Drug-level filters (drug, manufacturer, MONY, NDC) and dates that cut a month
+    are not cell dimensions.
+    """
+    filters = parse_filters(query)
+    if filters.needs_drug_join or filters.ndc:
+        return None
+    months = _month_keys(filters)
+    if months is None:
+        return None
+    mask = (sketch["ENTITY_ID"] == filters.entity_id) & sketch["MONTH_KEY"].between(*months)
+    if not filters.include_flagged_ndcs:
+        mask &= ~sketch["FLAGGED"]
+    for column, value in (("PHARMACY_STATE", filters.state), ("FORMULARY", filters.formulary),
+                          ("GROUP_ID", filters.group_id)):
+        if value:
+            mask &= sketch[column] == value
+    return sketch[mask].groupby("DAYS_SUPPLY")[["claims", "net"]].sum()
+
+
+def quantile(hist, q, weight="claims"):
+    """The `q` quantile of days supply, interpolated like pandas Series.quantile."""
+    hist = hist[hist[weight] > 0]
+    n = int(hist[weight].sum())
+    if n == 0:
+        return float("nan")
+    cum = hist[weight].cumsum().to_numpy()
+    values = hist.index.to_numpy()
+    pos = (n - 1) * q
+    lo, hi = values[np.searchsorted(cum, [np.floor(pos) + 1, np.ceil(pos) + 1])]
+    return float(lo + (hi - lo) * (pos - np.floor(pos)))
+
+
+def bins(hist):
+    """The Explorer's days-supply chart rows: net claims per bin, ordered by the bin's lowest value."""
+    days = hist.index.to_numpy()
+    labels = np.select([days <= limit for limit, _ in BINS], [label for _, label in BINS], "Other")
+    grouped = hist.assign(bin=labels, lo=days).groupby("bin").agg(count=("net", "sum"), lo=("lo", "min"))
+    return [{"bin": b, "count": int(c)} for b, c in grouped.sort_values("lo")["count"].items()]
+
+
+def summary(hist, short_days=14):
+    """Claim count, mean, median, p90 and share (%) at or under `short_days`."""
+    n = int(hist["claims"].sum())
+    return {
+        "claims": n,
+        "mean": float((hist.index.to_numpy() * hist["claims"]).sum() / n) if n else float("nan"),
+        "p50": quantile(hist, 0.5),
+        "p90": quantile(hist, 0.9),
+        "short_share": float(hist.loc[hist.index <= short_days, "claims"].sum() / n * 100) if n else float("nan"),
+    }
+
+
+def read_sketch(path=DEFAULT_PATH):
+    return pd.read_csv(path, dtype={"GROUP_ID": str, "MONTH_KEY": str}, keep_default_na=False)
+
+
+def write_sketch(sketch, path=DEFAULT_PATH):
+    """Atomic write (temp file + rename) so readers never see a partial sketch."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        sketch.to_csv(f, index=False)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sketch", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("claims", nargs="?", default=CLAIMS_PATH)
+    b.add_argument("--entity", type=int, default=1)
+    a = sub.add_parser("add", help="Merge another extract into the stored sketch")
+    a.add_argument("claims")
+    a.add_argument("--entity", type=int, default=1)
+    q = sub.add_parser("query")
+    q.add_argument("query", nargs="?", default="", help="Filter query string, e.g. state=KS&formulary=OPEN")
+    args = parser.parse_args(argv)
+
+    if args.command in ("build", "add"):
+        sketch = build(load_claims(args.claims), args.entity)
+        if args.command == "add":
+            sketch = merge(read_sketch(args.sketch), sketch)
+        write_sketch(sketch, args.sketch)
+        print(f"{len(sketch):,} sketch rows, {sketch['claims'].sum():,} claims -> {args.sketch}")
+        return 0
+    hist = histogram(read_sketch(args.sketch), args.query)
+    if hist is None:
+        print("not answerable from the sketch (drug-level filter or partial month)")
+        return 1
+    s = summary(hist)
+    print(f"{s['claims']:,} claims: mean {s['mean']:.1f}, median {s['p50']:g}, p90 {s['p90']:g}, "
+          f"<=14 days {s['short_share']:.1f}%")
+    for row in bins(hist):
+        print(f"  {row['bin']:>5}  {row['count']:>10,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
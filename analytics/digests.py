@@ -0,0 +1,280 @@
+"""Precomputed per-entity digests answering the chat tools without a database round trip.
+
+For every value of every single filter dimension (and optionally common
+two-way combinations) the digest holds what queryKpis, queryMonthlyTrend and
+queryTopDrugs in src/app/api/chat/route.ts would return, under the same rules:
+flagged NDCs excluded, drug attributes via the drug_info join. Slices are keyed
+by their filter query string ("", "state=KS", "formulary=OPEN&state=KS").
+
+Each slice carries a checksum of its input rows (a sum of row hashes), so a
+rebuild recomputes only slices whose rows changed and reuses the rest.
+
+    python -m analytics.digests build                   # entity 1, .cache/digests/entity-1.json.gz
+    python -m analytics.digests build --pairs --entity 2=path/to/Claims_Export.csv
+    python -m analytics.digests lookup kpis "state=KS&formulary=OPEN"
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import (
+    CLAIM_COLUMNS, CLAIMS_PATH, DRUGS_PATH, exclude_flagged, load_claims, load_drugs, merge_drugs,
+)
+from analytics.periods import month_keys
+
+VERSION = 1
+DEFAULT_DIR = Path(".cache/digests")
+TOP_DRUGS = 25  # queryTopDrugs' maximum limit
+
+# Tool filter parameter -> claims/drug column
+DIMENSIONS = {
+    "state": "PHARMACY_STATE",
+    "formulary": "FORMULARY",
+    "mony": "MONY",
+    "drug": "DRUG_NAME",
+    "manufacturer": "MANUFACTURER_NAME",
+    "groupId": "GROUP_ID",
+}
+COMMON_PAIRS = [("formulary", "state"), ("mony", "state"), ("formulary", "mony"), ("drug", "state")]
+TOOLS = ("kpis", "monthly", "topDrugs")
+
+_HASHED = CLAIM_COLUMNS + ["DRUG_NAME", "MANUFACTURER_NAME", "MONY"]
+
+
+@dataclass
+class BuildStats:
+    slices: int = 0
+    recomputed: int = 0
+    reused: int = 0
+    removed: int = 0
+    elapsed: float = 0.0
+
+
+def slice_key(filters):
+    """Canonical query-string key for a {param: value} filter mapping."""
+    return "&".join(f"{k}={filters[k]}" for k in sorted(filters) if filters[k] not in (None, ""))
+
+
+def prepare(claims, drugs):
+    """Claims as the chat tools see them: flagged NDCs out, drug columns joined, row hashes."""
+    df = merge_drugs(exclude_flagged(claims), drugs).reset_index(drop=True)
+    df["GROUP_ID"] = df["GROUP_ID"].astype(str)
+    df["MONTH_KEY"] = month_keys(df)
+    df["REVERSED"] = (df["NET_CLAIM_COUNT"] == -1).astype(np.int64)
+    df["INCURRED"] = (df["NET_CLAIM_COUNT"] == 1).astype(np.int64)
+    df["ROW_HASH"] = pd.util.hash_pandas_object(df[_HASHED].astype(str), index=False).to_numpy()
+    return df
+
+
+def _rate(reversed_, total):
+    """ROUND(reversed / total * 100, 2) — half away from zero, like Postgres numeric."""
+    return np.floor(np.asarray(reversed_) * 10_000 / np.asarray(total) + 0.5) / 100
+
+
+def _keys(dims):
+    return [DIMENSIONS[d] for d in dims]
+
+
+def _slice_ids(df, dims):
+    """Slice key per row (rows with a missing dimension value belong to no slice)."""
+    if not dims:
+        return pd.Series("", index=df.index)
+    parts = [f"{d}=" + df[DIMENSIONS[d]].astype(str) for d in sorted(dims)]
+    ids = parts[0].str.cat(parts[1:], sep="&") if len(parts) > 1 else parts[0]
+    present = df[_keys(dims)].notna().all(axis=1)
+    return ids.where(present)
+
+
+def checksums(df, ids):
+    """Order-independent sum (mod 2**64) of row hashes per slice id, as hex strings."""
+    codes, uniques = pd.factorize(ids)
+    keep = codes >= 0
+    h = df["ROW_HASH"].to_numpy()[keep]
+    total = np.zeros(len(uniques), dtype=np.uint64)
+    np.add.at(total, codes[keep], h)  # exact uint64 addition, wraps mod 2**64
+    return dict(zip(uniques, (f"{v:016x}" for v in total)))
+
+
+def compute_slices(df, ids):
+    """{slice id: {"kpis", "monthly", "topDrugs"}} for every id present in `ids`."""
+    df = df.assign(SLICE=ids.to_numpy()).dropna(subset=["SLICE"])
+    grouped = df.groupby("SLICE", sort=False)
+    kpis = grouped.agg(total=("NET_CLAIM_COUNT", "size"), net=("NET_CLAIM_COUNT", "sum"),
+                       reversed=("REVERSED", "sum"), unique=("NDC", "nunique"))
+    kpis["rate"] = _rate(kpis["reversed"], kpis["total"])
+
+    monthly = (df.groupby(["SLICE", "MONTH_KEY"], sort=True)
+               .agg(incurred=("INCURRED", "sum"), reversed=("REVERSED", "sum"), net=("NET_CLAIM_COUNT", "sum"))
+               .reset_index())
+    drugs = (df[df["DRUG_NAME"].notna()].groupby(["SLICE", "DRUG_NAME"], sort=False)
+             .agg(net=("NET_CLAIM_COUNT", "sum"), total=("NET_CLAIM_COUNT", "size"), reversed=("REVERSED", "sum"))
+             .reset_index()
+             .sort_values(["SLICE", "net", "DRUG_NAME"], ascending=[True, False, True]))
+    drugs = drugs.groupby("SLICE", sort=False).head(TOP_DRUGS)
+    drugs["rate"] = _rate(drugs["reversed"], drugs["total"])
+
+    out = {
+        s: {"kpis": {"totalClaims": int(r.total), "netClaims": int(r.net),
+                     "reversalRate": float(r.rate), "uniqueDrugs": int(r.unique)},
+            "monthly": [], "topDrugs": []}
+        for s, r in zip(kpis.index, kpis.itertuples())
+    }
+    for r in monthly.itertuples(index=False):
+        out[r.SLICE]["monthly"].append(
+            {"month": r.MONTH_KEY, "incurred": int(r.incurred), "reversed": int(r.reversed), "net": int(r.net)})
+    for r in drugs.itertuples(index=False):
+        out[r.SLICE]["topDrugs"].append(
+            {"name": r.DRUG_NAME, "netClaims": int(r.net), "totalClaims": int(r.total), "reversalRate": float(r.rate)})
+    return out
+
+
+def build(claims, drugs, previous=None, pairs=()):
+    """Digest dict for one entity; slices whose checksum matches `previous` are reused."""
+    started = time.perf_counter()
+    df = prepare(claims, drugs)
+    old = previous["slices"] if previous and previous.get("version") == VERSION else {}
+    stats = BuildStats()
+    slices = {}
+    for dims in [(), *[(d,) for d in DIMENSIONS], *[tuple(p) for p in pairs]]:
+        ids = _slice_ids(df, dims)
+        sums = checksums(df, ids)
+        changed = {s for s, c in sums.items() if old.get(s, {}).get("checksum") != c}
+        for s in sums.keys() - changed:
+            slices[s] = old[s]
+        if changed:
+            rows = ids.isin(changed).to_numpy()
+            for s, body in compute_slices(df[rows], ids[rows]).items():
+                slices[s] = {"checksum": sums[s], **body}
+        stats.recomputed += len(changed)
+        stats.reused += len(sums) - len(changed)
+    stats.slices = len(slices)
+    stats.removed = len(old.keys() - slices.keys())
+    stats.elapsed = time.perf_counter() - started
+    digest = {
+        "version": VERSION,
+        "generated_at": time.time(),
+        "dimensions": [list(p) for p in pairs],
+        "slices": slices,
+    }
+    return digest, stats
+
+
+def _month_bounds(value, end=False):
+    d = date.fromisoformat(value)
+    if not end:
+        return f"{d:%Y-%m}" if d.day == 1 else None
+    last = (pd.Timestamp(d) + pd.offsets.MonthEnd(0)).date()
+    return f"{d:%Y-%m}" if d == last else None
+
+
+def lookup(digest, tool, filters, limit=10):
+    """The tool's result for `filters` (chat tool parameter names), or None to fall back to SQL.
+
+    Date filters are answerable only for the monthly trend, and only when they
+    fall on month boundaries.
+    """
+    if tool not in TOOLS:
+        raise ValueError(f"tool must be one of {TOOLS}")
+    filters = {k: v for k, v in filters.items() if v not in (None, "")}
+    start, end = filters.pop("dateStart", None), filters.pop("dateEnd", None)
+    entry = digest["slices"].get(slice_key(filters))
+    if entry is None:
+        return None
+    if tool == "topDrugs":
+        return None if start or end else entry["topDrugs"][:limit]
+    if tool == "kpis":
+        return None if start or end else entry["kpis"]
+    lo = _month_bounds(start) if start else ""
+    hi = _month_bounds(end, end=True) if end else "9999-12"
+    if lo is None or hi is None:
+        return None
+    return [m for m in entry["monthly"] if lo <= m["month"] <= hi]
+
+
+def digest_path(entity_id, directory=DEFAULT_DIR):
+    return Path(directory) / f"entity-{entity_id}.json.gz"
+
+
+def read_digest(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_digest(digest, path):
+    """Atomic write (temp file + rename) so readers never see a partial digest."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(digest, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def refresh(entity_id, claims_path=CLAIMS_PATH, drugs_path=DRUGS_PATH, directory=DEFAULT_DIR, pairs=(),
+            force=False):
+    """Rebuild one entity's digest if its sources changed; returns BuildStats or None if current."""
+    path = digest_path(entity_id, directory)
+    source = [[os.stat(p).st_mtime_ns, os.stat(p).st_size] for p in (claims_path, drugs_path)]
+    previous = read_digest(path) if path.exists() else None
+    pairs = [list(p) for p in pairs]
+    if (not force and previous and previous.get("version") == VERSION
+            and previous.get("source") == source and previous.get("dimensions") == pairs):
+        return None
+    digest, stats = build(load_claims(claims_path), load_drugs(drugs_path), previous, pairs)
+    digest.update(entity_id=entity_id, source=source)
+    write_digest(digest, path)
+    return stats
+
+
+def _entity(value):
+    entity_id, _, path = value.partition("=")
+    return int(entity_id), Path(path) if path else CLAIMS_PATH
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--entity", type=_entity, action="append", help="ID or ID=path (default: 1)")
+    b.add_argument("--drugs", default=DRUGS_PATH)
+    b.add_argument("--pairs", action="store_true", help=f"Also two-way slices {COMMON_PAIRS}")
+    b.add_argument("--force", action="store_true")
+    q = sub.add_parser("lookup")
+    q.add_argument("tool", choices=TOOLS)
+    q.add_argument("query", nargs="?", default="", help="Filter query string, e.g. state=KS&mony=N")
+    q.add_argument("--entity", type=int, default=1)
+    q.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        for entity_id, path in args.entity or [(1, CLAIMS_PATH)]:
+            stats = refresh(entity_id, path, args.drugs, args.dir, COMMON_PAIRS if args.pairs else (), args.force)
+            if stats is None:
+                print(f"entity {entity_id}: up to date")
+            else:
+                print(f"entity {entity_id}: {stats.slices:,} slices, {stats.recomputed:,} recomputed, "
+                      f"{stats.reused:,} reused, {stats.removed:,} removed ({stats.elapsed:.2f}s)")
+        return 0
+    from urllib.parse import parse_qsl
+
+    digest = read_digest(digest_path(args.entity, args.dir))
+    result = lookup(digest, args.tool, dict(parse_qsl(args.query)), args.limit)
+    if result is None:
+        print("not in digest (query the database)")
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
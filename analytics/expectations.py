@@ -0,0 +1,322 @@
+"""Declarative data-quality gate for incoming extracts, checked in one streaming pass.
+
+Each expectation is a small object that sees every chunk of the raw file (all
+columns as strings, so malformed values are caught rather than coerced) and
+reports the offending rows by offset — the 0-based data row, not counting the
+header. Aggregate expectations (uniqueness, date coverage) keep only the state
+they need and resolve at the end. Nothing is loaded into a full DataFrame.
+
+    python -m analytics.expectations claims "Case Study - Data/Claims_Export.csv"
+    python -m analytics.expectations drugs "Case Study - Data/Drug_Info.csv"
+"""
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import CLAIM_COLUMNS, CLAIMS_PATH, DRUG_COLUMNS, DRUGS_PATH, ENCODING, SEP
+from analytics.filters import FORMULARIES, STATES
+
+DEFAULT_CHUNK_SIZE = 100_000
+MAX_EXAMPLES = 20
+
+
+@dataclass
+class Result:
+    name: str
+    failed: int = 0
+    rows: list = field(default_factory=list)  # first MAX_EXAMPLES offending row offsets
+    detail: str = ""
+    allowed: int = 0
+
+    @property
+    def ok(self):
+        return self.failed <= self.allowed
+
+
+@dataclass
+class Report:
+    path: str
+    rows: int = 0
+    results: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results)
+
+
+def _blank(values):
+    return values.isna() | (values.str.strip() == "")
+
+
+def _integers(values):
+    """Parsed integers, NaN where a value is not a plain integer."""
+    return pd.to_numeric(values.where(values.str.fullmatch(r"-?\d+", na=False)), errors="coerce")
+
+
+class Expectation:
+    """Row-level expectation: subclasses implement failing(chunk) -> bool mask.
+
+    `mostly` is the fraction of rows that must pass (1.0 = every row).
+    """
+
+    mostly = 1.0
+
+    def __init__(self):
+        self.result = Result(self.name)
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def failing(self, chunk):
+        raise NotImplementedError
+
+    def update(self, chunk, offset):
+        bad = np.flatnonzero(self.failing(chunk).to_numpy())
+        self._record(bad + offset)
+
+    def _record(self, rows):
+        self.result.failed += len(rows)
+        room = MAX_EXAMPLES - len(self.result.rows)
+        if room > 0:
+            self.result.rows.extend(int(r) for r in rows[:room])
+
+    def finish(self, total_rows):
+        self.result.allowed = int(np.floor((1 - self.mostly) * total_rows + 1e-9))
+        return self.result
+
+
+class NotNull(Expectation):
+    def __init__(self, column):
+        self.column = column
+        super().__init__()
+
+    @property
+    def name(self):
+        return f"{self.column} not null"
+
+    def failing(self, chunk):
+        return _blank(chunk[self.column])
+
+
+class InSet(Expectation):
+    def __init__(self, column, values):
+        self.column, self.values = column, sorted(values)
+        super().__init__()
+
+    @property
+    def name(self):
+        return f"{self.column} in {{{', '.join(self.values)}}}"
+
+    def failing(self, chunk):
+        return ~chunk[self.column].isin(self.values)
+
+
+class IntegerBetween(Expectation):
+    def __init__(self, column, low, high):
+        self.column, self.low, self.high = column, low, high
+        super().__init__()
+
+    @property
+    def name(self):
+        return f"{self.column} integer in [{self.low}, {self.high}]"
+
+    def failing(self, chunk):
+        values = _integers(chunk[self.column])
+        return ~values.between(self.low, self.high)
+
+
+class DateBetween(Expectation):
+    def __init__(self, column, start, end, fmt="%Y%m%d"):
+        self.column, self.fmt = column, fmt
+        self.start, self.end = pd.Timestamp(start), pd.Timestamp(end)
+        super().__init__()
+
+    @property
+    def name(self):
+        return f"{self.column} date in [{self.start:%Y-%m-%d}, {self.end:%Y-%m-%d}]"
+
+    def failing(self, chunk):
+        dates = pd.to_datetime(chunk[self.column], format=self.fmt, errors="coerce")
+        return ~dates.between(self.start, self.end)
+
+
+class Joinable(Expectation):
+    """Values must exist in a reference set (e.g. claim NDCs in drug_info).
+
+    With numeric=True both sides compare as integers, so zero-padding differences
+    between the two files don't count as misses.
+    """
+
+    def __init__(self, column, reference, label, mostly=1.0, numeric=False):
+        self.column, self.label, self.mostly, self.numeric = column, label, mostly, numeric
+        reference = pd.Series(np.asarray(list(reference), dtype=object))
+        self.reference = pd.Index((_integers(reference.astype(str)) if numeric else reference).dropna().unique())
+        super().__init__()
+
+    @property
+    def name(self):
+        return f"{self.column} found in {self.label}"
+
+    def failing(self, chunk):
+        values = _integers(chunk[self.column]) if self.numeric else chunk[self.column]
+        return ~values.isin(self.reference)
+
+
+class Unique(Expectation):
+    """No value repeats; every occurrence of a duplicate is reported."""
+
+    def __init__(self, column):
+        self.column = column
+        self._values = []
+        super().__init__()
+
+    @property
+    def name(self):
+        return f"{self.column} unique"
+
+    def update(self, chunk, offset):
+        self._values.append(chunk[self.column].to_numpy())
+
+    def finish(self, total_rows):
+        if self._values:
+            values = pd.Series(np.concatenate(self._values))
+            dup = values.duplicated(keep=False).to_numpy()
+            self._record(np.flatnonzero(dup))
+            self.result.detail = f"{values[dup].nunique():,} repeated values" if dup.any() else ""
+        return super().finish(total_rows)
+
+
+class CoversDates(Expectation):
+    """Every calendar day in [start, end] has at least one row."""
+
+    def __init__(self, column, start, end, fmt="%Y%m%d"):
+        self.column, self.fmt = column, fmt
+        self.days = pd.date_range(start, end, freq="D")
+        self._seen = np.zeros(len(self.days), dtype=bool)
+        super().__init__()
+
+    @property
+    def name(self):
+        return f"{self.column} covers {self.days[0]:%Y-%m-%d}..{self.days[-1]:%Y-%m-%d}"
+
+    def update(self, chunk, offset):
+        dates = pd.to_datetime(chunk[self.column], format=self.fmt, errors="coerce").dropna()
+        idx = (dates.to_numpy() - self.days[0].to_datetime64()) // np.timedelta64(1, "D")
+        self._seen[idx[(idx >= 0) & (idx < len(self.days))]] = True
+
+    def finish(self, total_rows):
+        missing = self.days[~self._seen]
+        self.result.failed = len(missing)
+        if len(missing):
+            shown = ", ".join(f"{d:%Y-%m-%d}" for d in missing[:MAX_EXAMPLES])
+            self.result.detail = f"missing days: {shown}"
+        return super().finish(total_rows)
+
+
+def claims_expectations(drug_ndcs=None, start="2021-01-01", end="2021-12-31", max_unmatched=0.001):
+    """The Claims_Export.csv structure checks (test_claims_shape, test_join_coverage)."""
+    suite = [NotNull(c) for c in CLAIM_COLUMNS]
+    suite += [
+        InSet("ADJUDICATED", {"True", "False"}),
+        InSet("NET_CLAIM_COUNT", {"1", "-1"}),
+        InSet("PHARMACY_STATE", STATES),
+        InSet("FORMULARY", FORMULARIES),
+        InSet("MAILRETAIL", {"R", "M"}),
+        IntegerBetween("DAYS_SUPPLY", 1, 120),
+        IntegerBetween("NDC", 1, 99_999_999_999),
+        DateBetween("DATE_FILLED", start, end),
+        CoversDates("DATE_FILLED", start, end),
+    ]
+    if drug_ndcs is not None:
+        suite.append(Joinable("NDC", drug_ndcs, "drug_info", mostly=1 - max_unmatched, numeric=True))
+    return suite
+
+
+def drug_expectations():
+    """The Drug_Info.csv structure checks: no nulls, one row per NDC."""
+    return [NotNull(c) for c in DRUG_COLUMNS] + [IntegerBetween("NDC", 1, 99_999_999_999), Unique("NDC")]
+
+
+def drug_ndcs(path=DRUGS_PATH):
+    """Distinct raw NDC strings from a Drug_Info.csv, for Joinable."""
+    return pd.read_csv(path, sep=SEP, encoding=ENCODING, usecols=["NDC"], dtype=str)["NDC"].unique()
+
+
+def validate(path, expectations, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run every expectation over the file in a single chunked pass."""
+    started = time.perf_counter()
+    report = Report(str(path))
+    reader = pd.read_csv(path, sep=SEP, encoding=ENCODING, dtype=str, keep_default_na=False,
+                         chunksize=chunk_size)
+    try:
+        for chunk in reader:
+            if report.rows == 0:
+                missing = [c for c in columns if c not in chunk.columns]
+                if missing:
+                    report.results.append(Result("columns", len(missing), detail=f"missing: {missing}"))
+                    break
+            chunk.index = pd.RangeIndex(report.rows, report.rows + len(chunk))
+            for expectation in expectations:
+                expectation.update(chunk, report.rows)
+            report.rows += len(chunk)
+    except pd.errors.ParserError as exc:
+        report.results.append(Result("parse", 1, [report.rows], detail=str(exc)))
+    finally:
+        reader.close()
+    if not any(r.name == "columns" for r in report.results):
+        report.results.extend(e.finish(report.rows) for e in expectations)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def validate_claims(path=CLAIMS_PATH, drugs_path=DRUGS_PATH, **kwargs):
+    ndcs = drug_ndcs(drugs_path) if drugs_path else None
+    return validate(path, claims_expectations(ndcs, **kwargs), CLAIM_COLUMNS)
+
+
+def validate_drugs(path=DRUGS_PATH):
+    return validate(path, drug_expectations(), DRUG_COLUMNS)
+
+
+def format_report(report):
+    """Human-readable pass/fail list with example row offsets."""
+    failed = [r for r in report.results if not r.ok]
+    lines = [f"{report.path}: {report.rows:,} rows, {len(report.results)} expectations "
+             f"in {report.elapsed:.2f}s — {len(failed)} failed"]
+    for r in report.results:
+        status = "ok  " if r.ok else "FAIL"
+        counts = f"{r.failed:,} violations" + (f" (allowed {r.allowed:,})" if r.allowed else "")
+        lines.append(f"  {status} {r.name}: {counts}")
+        if r.detail:
+            lines.append(f"         {r.detail}")
+        if r.rows and r.failed:
+            more = " ..." if r.failed > len(r.rows) else ""
+            lines.append(f"         rows {', '.join(map(str, r.rows))}{more}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=["claims", "drugs"])
+    parser.add_argument("path", nargs="?")
+    parser.add_argument("--drugs", default=DRUGS_PATH, help="Drug_Info.csv for the NDC join check")
+    parser.add_argument("--start", default="2021-01-01")
+    parser.add_argument("--end", default="2021-12-31")
+    args = parser.parse_args(argv)
+
+    if args.kind == "claims":
+        report = validate_claims(args.path or CLAIMS_PATH, args.drugs, start=args.start, end=args.end)
+    else:
+        report = validate_drugs(args.path or DRUGS_PATH)
+    print(format_report(report))
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Stream filtered claim rows, enriched with drug_info, as CSV or gzip.
+
+Takes the same filter query string as the dashboard (see parse-filters.ts) and
+writes matching claims chunk by chunk, flushing after each one, so memory stays
+flat and the first bytes reach the consumer immediately.
+
+    python -m analytics.export "state=KS&dateStart=2021-08-01" -o ks_aug.csv.gz
+    python -m analytics.export "mony=N" --source extract -o - > brand.csv
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import os
+import sys
+
+import pandas as pd
+
+from analytics.data import CLAIM_COLUMNS, CLAIMS_PATH, DRUG_COLUMNS, ENCODING, SEP, load_drugs
+from analytics.filters import build_where, claims_mask, parse_filters
+
+EXPORT_COLUMNS = CLAIM_COLUMNS + DRUG_COLUMNS[1:]
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+_SELECT = """
+    SELECT c.adjudicated, c.formulary, TO_CHAR(c.date_filled, 'YYYYMMDD'), c.ndc,
+           c.days_supply, c.group_id, c.pharmacy_state, c.mail_retail, c.net_claim_count,
+           d.drug_name, d.label_name, d.mony, d.manufacturer_name
+    FROM claims c LEFT JOIN drug_info d ON c.ndc = d.ndc
+    WHERE {where}
+    ORDER BY c.id
+"""
+
+
+class ChunkWriter:
+    """Writes CSV chunks to a binary stream, optionally gzip-compressed.
+
+    Every chunk is flushed through the compressor (Z_SYNC_FLUSH) so a reader
+    can decode everything written so far without waiting for the trailer.
+    """
+
+    def __init__(self, out, compress=False):
+        self._out = out
+        self._gz = gzip.GzipFile(fileobj=out, mode="wb") if compress else None
+        self.rows = 0
+
+    def __enter__(self):
+        self._emit(",".join(EXPORT_COLUMNS) + "\n")
+        return self
+
+    def __exit__(self, *exc):
+        if self._gz is not None:
+            self._gz.close()
+        self._out.flush()
+
+    def write(self, chunk):
+        """Write a DataFrame or a list of row tuples in EXPORT_COLUMNS order."""
+        if isinstance(chunk, pd.DataFrame):
+            text = chunk.to_csv(header=False, index=False)
+        else:
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerows(chunk)
+            text = buf.getvalue()
+        self.rows += len(chunk)
+        self._emit(text)
+
+    def _emit(self, text):
+        data = text.encode("utf-8")
+        if self._gz is not None:
+            self._gz.write(data)
+            self._gz.flush()
+        else:
+            self._out.write(data)
+        self._out.flush()
+
+
+async def stream_db(dsn, filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of matching rows from Postgres through a server-side cursor."""
+    import asyncpg
+
+    where, params = build_where(filters)
+    conn = await asyncpg.connect(dsn)
+    try:
+        async with conn.transaction():
+            cursor = await conn.cursor(_SELECT.format(where=where), *params)
+            while rows := await cursor.fetch(chunk_size):
+                yield [tuple(r) for r in rows]
+    finally:
+        await conn.close()
+
+
+def stream_extract(filters, claims_path=CLAIMS_PATH, drugs=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield matching rows from a raw Claims_Export.csv, one DataFrame per chunk."""
+    drugs = load_drugs() if drugs is None else drugs
+    drug_lookup = drugs[DRUG_COLUMNS].drop_duplicates("NDC").set_index("NDC")
+    reader = pd.read_csv(claims_path, sep=SEP, encoding=ENCODING, chunksize=chunk_size)
+    for chunk in reader:
+        chunk["DATE"] = pd.to_datetime(chunk["DATE_FILLED"], format="%Y%m%d")
+        enriched = drug_lookup.reindex(chunk["NDC"].to_numpy())
+        for col in DRUG_COLUMNS[1:]:
+            chunk[col] = enriched[col].to_numpy()
+        matched = chunk[claims_mask(chunk, filters)]
+        if len(matched):
+            yield matched[EXPORT_COLUMNS]
+
+
+async def export_db(dsn, filters, out, compress=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream matching claims from Postgres to `out`; returns the row count."""
+    with ChunkWriter(out, compress) as writer:
+        async for rows in stream_db(dsn, filters, chunk_size):
+            writer.write(rows)
+    return writer.rows
+
+
+def export_extract(filters, out, compress=False, claims_path=CLAIMS_PATH, drugs=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream matching claims from the raw extract to `out`; returns the row count."""
+    with ChunkWriter(out, compress) as writer:
+        for chunk in stream_extract(filters, claims_path, drugs, chunk_size):
+            writer.write(chunk)
+    return writer.rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("query", nargs="?", default="", help="Dashboard filter query string")
+    parser.add_argument("-o", "--output", default="-", help="Output path; .gz enables gzip (default: stdout)")
+    parser.add_argument("--gzip", action="store_true", help="Force gzip compression")
+    parser.add_argument("--source", choices=["db", "extract"], default="db")
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--claims", default=CLAIMS_PATH, help="Claims CSV for --source extract")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    filters = parse_filters(args.query)
+    compress = args.gzip or args.output.endswith(".gz")
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        if args.source == "db":
+            if not args.dsn:
+                parser.error("--dsn or DATABASE_URL is required for --source db")
+            rows = asyncio.run(export_db(args.dsn, filters, out, compress, args.chunk_size))
+        else:
+            rows = export_extract(filters, out, compress, args.claims, chunk_size=args.chunk_size)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"Exported {rows:,} claims", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
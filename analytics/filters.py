@@ -0,0 +1,185 @@
+"""Python mirror of the dashboard filter set (src/lib/parse-filters.ts).
+
+Parses the same URL query string the API routes accept, and applies it either
+as a parameterized SQL WHERE clause or as a boolean mask over a claims frame.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from urllib.parse import parse_qs
+
+import pandas as pd
+
+from analytics.data import FLAGGED_NDCS
+
+log = logging.getLogger(__name__)
+
+FORMULARIES = ("OPEN", "MANAGED", "HMF")
+STATES = ("CA", "IN", "PA", "KS", "MN")
+MONY_TYPES = ("M", "O", "N", "Y")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_DATE_PATTERN = re.compile(r"^\d{4}-?\d{2}-?\d{2}$")
+
+
+@dataclass(frozen=True)
+class Filters:
+    entity_id: int = 1
+    formulary: str = None
+    state: str = None
+    mony: str = None
+    manufacturer: str = None
+    drug: str = None
+    ndc: str = None
+    date_start: date = None
+    date_end: date = None
+    group_id: str = None
+    include_flagged_ndcs: bool = False
+    limit: int = DEFAULT_LIMIT
+
+    @property
+    def needs_drug_join(self):
+        return bool(self.mony or self.manufacturer or self.drug)
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _enum(value, allowed):
+    if value not in allowed:
+        raise InvalidFilter(f"{value!r} not in {allowed}")
+    return value
+
+
+def _string(value, max_length):
+    if len(value) > max_length:
+        raise InvalidFilter(f"{value[:20]!r}... longer than {max_length}")
+    return value
+
+
+def _date(value):
+    if not _DATE_PATTERN.match(value):
+        raise InvalidFilter(f"Invalid date format: {value!r}")
+    try:
+        return datetime.strptime(value.replace("-", ""), "%Y%m%d").date()
+    except ValueError:
+        raise InvalidFilter(f"Invalid date: {value!r}") from None
+
+
+def _entity_id(value):
+    try:
+        entity_id = int(value)
+    except ValueError:
+        raise InvalidFilter(f"entityId {value!r} is not an integer") from None
+    if entity_id <= 0:
+        raise InvalidFilter(f"entityId {entity_id} is not positive")
+    return entity_id
+
+
+def _limit(value):
+    try:
+        limit = float(value)
+    except ValueError:
+        raise InvalidFilter(f"limit {value!r} is not a number") from None
+    if not limit.is_integer() or not 0 < limit <= MAX_LIMIT:
+        raise InvalidFilter(f"limit {value!r} is not an integer in 1..{MAX_LIMIT}")
+    return int(limit)
+
+
+_FIELDS = {
+    "entityId": ("entity_id", _entity_id),
+    "formulary": ("formulary", lambda v: _enum(v, FORMULARIES)),
+    "state": ("state", lambda v: _enum(v, STATES)),
+    "mony": ("mony", lambda v: _enum(v, MONY_TYPES)),
+    "manufacturer": ("manufacturer", lambda v: _string(v, 200)),
+    "drug": ("drug", lambda v: _string(v, 200)),
+    "ndc": ("ndc", lambda v: _string(v, 20)),
+    "dateStart": ("date_start", _date),
+    "dateEnd": ("date_end", _date),
+    "groupId": ("group_id", lambda v: _string(v, 50)),
+    "limit": ("limit", _limit),
+}
+
+
+def parse_filters(params):
+    """Filters from a query string or mapping, using the same rules as parseFilters.
+
+    Like the TypeScript version, invalid input falls back to the safe defaults
+    instead of raising.
+    """
+    if isinstance(params, str):
+        params = {k: v[0] for k, v in parse_qs(params.lstrip("?")).items()}
+    values = {"include_flagged_ndcs": params.get("flagged") == "true"}
+    try:
+        for key, (field, convert) in _FIELDS.items():
+            if params.get(key) is not None:
+                values[field] = convert(params[key])
+    except InvalidFilter as err:
+        log.warning("[validation] Invalid filter params: %s", err)
+        return Filters()
+    return Filters(**values)
+
+
+def build_where(filters, alias="c", drug_alias="d"):
+    """WHERE clause and asyncpg positional parameters matching the API routes."""
+    c, d = alias, drug_alias
+    parts = [f"{c}.entity_id = $1"]
+    params = [filters.entity_id]
+
+    def add(clause, value):
+        params.append(value)
+        parts.append(clause.format(p=f"${len(params)}"))
+
+    if not filters.include_flagged_ndcs and FLAGGED_NDCS:
+        add(f"{c}.ndc <> ALL({{p}}::text[])", [str(n) for n in FLAGGED_NDCS])
+    if filters.formulary:
+        add(f"{c}.formulary = {{p}}", filters.formulary)
+    if filters.state:
+        add(f"{c}.pharmacy_state = {{p}}", filters.state)
+    if filters.group_id:
+        add(f"{c}.group_id = {{p}}", filters.group_id)
+    if filters.ndc:
+        add(f"{c}.ndc = {{p}}", filters.ndc)
+    if filters.date_start:
+        add(f"{c}.date_filled >= {{p}}", filters.date_start)
+    if filters.date_end:
+        add(f"{c}.date_filled <= {{p}}", filters.date_end)
+    if filters.mony:
+        add(f"{d}.mony = {{p}}", filters.mony)
+    if filters.manufacturer:
+        add(f"{d}.manufacturer_name = {{p}}", filters.manufacturer)
+    if filters.drug:
+        add(f"{d}.drug_name = {{p}}", filters.drug)
+    return " AND ".join(parts), params
+
+
+def claims_mask(df, filters):
+    """Boolean mask over a claims frame (optionally merged with drug columns).
+
+    entity_id is ignored — a claims frame is always a single entity's extract.
+    """
+    mask = pd.Series(True, index=df.index)
+    if not filters.include_flagged_ndcs:
+        mask &= ~df["NDC"].isin(FLAGGED_NDCS)
+    if filters.formulary:
+        mask &= df["FORMULARY"] == filters.formulary
+    if filters.state:
+        mask &= df["PHARMACY_STATE"] == filters.state
+    if filters.group_id:
+        mask &= df["GROUP_ID"].astype(str) == filters.group_id
+    if filters.ndc:
+        mask &= df["NDC"].astype(str) == filters.ndc
+    if filters.date_start:
+        mask &= df["DATE"] >= pd.Timestamp(filters.date_start)
+    if filters.date_end:
+        mask &= df["DATE"] <= pd.Timestamp(filters.date_end)
+    if filters.mony:
+        mask &= df["MONY"] == filters.mony
+    if filters.manufacturer:
+        mask &= df["MANUFACTURER_NAME"] == filters.manufacturer
+    if filters.drug:
+        mask &= df["DRUG_NAME"] == filters.drug
+    return mask
@@ -0,0 +1,179 @@
+"""Adjudication and reversal rate homogeneity across every value of every dimension.
+
+Each dimension (a column, or a tuple of columns such as ("PHARMACY_STATE",
+"PERIOD")) is factorized into cell codes; the codes of all dimensions are
+offset into one id space and the claim, adjudicated and reversed counts of
+every cell come from a single bincount. Per cell: the rate, a Wilson
+confidence interval, and a two-proportion z test against the rest of the
+entity. P-values are Benjamini-Hochberg adjusted across all tested cells of a
+rate. Per dimension: a chi-square test of homogeneity across its values.
+When the frame has ENTITY_ID, every cell and baseline is per entity.
+
+    python -m analytics.homogeneity                    # significant outliers, both rates
+    python -m analytics.homogeneity --rate reversal --min-claims 500
+"""
+import argparse
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import RATES, exclude_flagged, load_claims, load_drugs, merge_drugs, successes
+from analytics.periods import period_labels, periods_of
+
+DEFAULT_DIMENSIONS = (
+    "PHARMACY_STATE", "FORMULARY", "MONY", "MAILRETAIL", "PERIOD", "DAYS_SUPPLY",
+    "GROUP_ID", "MANUFACTURER_NAME", "NDC", ("PHARMACY_STATE", "PERIOD"), ("GROUP_ID", "PERIOD"),
+)
+
+MIN_CLAIMS = 100
+ALPHA = 0.01
+CONFIDENCE_Z = 1.959964  # 95%
+
+_erfc = np.vectorize(math.erfc, otypes=[float])
+
+
+def wilson_interval(k, n, z=CONFIDENCE_Z):
+    """Wilson score interval for k successes in n trials (arrays), as proportions."""
+    n = np.asarray(n, dtype=float)
+    p = np.divide(k, n, out=np.full_like(n, np.nan), where=n > 0)
+    denom = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return centre - half, centre + half
+
+
+def normal_sf2(z):
+    """Two-sided normal tail probability of |z|."""
+    return _erfc(np.abs(z) / math.sqrt(2))
+
+
+def chi2_sf(x, df):
+    """Chi-square upper tail via the Wilson-Hilferty cube-root normal approximation."""
+    x, df = np.asarray(x, dtype=float), np.asarray(df, dtype=float)
+    v = 2 / (9 * df)
+    z = ((x / df) ** (1 / 3) - (1 - v)) / np.sqrt(v)
+    return _erfc(z / math.sqrt(2)) / 2
+
+
+def bh_adjust(p):
+    """Benjamini-Hochberg q-values (NaN entries are left out and stay NaN)."""
+    p = np.asarray(p, dtype=float)
+    q = np.full_like(p, np.nan)
+    ok = np.flatnonzero(~np.isnan(p))
+    order = ok[np.argsort(p[ok])]
+    ranked = p[order] * len(order) / np.arange(1, len(order) + 1)
+    q[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q
+
+
+def rate_table(claims, dimensions=DEFAULT_DIMENSIONS, rates=RATES, z=CONFIDENCE_Z):
+    """One row per (rate, dimension, value): claims, events, rate and CI (%), z and p vs the rest."""
+    entity = (claims.groupby("ENTITY_ID", sort=True).ngroup().to_numpy() if "ENTITY_ID" in claims.columns
+              else np.zeros(len(claims), dtype=np.int64))
+    n_entities = int(entity.max(initial=0)) + 1
+
+    if "PERIOD" not in claims.columns:
+        claims = claims.assign(PERIOD=periods_of(claims))
+    codes, index, offset = [], [], 0
+    for dim in dimensions:
+        cols = list(dim) if isinstance(dim, tuple) else [dim]
+        keyed = (["ENTITY_ID"] if "ENTITY_ID" in claims.columns else []) + cols
+        grouped = claims.groupby(keyed, sort=True, observed=True)
+        code = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)  # -1: missing value
+        keys = grouped.size().index
+        codes.append(np.where(code >= 0, code + offset, -1))
+        name = "+".join(cols)
+        labels = (keys.to_frame(index=False, name=keyed) if isinstance(keys, pd.MultiIndex)
+                  else pd.DataFrame({keyed[0]: keys.to_numpy()}))
+        if "PERIOD" in labels.columns:
+            labels["PERIOD"] = period_labels(labels["PERIOD"].to_numpy())
+        for key in labels.itertuples(index=False, name=None):
+            value = key[1:] if "ENTITY_ID" in keyed else key
+            index.append((key[0] if "ENTITY_ID" in keyed else None, name,
+                          value[0] if len(value) == 1 else "|".join(map(str, value))))
+        offset += len(keys)
+
+    flat = np.concatenate(codes)
+    valid = flat >= 0
+    row = np.tile(np.arange(len(claims)), len(dimensions))[valid]
+    flat = flat[valid]
+    cell_entity = np.zeros(offset, dtype=np.int64)
+    cell_entity[flat] = entity[row]
+    n = np.bincount(flat, minlength=offset)
+    entity_n = np.bincount(entity, minlength=n_entities)
+
+    frames = []
+    cells = pd.DataFrame(index, columns=["ENTITY_ID", "dimension", "value"])
+    for rate in rates:
+        hit = successes(claims, rate)
+        k = np.bincount(flat, weights=hit[row], minlength=offset)
+        entity_k = np.bincount(entity, weights=hit, minlength=n_entities)
+        big_n, big_k = entity_n[cell_entity], entity_k[cell_entity]
+        rest_n = big_n - n
+        p0 = big_k / big_n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = k / n
+            p_rest = (big_k - k) / rest_n
+            zs = (p - p_rest) / np.sqrt(p0 * (1 - p0) * (1 / n + 1 / rest_n))
+        zs[rest_n == 0] = np.nan
+        lo, hi = wilson_interval(k, n, z)
+        frames.append(cells.assign(rate=rate, claims=n, events=k.astype(np.int64), rate_pct=p * 100,
+                                   ci_lo=lo * 100, ci_hi=hi * 100, baseline_pct=p0 * 100, z=zs,
+                                   p_value=normal_sf2(zs)))
+    table = pd.concat(frames, ignore_index=True)
+    if "ENTITY_ID" not in claims.columns:
+        table = table.drop(columns="ENTITY_ID")
+    return table
+
+
+def homogeneity(table, min_claims=MIN_CLAIMS):
+    """Chi-square test of homogeneity per (rate, dimension) over values with at least `min_claims`."""
+    t = table[table["claims"] >= min_claims]
+    by = (["ENTITY_ID"] if "ENTITY_ID" in t.columns else []) + ["rate", "dimension"]
+    g = t.groupby(by, sort=False)
+    pooled = g["events"].transform("sum") / g["claims"].transform("sum")
+    expected = t["claims"] * pooled
+    contrib = (t["events"] - expected) ** 2 / (expected * (1 - pooled))
+    out = t.assign(_c=contrib).groupby(by, sort=False).agg(
+        values=("value", "size"), chi2=("_c", "sum"),
+        min_pct=("rate_pct", "min"), max_pct=("rate_pct", "max"),
+    )
+    out["df"] = out["values"] - 1
+    out = out[out["df"] > 0]
+    out["spread_pp"] = out["max_pct"] - out["min_pct"]
+    out["p_value"] = chi2_sf(out["chi2"], out["df"])
+    return out.sort_values(["rate", "chi2"], ascending=[True, False])
+
+
+def outliers(table, alpha=ALPHA, min_claims=MIN_CLAIMS):
+    """Cells whose rate differs from the rest of the entity at FDR `alpha`, most extreme first."""
+    t = table[(table["claims"] >= min_claims) & table["z"].notna()].copy()
+    t["q_value"] = np.nan
+    for _, idx in t.groupby("rate").groups.items():
+        t.loc[idx, "q_value"] = bh_adjust(t.loc[idx, "p_value"].to_numpy())
+    t = t[t["q_value"] < alpha]
+    return t.reindex(t["z"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", choices=RATES, action="append")
+    parser.add_argument("--min-claims", type=int, default=MIN_CLAIMS)
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--top", type=int, default=40)
+    args = parser.parse_args(argv)
+
+    claims = merge_drugs(exclude_flagged(load_claims()), load_drugs())
+    table = rate_table(claims, rates=args.rate or RATES)
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.precision", 2):
+        print(homogeneity(table, args.min_claims).to_string())
+        found = outliers(table, args.alpha, args.min_claims)
+        print(f"\n{len(found):,} significant outliers (FDR {args.alpha}, >= {args.min_claims} claims)")
+        print(found.head(args.top).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Idempotent claim ingestion keyed on a per-row fingerprint.
+
+A claim has no natural key, so each row is fingerprinted from its content: a
+64-bit BLAKE2b hash of the canonical row (the nine extract columns joined with
+"~", as they appear in the file), mixed with the row's occurrence number among
+identical rows so legitimate repeats stay distinct. The fingerprint is stored in
+claims.fingerprint (bigint) under a unique (entity_id, fingerprint) index.
+
+Ingesting an extract fetches the entity's existing fingerprints, diffs them
+client-side and copies only the rows not already present — a re-delivered or
+overlapping file costs only its new rows. Exact and near duplicates (same fill,
+differing only in formulary / mail-retail / adjudication) are reported.
+
+    python -m analytics.ingest path/to/Claims_Export.csv --entity 1 --dry-run
+    python -m analytics.ingest path/to/Claims_Export.csv --entity 1
+    python -m analytics.ingest --entity 1 --backfill       # fingerprint rows seeded by seed.ts
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import CLAIM_COLUMNS, CLAIMS_PATH, load_claims
+
+# Same fill: everything but the columns a correction or re-adjudication may change
+NEAR_KEY = ["GROUP_ID", "NDC", "DATE_FILLED", "DAYS_SUPPLY", "PHARMACY_STATE", "NET_CLAIM_COUNT"]
+
+DB_COLUMNS = ["adjudicated", "formulary", "date_filled", "ndc", "days_supply", "group_id",
+              "pharmacy_state", "mail_retail", "net_claim_count"]
+
+_OCCURRENCE_STEP = np.uint64(0x9E3779B97F4A7C15)
+
+
+@dataclass
+class IngestResult:
+    rows: int = 0
+    new: int = 0
+    existing: int = 0
+    inserted: int = 0
+    missing: int = 0          # fingerprints in the database but not in this extract
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    elapsed: float = 0.0
+
+
+def canonical_rows(claims):
+    """The nine extract columns of each row joined with "~", independent of dtypes."""
+    adjudicated = claims["ADJUDICATED"].map({True: "True", False: "False", "True": "True", "False": "False"})
+    parts = [adjudicated] + [claims[c].astype(str) for c in CLAIM_COLUMNS[1:]]
+    out = parts[0].str.cat(parts[1:], sep="~")
+    return out.to_numpy(dtype=object)
+
+
+def content_hashes(claims):
+    """uint64 BLAKE2b-64 of each canonical row; identical rows hash identically."""
+    digests = b"".join(hashlib.blake2b(r.encode(), digest_size=8).digest() for r in canonical_rows(claims))
+    return np.frombuffer(digests, dtype=">u8").astype(np.uint64)
+
+
+def _mix(x):
+    """splitmix64 finalizer (vectorized, wrapping uint64 arithmetic)."""
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def fingerprints(claims, hashes=None):
+    """int64 fingerprint per row: content hash mixed with its occurrence among identical rows.
+
+    Occurrences are numbered in file order, so the k-th copy of a row gets the
+    same fingerprint in every extract that contains at least k copies.
+    """
+    if hashes is None:
+        hashes = content_hashes(claims)
+    occurrence = pd.Series(hashes).groupby(hashes, sort=False).cumcount().to_numpy(dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        return _mix(hashes + occurrence * _OCCURRENCE_STEP).view(np.int64)
+
+
+def exact_duplicates(claims, hashes=None):
+    """Rows that repeat an earlier row exactly, with how many copies each has."""
+    if hashes is None:
+        hashes = content_hashes(claims)
+    repeated = pd.Series(hashes).duplicated(keep=False).to_numpy()
+    dups = claims.loc[repeated, CLAIM_COLUMNS]
+    return dups.groupby(CLAIM_COLUMNS, sort=True).size().rename("copies").reset_index()
+
+
+def near_duplicates(claims, key=NEAR_KEY):
+    """Fills (same `key`) that appear with more than one distinct value of the other columns.
+
+    One row per such fill; `differs` lists the columns whose values disagree.
+    """
+    rest = [c for c in CLAIM_COLUMNS if c not in key]
+    distinct = claims[CLAIM_COLUMNS].drop_duplicates()
+    counts = distinct.groupby(key, sort=True)[rest].nunique()
+    conflicted = counts[(counts > 1).any(axis=1)]
+    out = conflicted.reset_index()[key]
+    out["differs"] = [", ".join(c for c in rest if row[c] > 1) for _, row in conflicted.iterrows()]
+    out["variants"] = distinct.groupby(key, sort=True).size().loc[conflicted.index].to_numpy()
+    return out
+
+
+# --- database ----------------------------------------------------------------
+
+async def ensure_schema(conn):
+    """Add claims.fingerprint and its unique index if the table predates them."""
+    await conn.execute("ALTER TABLE claims ADD COLUMN IF NOT EXISTS fingerprint bigint")
+    await conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_claims_entity_fingerprint "
+                       "ON claims (entity_id, fingerprint)")
+
+
+def _from_rows(rows):
+    """Claims frame (extract columns) from claims table records."""
+    df = pd.DataFrame([tuple(r) for r in rows], columns=["id"] + DB_COLUMNS)
+    return df.id, pd.DataFrame({
+        "ADJUDICATED": df["adjudicated"].astype(bool),
+        "FORMULARY": df["formulary"],
+        "DATE_FILLED": pd.to_datetime(df["date_filled"]).dt.strftime("%Y%m%d"),
+        "NDC": df["ndc"].str.lstrip("0"),
+        "DAYS_SUPPLY": df["days_supply"],
+        "GROUP_ID": df["group_id"],
+        "PHARMACY_STATE": df["pharmacy_state"].str.strip(),
+        "MAILRETAIL": df["mail_retail"],
+        "NET_CLAIM_COUNT": df["net_claim_count"],
+    })
+
+
+async def backfill(conn, entity_id):
+    """Fingerprint an entity's rows that have none (e.g. loaded by seed.ts); returns rows updated.
+
+    Occurrences are numbered in id order, i.e. the order seed.ts inserted them.
+    """
+    await ensure_schema(conn)
+    rows = await conn.fetch(f"SELECT id, {', '.join(DB_COLUMNS)}, fingerprint IS NULL AS pending "
+                            "FROM claims WHERE entity_id = $1 ORDER BY id", entity_id)
+    if not any(r["pending"] for r in rows):
+        return 0
+    ids, claims = _from_rows([r[:-1] for r in rows])
+    fps = fingerprints(claims)
+    pending = np.array([r["pending"] for r in rows])
+    async with conn.transaction():
+        await conn.execute("CREATE TEMP TABLE _fingerprints (id integer, fingerprint bigint) ON COMMIT DROP")
+        await conn.copy_records_to_table(
+            "_fingerprints", records=zip(ids[pending].tolist(), fps[pending].tolist()))
+        status = await conn.execute("UPDATE claims c SET fingerprint = f.fingerprint "
+                                    "FROM _fingerprints f WHERE c.id = f.id")
+    return int(status.split()[-1])
+
+
+def _records(claims, entity_id):
+    return zip(
+        [entity_id] * len(claims),
+        claims["ADJUDICATED"].astype(bool).tolist(),
+        claims["FORMULARY"].tolist(),
+        pd.to_datetime(claims["DATE_FILLED"].astype(str), format="%Y%m%d").dt.date.tolist(),
+        claims["NDC"].astype(str).tolist(),
+        claims["DAYS_SUPPLY"].astype(int).tolist(),
+        claims["GROUP_ID"].astype(str).tolist(),
+        claims["PHARMACY_STATE"].tolist(),
+        claims["MAILRETAIL"].tolist(),
+        claims["NET_CLAIM_COUNT"].astype(int).tolist(),
+        claims["FINGERPRINT"].tolist(),
+    )
+
+
+async def ingest(conn, claims, entity_id, dry_run=False):
+    """Insert the extract rows the entity doesn't have yet; safe to repeat."""
+    started = time.perf_counter()
+    await ensure_schema(conn)
+    hashes = content_hashes(claims)
+    fps = fingerprints(claims, hashes)
+    existing = np.array([r[0] for r in await conn.fetch(
+        "SELECT fingerprint FROM claims WHERE entity_id = $1 AND fingerprint IS NOT NULL", entity_id)],
+        dtype=np.int64)
+    new = ~np.isin(fps, existing)
+    result = IngestResult(
+        rows=len(claims), new=int(new.sum()), existing=int((~new).sum()),
+        missing=int((~np.isin(existing, fps)).sum()),
+        exact_duplicates=int(pd.Series(hashes).duplicated().sum()),
+        near_duplicates=len(near_duplicates(claims)),
+    )
+    if result.new and not dry_run:
+        fresh = claims.loc[new, CLAIM_COLUMNS].assign(FINGERPRINT=fps[new])
+        async with conn.transaction():
+            await conn.execute("CREATE TEMP TABLE _ingest (entity_id integer, adjudicated boolean, "
+                               "formulary varchar(20), date_filled date, ndc varchar(20), days_supply integer, "
+                               "group_id varchar(50), pharmacy_state char(2), mail_retail char(1), "
+                               "net_claim_count smallint, fingerprint bigint) ON COMMIT DROP")
+            await conn.copy_records_to_table("_ingest", records=_records(fresh, entity_id))
+            # ON CONFLICT covers a concurrent ingest of the same rows
+            status = await conn.execute(
+                f"INSERT INTO claims (entity_id, {', '.join(DB_COLUMNS)}, fingerprint) "
+                f"SELECT entity_id, {', '.join(DB_COLUMNS)}, fingerprint FROM _ingest "
+                "ON CONFLICT (entity_id, fingerprint) DO NOTHING")
+        result.inserted = int(status.split()[-1])
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def format_result(result, dry_run=False):
+    inserted = "dry run" if dry_run else f"{result.inserted:,} inserted"
+    return (f"{result.rows:,} rows: {result.new:,} new ({inserted}), {result.existing:,} already loaded, "
+            f"{result.missing:,} loaded rows not in this extract; "
+            f"{result.exact_duplicates:,} exact and {result.near_duplicates:,} near duplicates "
+            f"({result.elapsed:.2f}s)")
+
+
+async def _run(args):
+    import asyncpg
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        if args.backfill:
+            print(f"Fingerprinted {await backfill(conn, args.entity):,} rows")
+        if args.path:
+            claims = load_claims(args.path)
+            print(format_result(await ingest(conn, claims, args.entity, args.dry_run), args.dry_run))
+    finally:
+        await conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", help=f"Claims extract (e.g. {CLAIMS_PATH.name})")
+    parser.add_argument("--entity", type=int, default=1)
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be inserted")
+    parser.add_argument("--backfill", action="store_true", help="Fingerprint existing rows first")
+    parser.add_argument("--duplicates", action="store_true", help="Only list duplicates in the extract")
+    args = parser.parse_args(argv)
+
+    if args.duplicates:
+        claims = load_claims(args.path or CLAIMS_PATH)
+        with pd.option_context("display.max_rows", 50, "display.width", 200):
+            print(exact_duplicates(claims).to_string(index=False))
+            print(near_duplicates(claims).to_string(index=False))
+        return 0
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+    if not (args.path or args.backfill):
+        parser.error("nothing to do: give an extract path and/or --backfill")
+    asyncio.run(_run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,558 @@
+"""Batch precompute of the dashboard's narrative insight cards (src/lib/generate-insights.ts).
+
+`generate_insights` is a line-for-line port of the TypeScript templates, working
+on the same response-shaped dicts (OverviewResponse / ClaimsResponse fields).
+`build_cache` pre-aggregates the claims into a cube once, then derives those
+response fields for every commonly used filter slice with vectorized group-bys
+and runs the templates on each — for both the overview and explorer views. The
+result is a keyed cache ({view: {slice key: cards}}) plus an audit of which
+slices trigger which insights.
+
+    python -m analytics.insights build
+    python -m analytics.insights show "state=KS" --view explorer
+    python -m analytics.insights audit
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import CLAIMS_PATH, DRUGS_PATH, exclude_flagged, load_claims, load_drugs, merge_drugs
+from analytics.digests import DIMENSIONS, slice_key
+from analytics.periods import month_keys
+
+DEFAULT_PATH = Path(".cache/insights/entity-1.json.gz")
+VIEWS = ("overview", "explorer")
+DRUG_LIMIT = 20  # /api/claims default `limit`
+TOP_LIMIT = 10   # topGroups / topManufacturers
+
+# Filter slices to precompute: () is unfiltered; "month" expands to dateStart/dateEnd
+COMBINATIONS = [
+    (),
+    ("state",), ("formulary",), ("mony",), ("month",), ("groupId",), ("drug",), ("manufacturer",),
+    ("state", "formulary"), ("state", "mony"), ("state", "month"), ("formulary", "month"),
+    ("mony", "month"), ("drug", "state"), ("formulary", "mony"),
+]
+
+_COLUMNS = {**DIMENSIONS, "month": "MONTH_KEY"}
+
+STATE_NAMES = {"CA": "California", "IN": "Indiana", "KS": "Kansas", "MN": "Minnesota", "PA": "Pennsylvania"}
+
+
+# --- formatting (src/lib/format.ts) ----------------------------------------
+
+def _to_fixed(x, digits):
+    """Number.prototype.toFixed: exact binary value, ties away from zero."""
+    return str(Decimal(float(x)).quantize(Decimal(1).scaleb(-digits), rounding=ROUND_HALF_UP))
+
+
+def format_number(n):
+    return f"{n:,}"
+
+
+def format_percent(n):
+    return f"{_to_fixed(n, 1)}%"
+
+
+def abbreviate_number(n):
+    if abs(n) >= 1_000_000:
+        return f"{_to_fixed(n / 1_000_000, 1)}M"
+    if abs(n) >= 1_000:
+        return f"{math.floor(n / 1_000 + 0.5)}K"  # Math.round
+    return str(n)
+
+
+def ordinal(n):
+    return {1: "1st", 2: "2nd", 3: "3rd"}.get(n, f"{n}th")
+
+
+# --- templates ----------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Template:
+    id: str
+    priority: int  # lower = higher priority
+    match: object     # (filters, data, view) -> bool
+    generate: object  # (filters, data) -> card dict
+
+
+def _card(id_, severity, title, body):
+    return {"id": id_, "severity": severity, "title": title, "body": body}
+
+
+def _month_start(f, prefix):
+    start = f.get("dateStart") or ""
+    return start == f"{prefix}-01" or start.startswith(prefix)
+
+
+def _month_net(d, month):
+    m = next((m for m in d["monthly"] if m["month"] == month), None)
+    return m["incurred"] - m["reversed"] if m else 0
+
+
+def _state_rank(f, d):
+    ranked = sorted(d["allStates"], key=lambda s: -s["netClaims"])
+    rank = next((i for i, s in enumerate(ranked) if s["state"] == f["state"]), -1) + 1
+    total = sum(s["netClaims"] for s in ranked)
+    state = next((s for s in ranked if s["state"] == f["state"]), None)
+    share = _to_fixed(state["netClaims"] / total * 100, 1) if total > 0 and state else "0"
+    name = STATE_NAMES.get(f["state"], f["state"])
+    return _card("state-rank", "info", f"{name} — {ordinal(rank)} of {len(ranked)}",
+                 f"{f['state']} accounts for {share}% of total claims volume across all states.")
+
+
+def _state_groups(f, d):
+    state = next((s for s in d["allStates"] if s["state"] == f["state"]), None)
+    groups = state["groupCount"] if state else 0
+    net = state["netClaims"] if state else 0
+    avg = math.floor(net / groups + 0.5) if groups > 0 else 0
+    total_groups = sum(s["groupCount"] for s in d["allStates"])
+    return _card("state-groups", "info", f"{groups} Groups",
+                 f"{f['state']} has {groups} of {total_groups} total groups, averaging {format_number(avg)} "
+                 "claims per group. All groups are state-specific — no group spans multiple states.")
+
+
+def _formulary_active(f, d):
+    match = next((x for x in d["formulary"] if x["type"] == f["formulary"]), None)
+    body = (f"{f['formulary']} formulary: {format_number(match['netClaims'])} net claims, "
+            f"{format_percent(match['reversalRate'])} reversal rate. Formulary-level reversal rates are "
+            "remarkably uniform (~10.7–10.8%)." if match else f"Viewing {f['formulary']} formulary claims.")
+    return _card("formulary-active", "info", f"{f['formulary']} Formulary", body)
+
+
+def _generic_mix(f, d):
+    net = {m["type"]: m["netClaims"] for m in d["mony"]}
+    total = sum(m["netClaims"] for m in d["mony"])
+    pct = _to_fixed((net.get("Y", 0) + net.get("O", 0)) / total * 100, 0) if total > 0 else "0"
+    return _card("exp-generic-mix", "positive", "Heavy Generic Utilization",
+                 f"Generics (MONY Y+O) account for ~{pct}% of claims — consistent with aggressive LTC "
+                 "formulary management and generic utilization targets.")
+
+
+def _supply_cycles(f, d):
+    total = sum(b["count"] for b in d["daysSupply"])
+    short = sum(b["count"] for b in d["daysSupply"] if b["bin"].isdigit() and int(b["bin"]) <= 14)
+    pct = _to_fixed(short / total * 100, 0) if total > 0 else "0"
+    return _card("exp-supply-cycles", "info", "Short-Cycle Dispensing",
+                 f"{pct}% of fills are 14 days or fewer, reflecting LTC dispensing cycles where medications "
+                 "are reviewed and adjusted frequently. This is typical for skilled nursing and long-term care "
+                 "facilities.")
+
+
+def _top_drug_profile(f, d):
+    if not d["drugs"]:
+        return _card("exp-top-drug-profile", "info", "No Drugs", "No drugs match the current filters.")
+    top = d["drugs"][0]
+    return _card("exp-top-drug-profile", "info", "Top Drug Profile",
+                 f"{top['drugName']} leads with {format_number(top['netClaims'])} net claims "
+                 f"({format_percent(top['reversalRate'])} reversal rate). The top drug mix spans statins, GI "
+                 "medications, pain management, and anticoagulants — consistent with an elderly LTC population.")
+
+
+def _drug_detail(f, d):
+    drug = next((x for x in d["drugs"] if x["drugName"] == f["drug"]), None)
+    if not drug:
+        return _card("exp-drug-detail", "info", f["drug"], f"Viewing claims for {f['drug']}.")
+    elevated = drug["reversalRate"] > 15
+    return _card("exp-drug-detail", "warning" if elevated else "info", drug["drugName"],
+                 f"{drug['drugName']} accounts for {format_number(drug['netClaims'])} net claims with a "
+                 f"{format_percent(drug['reversalRate'])} reversal rate. Primarily dispensed under "
+                 f"{drug['formulary']} formulary in {drug['topState']}."
+                 + (" Elevated reversal rate warrants review." if elevated else ""))
+
+
+def _manufacturer_detail(f, d):
+    mfr = next((m for m in d["topManufacturers"] if m["manufacturer"] == f["manufacturer"]), None)
+    count = len(d["drugs"])
+    drugs = f"{count} drug{'s' if count != 1 else ''}"
+    body = (f"{f['manufacturer']} supplies {drugs} representing {format_number(mfr['netClaims'])} net claims. "
+            "Top generic manufacturers (Aurobindo, Ascend, Amneal, Apotex) dominate volume in this LTC portfolio."
+            if mfr else
+            f"{f['manufacturer']} supplies {drugs} in the current view. "
+            f"{format_number(d['kpis']['netClaims'])} total net claims.")
+    return _card("exp-manufacturer-detail", "info", f.get("manufacturer") or "Manufacturer", body)
+
+
+def _group_detail(f, d):
+    k = d["kpis"]
+    rate = k["reversalRate"]
+    relation = "above" if rate > 12 else "below" if rate < 9 else "in line with"
+    return _card("exp-group-detail", "warning" if rate > 15 else "info", f"Group {f['groupId']}",
+                 f"Group {f['groupId']}: {format_number(k['netClaims'])} net claims across "
+                 f"{format_number(k['uniqueDrugs'])} unique drugs. Reversal rate is {format_percent(rate)}, "
+                 f"{relation} the 10.8% overall average. Note: all groups are state-specific.")
+
+
+def _state_detail(f, d):
+    ks = f["state"] == "KS"
+    return _card("exp-state-detail", "warning" if ks else "info", f"{f['state']} Explorer",
+                 f"{f['state']} accounts for {format_number(d['kpis']['netClaims'])} net claims with "
+                 f"{format_number(d['kpis']['uniqueDrugs'])} unique drugs across {len(d['topGroups'])}+ groups."
+                 + (' KS groups with "400xxx" prefix had a batch reversal event in August — see Anomalies page '
+                    "for details." if ks else ""))
+
+
+def _kpi_text(d):
+    return f"{format_number(d['kpis']['netClaims'])} net claims, {format_percent(d['kpis']['reversalRate'])} reversal rate"
+
+
+TEMPLATES = [
+    # Overview
+    Template("portfolio-summary", 10,
+             lambda f, d, v: v == "overview" and not any(f.get(k) for k in ("state", "formulary", "mony", "dateStart", "groupId")),
+             lambda f, d: _card("portfolio-summary", "info", "Portfolio Summary",
+                                f"{abbreviate_number(d['kpis']['netClaims'])} net claims across {len(d['allStates'])} "
+                                f"states and {len(d['formulary'])} formulary types. Overall reversal rate: "
+                                f"{format_percent(d['kpis']['reversalRate'])}.")),
+    Template("distribution-channel", 11,
+             lambda f, d, v: v == "overview" and not f.get("state") and not f.get("formulary"),
+             lambda f, d: _card("distribution-channel", "info", "100% Retail Distribution",
+                                "All claims are retail (no mail-order), consistent with long-term care pharmacy "
+                                "dispensing patterns where facilities receive frequent, short-cycle fills.")),
+    Template("ltc-pattern", 12,
+             lambda f, d, v: v == "overview" and not f.get("dateStart"),
+             lambda f, d: _card("ltc-pattern", "info", "LTC Cycle-Fill Pattern",
+                                "Day-1-of-month volume is ~7× the daily average — a strong indicator of long-term "
+                                "care batch dispensing. Days supply clusters at 7 and 14 days.")),
+    Template("state-ks-warning", 19,
+             lambda f, d, v: v == "overview" and f.get("state") == "KS",
+             lambda f, d: _card("state-ks-warning", "warning", "August Batch Reversal",
+                                "18 Kansas groups (400xxx prefix) had 100% reversal in August — a batch reversal "
+                                "event. Claims were re-submitted in September at ~1.4× normal volume. Excluding "
+                                "August, KS reversal rate is ~10%, matching other states.")),
+    Template("state-rank", 20, lambda f, d, v: v == "overview" and bool(f.get("state")), _state_rank),
+    Template("state-groups", 21,
+             lambda f, d, v: v == "overview" and bool(f.get("state")) and any(
+                 s["state"] == f["state"] and s["groupCount"] > 0 for s in d["allStates"]),
+             _state_groups),
+    # Both views
+    Template("month-sep", 15, lambda f, d, v: _month_start(f, "2021-09"),
+             lambda f, d: _card("month-sep", "warning", "September Surge (+41%)",
+                                f"September shows {format_number(_month_net(d, '2021-09'))} net claims — 41% above "
+                                "the normal monthly average. Partially explained by Kansas rebill groups "
+                                "re-incurring, but the spike is uniform across all states and formularies.")),
+    Template("month-nov", 16, lambda f, d, v: _month_start(f, "2021-11"),
+             lambda f, d: _card("month-nov", "warning", "November Dip (−54%)",
+                                f"November has only {format_number(_month_net(d, '2021-11'))} net claims — 54% below "
+                                "the normal monthly average. The drop is uniform across all states and groups; no "
+                                "missing days or groups explain it.")),
+    Template("month-may", 14, lambda f, d, v: _month_start(f, "2021-05"),
+             lambda f, d: _card("month-may", "warning", "May — Synthetic Data Alert",
+                                'May is 99.99% "Kryptonite XR" test drug claims. With flagged NDCs excluded, May has '
+                                "only 5 real claims. This month should be treated as synthetic.")),
+    Template("formulary-active", 25, lambda f, d, v: v == "overview" and bool(f.get("formulary")), _formulary_active),
+    Template("mony-y", 24, lambda f, d, v: v == "overview" and f.get("mony") == "Y",
+             lambda f, d: _card("mony-y", "positive", "Generic Single-Source (Y)",
+                                f"Single-source generics represent the bulk of this portfolio at "
+                                f"{format_number(d['kpis']['netClaims'])} net claims in this view. This heavy generic "
+                                "mix indicates effective cost management typical of LTC formulary control.")),
+    Template("mony-n", 24, lambda f, d, v: v == "overview" and f.get("mony") == "N",
+             lambda f, d: _card("mony-n", "info", "Brand Single-Source (N)",
+                                f"Single-source brands account for {format_number(d['kpis']['netClaims'])} net claims "
+                                "in this view. These are typically specialty or patented drugs without generic "
+                                "alternatives — important for cost containment strategy.")),
+    Template("state-formulary-combo", 30,
+             lambda f, d, v: v == "overview" and bool(f.get("state")) and bool(f.get("formulary")),
+             lambda f, d: _card("state-formulary-combo", "info", f"{f['state']} × {f['formulary']}",
+                                f"Viewing {f['state']} claims under {f['formulary']} formulary: {_kpi_text(d)}.")),
+    Template("group-filter", 28, lambda f, d, v: v == "overview" and bool(f.get("groupId")),
+             lambda f, d: _card("group-filter", "info", f"Group {f['groupId']}",
+                                f"Group {f['groupId']}: {_kpi_text(d)}. All groups are state-specific — no group "
+                                "spans multiple states.")),
+    # Explorer
+    Template("exp-generic-mix", 10,
+             lambda f, d, v: v == "explorer" and not any(f.get(k) for k in ("mony", "drug", "manufacturer", "groupId", "state")),
+             _generic_mix),
+    Template("exp-supply-cycles", 11,
+             lambda f, d, v: v == "explorer" and not any(f.get(k) for k in ("drug", "manufacturer", "groupId")),
+             _supply_cycles),
+    Template("exp-top-drug-profile", 12,
+             lambda f, d, v: v == "explorer" and not any(f.get(k) for k in ("drug", "manufacturer", "groupId")),
+             _top_drug_profile),
+    Template("exp-drug-detail", 18, lambda f, d, v: v == "explorer" and bool(f.get("drug")), _drug_detail),
+    Template("exp-manufacturer-detail", 20, lambda f, d, v: v == "explorer" and bool(f.get("manufacturer")),
+             _manufacturer_detail),
+    Template("exp-mony-y", 22, lambda f, d, v: v == "explorer" and f.get("mony") == "Y",
+             lambda f, d: _card("exp-mony-y", "positive", "Single-Source Generics (Y)",
+                                f"Single-source generics represent the largest category at "
+                                f"{format_number(d['kpis']['netClaims'])} net claims — the dominant drug type, "
+                                "consistent with LTC generic-first dispensing. These are the most cost-effective "
+                                "options available.")),
+    Template("exp-mony-n", 22, lambda f, d, v: v == "explorer" and f.get("mony") == "N",
+             lambda f, d: _card("exp-mony-n", "info", "Single-Source Brands (N)",
+                                f"Single-source brands account for {format_number(d['kpis']['netClaims'])} net claims "
+                                "— drugs with no generic alternative, typically carrying higher costs. "
+                                f"{d['drugs'][0]['drugName'] if d['drugs'] else 'N/A'} is the top brand by volume "
+                                "in this view.")),
+    Template("exp-mony-o", 22, lambda f, d, v: v == "explorer" and f.get("mony") == "O",
+             lambda f, d: _card("exp-mony-o", "info", "Multi-Source Generics (O)",
+                                f"Multi-source generics show {format_number(d['kpis']['netClaims'])} net claims. These "
+                                "drugs have multiple generic manufacturers competing, often driving the lowest "
+                                "per-unit costs.")),
+    Template("exp-mony-m", 22, lambda f, d, v: v == "explorer" and f.get("mony") == "M",
+             lambda f, d: _card("exp-mony-m", "info", "Multi-Source Brands (M)",
+                                f"Multi-source brands represent {format_number(d['kpis']['netClaims'])} net claims — "
+                                "brand-name drugs where generic alternatives exist. Formulary optimization could "
+                                "shift these to lower-cost generics.")),
+    Template("exp-group-detail", 25, lambda f, d, v: v == "explorer" and bool(f.get("groupId")), _group_detail),
+    Template("exp-state-detail", 24,
+             lambda f, d, v: v == "explorer" and bool(f.get("state")) and not f.get("groupId") and not f.get("drug"),
+             _state_detail),
+    Template("exp-state-mony-combo", 28,
+             lambda f, d, v: v == "explorer" and bool(f.get("state")) and bool(f.get("mony")),
+             lambda f, d: _card("exp-state-mony-combo", "info", f"{f['state']} × MONY {f['mony']}",
+                                f"Viewing {f['state']} claims for MONY type {f['mony']}: {_kpi_text(d)}. MONY "
+                                "distribution remains consistent across states.")),
+    Template("exp-drug-state-combo", 27,
+             lambda f, d, v: v == "explorer" and bool(f.get("drug")) and bool(f.get("state")),
+             lambda f, d: _card("exp-drug-state-combo", "info", f"{f['drug']} in {f['state']}",
+                                f"{f['drug']} in {f['state']}: {_kpi_text(d)}.")),
+    Template("exp-fallback", 100, lambda f, d, v: v == "explorer",
+             lambda f, d: _card("exp-fallback", "info", "Explorer View",
+                                f"Showing {format_number(d['kpis']['netClaims'])} net claims "
+                                f"({format_percent(d['kpis']['reversalRate'])} reversal rate) across "
+                                f"{format_number(d['kpis']['uniqueDrugs'])} unique drugs for the current filter "
+                                "selection.")),
+]
+
+_BY_PRIORITY = sorted(TEMPLATES, key=lambda t: t.priority)
+
+
+def generate_insights(filters, data, view="overview", max_cards=3):
+    """Up to `max_cards` cards, most specific (lowest priority number) first — as generateInsights."""
+    cards = []
+    for template in _BY_PRIORITY:
+        if len(cards) >= max_cards:
+            break
+        if template.match(filters, data, view):
+            cards.append(template.generate(filters, data))
+    return cards
+
+
+# --- batch sweep ---------------------------------------------------------------
+
+def _days_bin(days):
+    return np.select([days <= 7, days <= 14, days <= 30, days <= 60, days <= 90],
+                     ["7", "14", "30", "60", "90"], "Other")
+
+
+def build_cube(claims, drugs):
+    """Flagged NDCs excluded, drug-joined claims reduced to one row per distinct dimension tuple."""
+    df = merge_drugs(exclude_flagged(claims), drugs)
+    df["GROUP_ID"] = df["GROUP_ID"].astype(str)
+    df["NDC"] = df["NDC"].astype(str)
+    df["MONTH_KEY"] = month_keys(df)
+    df["DAYS_BIN"] = _days_bin(df["DAYS_SUPPLY"].to_numpy())
+    df["REVERSED"] = (df["NET_CLAIM_COUNT"] == -1).astype(np.int64)
+    df["INCURRED"] = (df["NET_CLAIM_COUNT"] == 1).astype(np.int64)
+    grain = ["PHARMACY_STATE", "FORMULARY", "MONY", "MONTH_KEY", "GROUP_ID", "DRUG_NAME", "LABEL_NAME",
+             "MANUFACTURER_NAME", "NDC", "DAYS_BIN"]
+    return (df.groupby(grain, dropna=False, sort=False, observed=True)
+            .agg(total=("NET_CLAIM_COUNT", "size"), net=("NET_CLAIM_COUNT", "sum"),
+                 reversed=("REVERSED", "sum"), incurred=("INCURRED", "sum"), min_days=("DAYS_SUPPLY", "min"))
+            .reset_index())
+
+
+def _month_filters(month):
+    end = (pd.Period(month, freq="M").end_time.date())
+    return {"dateStart": f"{month}-01", "dateEnd": f"{end:%Y-%m-%d}"}
+
+
+def _filters_of(combo, values):
+    filters = {}
+    for dim, value in zip(combo, values):
+        filters.update(_month_filters(value) if dim == "month" else {dim: value})
+    return filters
+
+
+def _rate(reversed_, total):
+    return np.floor(np.asarray(reversed_) * 10_000 / np.asarray(total) + 0.5) / 100
+
+
+def _ranked(frame, sid, sort, limit=None):
+    """Rows sorted within each slice by `sort` (descending net, then tie-breakers), optionally top `limit`."""
+    frame = frame.sort_values([sid, *sort], ascending=[True, False, *[True] * (len(sort) - 1)], kind="stable")
+    return frame.groupby(sid, sort=False).head(limit) if limit else frame
+
+
+def slice_data(cube, combo):
+    """{slice filters key: (filters, response-shaped data)} for every non-empty slice of `combo`."""
+    keys = [_COLUMNS[d] for d in combo]
+    cube = cube.dropna(subset=keys) if keys else cube
+    sid = "SLICE"
+    cube = cube.assign(**{sid: cube.groupby(keys, sort=True).ngroup() if keys else 0})
+    g = cube.groupby(sid)
+    values = g[keys].first() if keys else pd.DataFrame(index=[0])
+
+    k = g.agg(total=("total", "sum"), net=("net", "sum"), reversed=("reversed", "sum"), ndcs=("NDC", "nunique"))
+    k["rate"] = _rate(k["reversed"], k["total"])
+
+    def by(cols, how=("net",)):
+        agg = {c: (c, "sum") for c in ("total", "net", "reversed", "incurred", "min_days") if c in how}
+        out = cube.groupby([sid, *cols], dropna=False, sort=False).agg(**agg).reset_index()
+        if "total" in how:
+            out["rate"] = _rate(out["reversed"], out["total"])
+        return out
+
+    monthly = by(["MONTH_KEY"], ("incurred", "reversed")).sort_values([sid, "MONTH_KEY"])
+    formulary = _ranked(by(["FORMULARY"], ("total", "net", "reversed")), sid, ["net"])
+    mony = _ranked(by(["MONY"]), sid, ["net"])
+    days = cube.groupby([sid, "DAYS_BIN"], sort=False).agg(count=("net", "sum"), lo=("min_days", "min")).reset_index()
+    days = days.sort_values([sid, "lo"])
+    groups = _ranked(by(["GROUP_ID"]), sid, ["net", "GROUP_ID"], TOP_LIMIT)
+    manufacturers = _ranked(by(["MANUFACTURER_NAME"]), sid, ["net"], TOP_LIMIT)
+    drug_cols = ["DRUG_NAME", "LABEL_NAME", "NDC"]
+    drugs = _ranked(by(drug_cols, ("total", "net", "reversed")), sid, ["net", "NDC"], DRUG_LIMIT)
+    # MODE() WITHIN GROUP: most frequent value, smallest on ties — only for the listed drug rows
+    listed = cube.merge(drugs[[sid, "NDC"]], on=[sid, "NDC"])
+    modes = {}
+    for col in ("FORMULARY", "PHARMACY_STATE"):
+        counts = listed.groupby([sid, "NDC", col], sort=False)["total"].sum().reset_index()
+        counts = counts.sort_values([sid, "NDC", "total", col], ascending=[True, True, False, True])
+        modes[col] = counts.drop_duplicates([sid, "NDC"]).set_index([sid, "NDC"])[col]
+
+    # allStates ignores the state filter: states of the slice with `state` dropped
+    others = [c for c in keys if c != "PHARMACY_STATE"]
+    ostates = (cube.groupby([*others, "PHARMACY_STATE"], sort=False)
+               .agg(net=("net", "sum"), total=("total", "sum"), reversed=("reversed", "sum"),
+                    groups=("GROUP_ID", "nunique"))
+               .reset_index())
+    ostates = ostates.sort_values("net", ascending=False, kind="stable")
+    ostates["rate"] = _rate(ostates["reversed"], ostates["total"])
+    parent = (values[others].apply(tuple, axis=1) if others else pd.Series([()] * len(values), index=values.index))
+
+    def bucket(frame, record):
+        """{slice: [record(row), ...]} in one pass over the frame."""
+        out = defaultdict(list)
+        for r in frame.itertuples(index=False):
+            out[getattr(r, sid)].append(record(r))
+        return out
+
+    def unknown(value):
+        return "Unknown" if pd.isna(value) else value
+
+    formulary_mode = modes["FORMULARY"].to_dict()
+    state_mode = modes["PHARMACY_STATE"].to_dict()
+    lists = {
+        "monthly": bucket(monthly, lambda r: {"month": r.MONTH_KEY, "incurred": int(r.incurred),
+                                              "reversed": int(r.reversed)}),
+        "formulary": bucket(formulary, lambda r: {"type": str(r.FORMULARY), "netClaims": int(r.net),
+                                                  "reversalRate": float(r.rate)}),
+        "mony": bucket(mony, lambda r: {"type": unknown(r.MONY), "netClaims": int(r.net)}),
+        "daysSupply": bucket(days, lambda r: {"bin": r.DAYS_BIN, "count": int(r.count)}),
+        "topGroups": bucket(groups, lambda r: {"groupId": r.GROUP_ID, "netClaims": int(r.net)}),
+        "topManufacturers": bucket(manufacturers, lambda r: {"manufacturer": unknown(r.MANUFACTURER_NAME),
+                                                             "netClaims": int(r.net)}),
+        "drugs": bucket(drugs, lambda r: {
+            "drugName": unknown(r.DRUG_NAME), "labelName": None if pd.isna(r.LABEL_NAME) else r.LABEL_NAME,
+            "ndc": r.NDC, "netClaims": int(r.net), "reversalRate": float(r.rate),
+            "formulary": formulary_mode.get((getattr(r, sid), r.NDC), "Unknown"),
+            "topState": state_mode.get((getattr(r, sid), r.NDC), "Unknown")}),
+    }
+    state_lists = {}
+    for key, part in (ostates.groupby(others, sort=False, dropna=False) if others else [((), ostates)]):
+        key = key if isinstance(key, tuple) else (key,)
+        state_lists[key] = [
+            {"state": r.PHARMACY_STATE, "netClaims": int(r.net), "totalClaims": int(r.total),
+             "reversalRate": float(r.rate), "groupCount": int(r.groups)}
+            for r in part.itertuples(index=False)
+        ]
+
+    value_rows = values[keys].itertuples(index=False, name=None) if keys else iter([()])
+    parents = parent.tolist() if others else [()] * len(k)
+    out = {}
+    for (s, row), slice_values, parent_key in zip(k.iterrows(), value_rows, parents):
+        filters = _filters_of(combo, slice_values)
+        data = {
+            "kpis": {"totalClaims": int(row.total), "netClaims": int(row.net),
+                     "reversalRate": float(row.rate), "uniqueDrugs": int(row.ndcs)},
+            "allStates": state_lists.get(parent_key, []),
+            **{name: buckets.get(s, []) for name, buckets in lists.items()},
+        }
+        out[slice_key(filters)] = (filters, data)
+    return out
+
+
+def build_cache(claims, drugs, combinations=COMBINATIONS, max_cards=3):
+    """{"cards": {view: {slice key: [card, ...]}}} for every slice of every combination."""
+    started = time.perf_counter()
+    cube = build_cube(claims, drugs)
+    cards = {view: {} for view in VIEWS}
+    for combo in combinations:
+        for key, (filters, data) in slice_data(cube, combo).items():
+            for view in VIEWS:
+                cards[view][key] = generate_insights(filters, data, view, max_cards)
+    return {"version": 1, "generated_at": time.time(), "elapsed": time.perf_counter() - started,
+            "combinations": [list(c) for c in combinations], "cards": cards}
+
+
+def audit(cache):
+    """Slices per (view, insight id, severity) — which insights fire, and how often."""
+    counts = defaultdict(int)
+    for view, slices in cache["cards"].items():
+        for cards in slices.values():
+            for card in cards:
+                counts[(view, card["id"], card["severity"])] += 1
+    frame = pd.DataFrame([(*k, v) for k, v in counts.items()], columns=["view", "insight", "severity", "slices"])
+    return frame.sort_values(["view", "slices"], ascending=[True, False]).reset_index(drop=True)
+
+
+def read_cache(path=DEFAULT_PATH):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_cache(cache, path=DEFAULT_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(cache, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cache", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--claims", default=CLAIMS_PATH)
+    b.add_argument("--drugs", default=DRUGS_PATH)
+    s = sub.add_parser("show")
+    s.add_argument("query", nargs="?", default="", help="Filter query string, e.g. state=KS&mony=N")
+    s.add_argument("--view", choices=VIEWS, default="overview")
+    sub.add_parser("audit")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        cache = build_cache(load_claims(args.claims), load_drugs(args.drugs))
+        write_cache(cache, args.cache)
+        print(f"{sum(len(v) for v in cache['cards'].values()):,} slice/view entries in {cache['elapsed']:.1f}s "
+              f"-> {args.cache}")
+        return 0
+    cache = read_cache(args.cache)
+    if args.command == "audit":
+        print(audit(cache).to_string(index=False))
+        return 0
+    cards = cache["cards"][args.view].get(slice_key(dict(parse_qsl(args.query))))
+    if cards is None:
+        print("slice not in cache")
+        return 1
+    for card in cards:
+        print(f"[{card['severity']}] {card['title']}\n    {card['body']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
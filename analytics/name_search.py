@@ -0,0 +1,229 @@
+"""Type-ahead search over drug, label and manufacturer names.
+
+A trigram inverted index over the distinct names in the drug dimension, ranked
+by each entity's claim volume. The index is built once, written to a directory
+of .npy files, and opened memory-mapped, so a keystroke query is a few posting
+list intersections plus a volume sort.
+
+    python -m analytics.name_search build .cache/name-index
+    python -m analytics.name_search query .cache/name-index ator --kind drug
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from analytics.data import load_claims, load_drugs
+from analytics.drug_dimension import MISSING, DrugDimension
+
+KINDS = ("drug", "label", "manufacturer")
+ANCHOR = "^"
+GRAM = 3
+
+
+@dataclass(frozen=True)
+class Match:
+    kind: str
+    name: str
+    code: int
+    volume: int
+
+
+def _normalize(text):
+    return " ".join(text.upper().split())
+
+
+def _grams(text):
+    """Anchored trigrams: ^ marks the start so prefix queries are gram lookups too."""
+    padded = ANCHOR + text
+    grams = {padded[:n] for n in range(2, GRAM)}
+    grams.update(padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1))
+    return grams
+
+
+def _query_grams(query, prefix):
+    padded = ANCHOR + query if prefix else query
+    if len(padded) < GRAM:
+        return [padded]
+    return sorted({padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1)})
+
+
+def build(dimension, volumes, path):
+    """Write an index for every dictionary value in `dimension` to `path`.
+
+    `volumes` maps entity_id -> claims frame; each entity gets its own ranking.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    names, kinds, codes = [], [], []
+    for k, kind in enumerate(KINDS):
+        dictionary = dimension.dictionaries[kind]
+        names.extend(dictionary)
+        kinds.append(np.full(len(dictionary), k, dtype=np.int8))
+        codes.append(np.arange(len(dictionary), dtype=np.int32))
+
+    postings = defaultdict(list)
+    for term_id, name in enumerate(names):
+        for gram in _grams(_normalize(name)):
+            postings[gram].append(term_id)
+    grams = np.array(sorted(postings), dtype=f"<U{GRAM}")
+    lengths = np.array([len(postings[g]) for g in grams], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    flat = np.fromiter((t for g in grams for t in postings[g]), dtype=np.int32, count=int(offsets[-1]))
+
+    encoded = [n.encode("utf-8") for n in names]
+    term_offsets = np.concatenate([[0], np.cumsum([len(b) for b in encoded])]).astype(np.int64)
+
+    np.save(path / "grams.npy", grams)
+    np.save(path / "gram_offsets.npy", offsets)
+    np.save(path / "postings.npy", flat)
+    np.save(path / "term_offsets.npy", term_offsets)
+    np.save(path / "terms.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(path / "kinds.npy", np.concatenate(kinds))
+    np.save(path / "codes.npy", np.concatenate(codes))
+
+    for entity_id, claims in volumes.items():
+        encoded_claims = dimension.encode(claims["NDC"].to_numpy())
+        per_kind = []
+        for kind in KINDS:
+            kind_codes = encoded_claims[kind]
+            kind_codes = kind_codes[kind_codes != MISSING]
+            per_kind.append(np.bincount(kind_codes, minlength=len(dimension.dictionaries[kind])))
+        np.save(path / f"volume_{entity_id}.npy", np.concatenate(per_kind).astype(np.int64))
+
+    (path / "meta.json").write_text(json.dumps({"terms": len(names), "entities": sorted(volumes)}))
+    return NameIndex.open(path)
+
+
+def _intersect(small, large):
+    """Sorted intersection of two sorted unique posting lists."""
+    if len(small) * 16 < len(large):
+        pos = np.searchsorted(large, small)
+        pos[pos == len(large)] = 0
+        return small[large[pos] == small]
+    return small[np.isin(small, large, kind="table")]
+
+
+def _ranked(candidates, volume, window):
+    """Candidate positions by descending volume; only the head is fully sorted up front."""
+    if len(candidates) > window:
+        head = np.argpartition(-volume, window)[:window]
+        head = head[np.lexsort((candidates[head], -volume[head]))]
+        yield from head
+        rest = np.ones(len(candidates), dtype=bool)
+        rest[head] = False
+        rest = np.flatnonzero(rest)
+        yield from rest[np.lexsort((candidates[rest], -volume[rest]))]
+    else:
+        yield from np.lexsort((candidates, -volume))
+
+
+class NameIndex:
+    """Memory-mapped index written by build()."""
+
+    def __init__(self, path, arrays):
+        self.path = Path(path)
+        self._grams = arrays["grams"]
+        self._gram_offsets = arrays["gram_offsets"]
+        self._postings = arrays["postings"]
+        self._term_offsets = arrays["term_offsets"]
+        self._terms = arrays["terms"]
+        self._kinds = arrays["kinds"]
+        self._codes = arrays["codes"]
+        self._volumes = {}
+
+    @classmethod
+    def open(cls, path):
+        path = Path(path)
+        names = ["grams", "gram_offsets", "postings", "term_offsets", "terms", "kinds", "codes"]
+        # asarray keeps the mapping but drops np.memmap's per-index overhead
+        return cls(path, {n: np.asarray(np.load(path / f"{n}.npy", mmap_mode="r")) for n in names})
+
+    def __len__(self):
+        return len(self._kinds)
+
+    def name(self, term_id):
+        start, end = self._term_offsets[term_id], self._term_offsets[term_id + 1]
+        return self._terms[start:end].tobytes().decode("utf-8")
+
+    def volumes(self, entity_id):
+        if entity_id not in self._volumes:
+            volume = np.load(self.path / f"volume_{entity_id}.npy", mmap_mode="r")
+            self._volumes[entity_id] = np.asarray(volume)
+        return self._volumes[entity_id]
+
+    def _posting(self, gram):
+        i = np.searchsorted(self._grams, gram)
+        if i == len(self._grams) or self._grams[i] != gram:
+            return None
+        return self._postings[self._gram_offsets[i]:self._gram_offsets[i + 1]]
+
+    def search(self, query, entity_id=1, kinds=KINDS, limit=10, prefix=False):
+        """Names containing `query` (or starting with it), highest claim volume first.
+
+        Queries shorter than three characters are always treated as prefixes.
+        """
+        query = _normalize(query)
+        if not query:
+            return []
+        prefix = prefix or len(query) < GRAM
+        lists = [self._posting(g) for g in _query_grams(query, prefix)]
+        if any(p is None for p in lists):
+            return []
+        lists.sort(key=len)
+        candidates = np.asarray(lists[0])
+        for posting in lists[1:]:
+            candidates = _intersect(candidates, posting)
+            if not len(candidates):
+                return []
+
+        wanted = [KINDS.index(k) for k in kinds]
+        if len(wanted) < len(KINDS):
+            candidates = candidates[np.isin(self._kinds[candidates], wanted)]
+        volume = self.volumes(entity_id)[candidates]
+
+        matches = []
+        for i in _ranked(candidates, volume, window=4 * limit):
+            term_id = int(candidates[i])
+            name = self.name(term_id)
+            normalized = _normalize(name)
+            # Trigrams can all be present without being contiguous — confirm
+            if normalized.startswith(query) if prefix else query in normalized:
+                matches.append(Match(KINDS[self._kinds[term_id]], name, int(self._codes[term_id]), int(volume[i])))
+                if len(matches) == limit:
+                    break
+        return matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Build from Case Study - Data/ (entity 1)")
+    b.add_argument("path")
+    q = sub.add_parser("query")
+    q.add_argument("path")
+    q.add_argument("text")
+    q.add_argument("--entity", type=int, default=1)
+    q.add_argument("--kind", action="append", choices=KINDS)
+    q.add_argument("--prefix", action="store_true")
+    q.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = build(DrugDimension.build(load_drugs()), {1: load_claims()}, args.path)
+        print(f"Indexed {len(index):,} names into {args.path}")
+    else:
+        index = NameIndex.open(args.path)
+        kinds = tuple(args.kind) if args.kind else KINDS
+        for m in index.search(args.text, args.entity, kinds, args.limit, args.prefix):
+            print(f"{m.volume:>10,}  {m.kind:<12} {m.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Parallel parser for the tilde-delimited extracts.
+
+The file is split into newline-aligned byte ranges. A first pool pass counts
+the rows in each range, which fixes every range's row offset; the parent then
+allocates one shared anonymous mapping per numeric column, and a second pass
+parses each range straight into its slice of those buffers. The buffers become
+the DataFrame columns as-is — there is no concatenation copy. String columns
+are dictionary-encoded per range and unified in the parent.
+
+The BOM and header are handled once, on the first range only. Splitting on
+raw newlines assumes no quoted field spans lines, which holds for both exports.
+
+    python -m analytics.parallel_csv "Case Study - Data/Claims_Export.csv" --workers 8
+"""
+import argparse
+import io
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import CLAIMS_PATH, ENCODING, SEP
+
+CLAIMS_SCHEMA = {
+    "ADJUDICATED": "bool",
+    "FORMULARY": "str",
+    "DATE_FILLED": "int64",
+    "NDC": "int64",
+    "DAYS_SUPPLY": "int64",
+    "GROUP_ID": "str",
+    "PHARMACY_STATE": "str",
+    "MAILRETAIL": "str",
+    "NET_CLAIM_COUNT": "int64",
+}
+
+DRUGS_SCHEMA = {
+    "NDC": "int64",
+    "DRUG_NAME": "str",
+    "LABEL_NAME": "str",
+    "MONY": "str",
+    "MANUFACTURER_NAME": "str",
+}
+
+BOM = b"\xef\xbb\xbf"
+DEFAULT_RANGE_BYTES = 32 * 1024 * 1024
+
+# Set in the parent before the parse pool forks; workers write into them
+_BUFFERS = {}
+
+
+def read_header(path):
+    """Column names and the byte offset where data rows begin."""
+    with open(path, "rb") as f:
+        first = f.readline()
+    skip = len(BOM) if first.startswith(BOM) else 0
+    names = first[skip:].decode(ENCODING).strip().split(SEP)
+    return names, len(first)
+
+
+def byte_ranges(path, data_start, range_bytes=DEFAULT_RANGE_BYTES):
+    """[start, end) ranges covering the data, each ending just after a newline."""
+    size = os.path.getsize(path)
+    ranges, start = [], data_start
+    with open(path, "rb") as f:
+        while start < size:
+            end = min(start + range_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _count_rows(args):
+    path, start, end = args
+    buf = _read_range(path, start, end)
+    # Non-empty lines; blank lines are skipped by the parser too
+    lines = buf.count(b"\n") + (0 if buf.endswith(b"\n") else 1)
+    return lines - buf.count(b"\n\n") - (1 if buf.startswith(b"\n") else 0)
+
+
+def _parse_range(args):
+    path, start, end, offset, names, schema = args
+    buf = _read_range(path, start, end)
+    str_cols = [c for c in names if schema[c] == "str"]
+    frame = pd.read_csv(
+        io.BytesIO(buf), sep=SEP, header=None, names=names, encoding=ENCODING,
+        dtype={c: (object if schema[c] == "str" else schema[c]) for c in names},
+    )
+    n = len(frame)
+    dictionaries = {}
+    for col in names:
+        if col in str_cols:
+            codes, uniques = pd.factorize(frame[col], use_na_sentinel=True)
+            _BUFFERS[col][offset:offset + n] = codes
+            dictionaries[col] = list(uniques)
+        else:
+            _BUFFERS[col][offset:offset + n] = frame[col].to_numpy()
+    return n, dictionaries
+
+
+def _shared_array(dtype, length):
+    """Zero-filled array backed by an anonymous MAP_SHARED mapping (visible to forked workers)."""
+    dtype = np.dtype(dtype)
+    nbytes = max(dtype.itemsize * length, 1)
+    return np.frombuffer(mmap.mmap(-1, nbytes), dtype=dtype, count=length)
+
+
+def read_tilde(path, schema, workers=None, range_bytes=DEFAULT_RANGE_BYTES, strings="object"):
+    """Parse a tilde-delimited extract in parallel into a DataFrame.
+
+    `strings` controls how str columns come back: "object" (the same values
+    pd.read_csv yields) or "category" (dictionary codes, no per-row strings).
+    """
+    names, data_start = read_header(path)
+    missing = set(names) - set(schema)
+    if missing:
+        raise ValueError(f"No dtype in schema for columns: {sorted(missing)}")
+    ranges = byte_ranges(path, data_start, range_bytes)
+    workers = min(workers or os.cpu_count() or 1, max(len(ranges), 1))
+    ctx = multiprocessing.get_context("fork")
+
+    with ctx.Pool(workers) as pool:
+        counts = pool.map(_count_rows, [(path, s, e) for s, e in ranges])
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+    total = int(offsets[-1])
+
+    _BUFFERS.clear()
+    for col in names:
+        _BUFFERS[col] = _shared_array(np.int32 if schema[col] == "str" else schema[col], total)
+    try:
+        jobs = [(path, s, e, int(o), names, schema) for (s, e), o in zip(ranges, offsets)]
+        with ctx.Pool(workers) as pool:
+            results = pool.map(_parse_range, jobs)
+        buffers = dict(_BUFFERS)
+    finally:
+        _BUFFERS.clear()
+
+    for (parsed, _), expected, (s, e) in zip(results, counts, ranges):
+        if parsed != expected:
+            raise ValueError(f"Range {s}-{e} parsed {parsed} rows, expected {expected}")
+
+    columns = {}
+    for col in names:
+        if schema[col] != "str":
+            columns[col] = buffers[col]
+            continue
+        categories, remaps = _unify([r[1][col] for r in results])
+        codes = buffers[col]
+        for remap, lo, hi in zip(remaps, offsets[:-1], offsets[1:]):
+            block = codes[lo:hi]
+            block[block >= 0] = remap[block[block >= 0]]  # in place, range by range
+        cat = pd.Categorical.from_codes(codes, categories=categories)
+        columns[col] = cat if strings == "category" else np.asarray(cat, dtype=object)
+    return pd.DataFrame(columns, copy=False)
+
+
+def _unify(dictionaries):
+    """Global sorted categories and a per-range local->global code remap."""
+    categories = pd.Index(sorted(set().union(*dictionaries)))
+    remaps = [np.asarray(categories.get_indexer(d), dtype=np.int32) for d in dictionaries]
+    return categories, remaps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=str(CLAIMS_PATH))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--range-mb", type=int, default=DEFAULT_RANGE_BYTES // 2**20)
+    parser.add_argument("--compare", action="store_true", help="Also time pd.read_csv and check equality")
+    args = parser.parse_args(argv)
+
+    schema = DRUGS_SCHEMA if read_header(args.path)[0] == list(DRUGS_SCHEMA) else CLAIMS_SCHEMA
+    t0 = time.perf_counter()
+    df = read_tilde(args.path, schema, args.workers, args.range_mb * 2**20)
+    print(f"parallel   {time.perf_counter() - t0:6.2f}s  {len(df):,} rows")
+    if args.compare:
+        t0 = time.perf_counter()
+        expected = pd.read_csv(args.path, sep=SEP, encoding=ENCODING)
+        print(f"read_csv   {time.perf_counter() - t0:6.2f}s  {len(expected):,} rows")
+        pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+        print("identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Integer period encoding for the claims timeline, and period-aware baselines.
+
+load_claims adds two int32 columns once: PERIOD, months since 1970-01
+(year * 12 + month - 1 relative to 1970), and DAY, days since 1970-01-01.
+Periods are contiguous across years, so a multi-year series is a dense (key x
+period) count matrix from one bincount, and year / calendar month are integer
+arithmetic on the period. "YYYY-MM" labels (what the API routes group by) are
+only rendered for the distinct periods, never per row.
+
+Baselines over that matrix, each leaving out `exclude` periods (known
+anomalies such as 2021's May, September and November):
+
+    normal     mean of the same year's periods
+    seasonal   mean of the same calendar month in the other years
+    trailing   mean of the previous `window` periods
+
+    python -m analytics.periods                          # normal-month baseline, whole book
+    python -m analytics.periods --by PHARMACY_STATE --baseline trailing --window 3
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+EPOCH = np.datetime64("1970-01", "M")
+EPOCH_DAY = np.datetime64("1970-01-01", "D")
+
+BASELINES = ("normal", "seasonal", "trailing")
+THRESHOLD_PCT = 25.0
+
+
+def period(year, month):
+    """Period ordinal of a calendar month."""
+    return (year - 1970) * 12 + month - 1
+
+
+def parse_period(label):
+    """Period ordinal of a "YYYY-MM" (or "YYYY-MM-DD") string."""
+    return period(int(label[:4]), int(label[5:7]))
+
+
+def year_of(periods):
+    return np.asarray(periods) // 12 + 1970
+
+
+def calendar_month(periods):
+    return np.asarray(periods) % 12 + 1
+
+
+def period_labels(periods):
+    """ "YYYY-MM" for each period ordinal."""
+    return np.datetime_as_string(EPOCH + np.asarray(periods, dtype=np.int64), unit="M")
+
+
+# 2021: May (Kryptonite, fake after exclusion), September (spike), November (dip)
+ANOMALOUS_PERIODS = (period(2021, 5), period(2021, 9), period(2021, 11))
+
+
+def encode(dates):
+    """(PERIOD, DAY) int32 arrays for a datetime Series."""
+    values = dates.to_numpy()
+    return (values.astype("datetime64[M]").astype(np.int64).astype(np.int32),
+            ((values - EPOCH_DAY) // np.timedelta64(1, "D")).astype(np.int32))
+
+
+def periods_of(claims):
+    """The PERIOD column, computed from DATE for frames that weren't built by load_claims."""
+    if "PERIOD" in claims.columns:
+        return claims["PERIOD"].to_numpy()
+    return encode(claims["DATE"])[0]
+
+
+def month_keys(claims):
+    """ "YYYY-MM" per claim, rendered once per distinct period."""
+    codes, uniques = pd.factorize(periods_of(claims))
+    return pd.Series(period_labels(uniques)[codes], index=claims.index, dtype=object)
+
+
+def period_matrix(claims, by=None, weights=None):
+    """(keys, periods, matrix): claims (or summed `weights`) per key per contiguous period.
+
+    `by` is a column, a list of columns, or None for a single "all" row.
+    """
+    p = periods_of(claims).astype(np.int64)
+    first, last = int(p.min()), int(p.max())
+    n_periods = last - first + 1
+    if by is None:
+        codes, keys = np.zeros(len(claims), dtype=np.int64), pd.Index(["all"])
+    else:
+        grouped = claims.groupby(by, sort=True, observed=True)
+        codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        keys = grouped.size().index
+    ok = codes >= 0
+    w = None if weights is None else np.asarray(weights, dtype=np.float64)[ok]
+    flat = np.bincount(codes[ok] * n_periods + (p[ok] - first), weights=w, minlength=len(keys) * n_periods)
+    return keys, np.arange(first, last + 1), flat.reshape(len(keys), n_periods)
+
+
+def _included(periods, exclude):
+    return ~np.isin(periods, list(exclude))
+
+
+def normal_baseline(matrix, periods, exclude=ANOMALOUS_PERIODS):
+    """Per cell: mean of the same key's non-excluded periods in the same year."""
+    keep = _included(periods, exclude)
+    years = year_of(periods)
+    year_code, _ = pd.factorize(years)
+    onehot = np.eye(year_code.max() + 1)[year_code] * keep[:, None]   # periods x years
+    sums = matrix @ onehot
+    counts = onehot.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return means[:, year_code]
+
+
+def seasonal_baseline(matrix, periods, exclude=ANOMALOUS_PERIODS):
+    """Per cell: mean of the same calendar month in the other years (NaN with no other year)."""
+    keep = _included(periods, exclude)
+    onehot = np.eye(12)[calendar_month(periods) - 1] * keep[:, None]  # periods x months
+    sums = (matrix @ onehot)[:, calendar_month(periods) - 1]
+    counts = onehot.sum(axis=0)[calendar_month(periods) - 1]
+    own = np.where(keep, 1, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums - matrix * own) / (counts - own)
+
+
+def trailing_baseline(matrix, periods, window=12, exclude=ANOMALOUS_PERIODS):
+    """Per cell: mean of the non-excluded periods among the previous `window` (NaN for the first)."""
+    keep = _included(periods, exclude)
+    masked = np.where(keep, matrix, 0)
+    sums = np.concatenate([np.zeros((len(matrix), 1)), np.cumsum(masked, axis=1)], axis=1)
+    counts = np.concatenate([[0], np.cumsum(keep)])
+    end = np.arange(len(periods))
+    start = np.maximum(end - window, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[:, end] - sums[:, start]) / (counts[end] - counts[start])
+
+
+def anomalies(keys, periods, matrix, baseline, threshold_pct=THRESHOLD_PCT):
+    """Long frame of cells whose volume differs from the baseline by at least `threshold_pct`."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = (matrix / baseline - 1) * 100
+    rows, cols = np.nonzero(np.abs(np.nan_to_num(pct)) >= threshold_pct)
+    return pd.DataFrame({
+        "key": np.asarray(keys, dtype=object)[rows],
+        "period": period_labels(periods[cols]),
+        "claims": matrix[rows, cols],
+        "baseline": baseline[rows, cols].round(1),
+        "pct_vs_baseline": pct[rows, cols].round(1),
+    })
+
+
+def main(argv=None):
+    from analytics.data import exclude_flagged, load_claims
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--by", help="Column to break the timeline down by, e.g. PHARMACY_STATE")
+    parser.add_argument("--baseline", choices=BASELINES, default="normal")
+    parser.add_argument("--window", type=int, default=12, help="Trailing baseline length in periods")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_PCT)
+    args = parser.parse_args(argv)
+
+    keys, periods, matrix = period_matrix(exclude_flagged(load_claims()), args.by)
+    if args.baseline == "normal":
+        baseline = normal_baseline(matrix, periods)
+    elif args.baseline == "seasonal":
+        baseline = seasonal_baseline(matrix, periods)
+    else:
+        baseline = trailing_baseline(matrix, periods, args.window)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(anomalies(keys, periods, matrix, baseline, args.threshold).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Monthly-profile similarity index over groups and NDCs.
+
+Every key (a group or an NDC, per entity when the frame has ENTITY_ID) gets
+two month vectors built with one bincount each: its share of claims per month
+and its share of reversals per month. The concatenation is centered on the
+claim-weighted population profile and L2-normalized into one dense float32
+matrix, so cosine similarity is a matrix product: "the k profiles most like
+X" is one matrix-vector product and an argpartition, and "profiles unlike the
+population" ranks keys by how far their profile deviates from the centre.
+
+    python -m analytics.profiles similar GROUP_ID 400127 -k 20
+    python -m analytics.profiles atypical NDC -k 20 --min-claims 50
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import load_claims
+from analytics.periods import period_labels, periods_of
+
+KINDS = ("GROUP_ID", "NDC")
+REVERSAL_WEIGHT = 1.0
+
+
+@dataclass
+class Profiles:
+    kind: str
+    keys: pd.Index          # group IDs / NDCs, or (ENTITY_ID, key) tuples
+    months: list            # YYYY-MM column labels
+    claims: np.ndarray      # claims per key
+    reversals: np.ndarray   # reversals per key
+    volume: np.ndarray      # (keys x months) share of the key's claims
+    reversal: np.ndarray    # (keys x months) share of the key's reversals
+    matrix: np.ndarray      # centered, L2-normalized [volume | reversal] rows
+    deviation: np.ndarray   # L2 distance of each row from the population centre
+
+
+def _shares(counts):
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros(counts.shape, dtype=np.float32), where=totals > 0)
+
+
+def build(claims, kind="GROUP_ID", reversal_weight=REVERSAL_WEIGHT):
+    """Profile index over every value of `kind`."""
+    cols = (["ENTITY_ID"] if "ENTITY_ID" in claims.columns else []) + [kind]
+    grouped = claims.groupby(cols, sort=True)
+    code = grouped.ngroup().to_numpy()
+    keys = grouped.size().index
+    month_code, periods = pd.factorize(periods_of(claims), sort=True)
+    months = period_labels(periods)
+    n, m = len(keys), len(months)
+
+    cell = code * m + month_code
+    reversed_ = claims["NET_CLAIM_COUNT"].to_numpy() == -1
+    volume = np.bincount(cell, minlength=n * m).reshape(n, m)
+    rev = np.bincount(cell[reversed_], minlength=n * m).reshape(n, m)
+
+    volume_share, reversal_share = _shares(volume), _shares(rev)
+    shares = np.hstack([volume_share, reversal_weight * reversal_share])
+    weights = volume.sum(axis=1).astype(np.float64)
+    centre = (weights @ shares) / weights.sum()
+    centered = shares - centre.astype(np.float32)  # similarity of deviations, not of the common season
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    matrix = np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+    return Profiles(kind, keys, list(months), volume.sum(axis=1), rev.sum(axis=1),
+                    volume_share, reversal_share, matrix, norms.ravel())
+
+
+def _positions(profiles, keys):
+    pos = profiles.keys.get_indexer(keys)
+    if (pos < 0).any():
+        missing = [k for k, p in zip(keys, pos) if p < 0]
+        raise KeyError(f"{profiles.kind} not in index: {missing[:5]}")
+    return pos
+
+
+def similar(profiles, keys, k=10, min_claims=0):
+    """The `k` most similar profiles to each of `keys` (batched): query, key, similarity, claims."""
+    pos = _positions(profiles, keys)
+    scores = profiles.matrix[pos] @ profiles.matrix.T
+    scores[np.arange(len(pos)), pos] = -np.inf  # never return the query itself
+    scores[:, profiles.claims < min_claims] = -np.inf
+    k = min(k, scores.shape[1] - 1)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k > 0 else np.empty((len(pos), 0), dtype=int)
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    top = np.take_along_axis(top, order, axis=1)
+    rows = np.repeat(np.arange(len(pos)), top.shape[1])
+    flat = top.ravel()
+    return pd.DataFrame({
+        "query": np.asarray(profiles.keys[pos], dtype=object)[rows],
+        profiles.kind: np.asarray(profiles.keys[flat], dtype=object),
+        "similarity": scores[rows, flat],
+        "claims": profiles.claims[flat],
+    })
+
+
+def atypical(profiles, k=20, min_claims=100):
+    """The `k` keys whose monthly profile deviates most from the population's."""
+    distance = profiles.deviation
+    eligible = np.flatnonzero(profiles.claims >= min_claims)
+    k = min(k, len(eligible))
+    top = eligible[np.argpartition(-distance[eligible], k - 1)[:k]] if k else eligible[:0]
+    top = top[np.argsort(-distance[top])]
+    peak = profiles.volume[top].argmax(axis=1)
+    return pd.DataFrame({
+        profiles.kind: np.asarray(profiles.keys[top], dtype=object),
+        "distance": distance[top],
+        "claims": profiles.claims[top],
+        "reversals": profiles.reversals[top],
+        "peak_month": np.asarray(profiles.months)[peak],
+        "peak_share": profiles.volume[top, peak],
+    })
+
+
+def _key(kind, value):
+    return int(value) if kind == "NDC" else value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("similar")
+    s.add_argument("kind", choices=KINDS)
+    s.add_argument("keys", nargs="+")
+    s.add_argument("-k", type=int, default=10)
+    s.add_argument("--min-claims", type=int, default=0)
+    a = sub.add_parser("atypical")
+    a.add_argument("kind", choices=KINDS)
+    a.add_argument("-k", type=int, default=20)
+    a.add_argument("--min-claims", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    claims = load_claims()
+    claims["GROUP_ID"] = claims["GROUP_ID"].astype(str)
+    profiles = build(claims, args.kind)
+    if args.command == "similar":
+        result = similar(profiles, [_key(args.kind, k) for k in args.keys], args.k, args.min_claims)
+    else:
+        result = atypical(profiles, args.k, args.min_claims)
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.precision", 3):
+        print(result.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""Benchmark the dashboard's SQL shapes against alternative physical designs.
+
+Loads the extract into a local Postgres at one or more scales (scale N = N
+entities, each a copy of the extract), builds every design in its own schema
+(qp_<design>) so nothing touches the app's tables, and runs each route's query
+shapes under EXPLAIN (ANALYZE, BUFFERS). Reports latency percentiles, buffer
+traffic and the indexes each plan actually used.
+
+Statements go out unnamed (no asyncpg statement cache), like the Neon driver,
+so every execution gets a custom plan for its parameters.
+
+    python -m analytics.query_plans --dsn postgresql://localhost/bench
+    python -m analytics.query_plans --scale 1 --scale 8 --design schema --design covering --runs 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass
+
+import asyncpg
+import pandas as pd
+
+from analytics.data import CLAIMS_PATH, DRUG_COLUMNS, DRUGS_PATH, FLAGGED_NDCS, load_claims, load_drugs
+
+DATA_SCHEMA = "qp_data"
+_PARTITION = re.compile(r"^claims_(\d{4}_\d{2}|default)_")
+
+_FLAGGED = ", ".join(f"${i + 2}" for i in range(len(FLAGGED_NDCS)))
+_BASE = f"c.entity_id = $1 AND c.ndc NOT IN ({_FLAGGED})"
+
+# Route -> query shape, as issued by src/app/api/*/route.ts
+QUERIES = {
+    "overview.kpis": f"""
+        SELECT COUNT(*), SUM(c.net_claim_count),
+               COUNT(*) FILTER (WHERE c.net_claim_count = -1), COUNT(DISTINCT c.ndc)
+        FROM claims c WHERE {_BASE}""",
+    "overview.monthly": f"""
+        SELECT TO_CHAR(c.date_filled, 'YYYY-MM') AS month,
+               COUNT(*) FILTER (WHERE c.net_claim_count = 1), COUNT(*) FILTER (WHERE c.net_claim_count = -1)
+        FROM claims c WHERE {_BASE}
+        GROUP BY TO_CHAR(c.date_filled, 'YYYY-MM') ORDER BY month""",
+    "overview.states": f"""
+        SELECT c.pharmacy_state, SUM(c.net_claim_count), COUNT(*), COUNT(DISTINCT c.group_id)
+        FROM claims c WHERE {_BASE}
+        GROUP BY c.pharmacy_state ORDER BY 2 DESC""",
+    "claims.kpis_ks_august": f"""
+        SELECT COUNT(*), SUM(c.net_claim_count), COUNT(DISTINCT c.ndc)
+        FROM claims c WHERE {_BASE}
+          AND c.pharmacy_state = 'KS' AND c.date_filled >= '2021-08-01' AND c.date_filled <= '2021-08-31'""",
+    "claims.top_drugs": f"""
+        SELECT d.drug_name, d.label_name, c.ndc, SUM(c.net_claim_count)
+        FROM claims c LEFT JOIN drug_info d ON c.ndc = d.ndc
+        WHERE {_BASE}
+        GROUP BY d.drug_name, d.label_name, c.ndc ORDER BY SUM(c.net_claim_count) DESC LIMIT 20""",
+    "claims.monthly_brand": f"""
+        SELECT TO_CHAR(c.date_filled, 'YYYY-MM') AS month, COUNT(*)
+        FROM claims c LEFT JOIN drug_info d ON c.ndc = d.ndc
+        WHERE {_BASE} AND d.mony = 'N'
+        GROUP BY TO_CHAR(c.date_filled, 'YYYY-MM') ORDER BY month""",
+    "anomalies.normal_month_baseline": f"""
+        SELECT c.pharmacy_state, ROUND(COUNT(*)::numeric / 9, 0)
+        FROM claims c WHERE {_BASE}
+          AND TO_CHAR(c.date_filled, 'YYYY-MM') NOT IN ('2021-05', '2021-09', '2021-11')
+        GROUP BY c.pharmacy_state ORDER BY c.pharmacy_state""",
+    "anomalies.september_by_state": f"""
+        SELECT c.pharmacy_state, COUNT(*)
+        FROM claims c WHERE {_BASE}
+          AND c.date_filled >= '2021-09-01' AND c.date_filled < '2021-10-01'
+        GROUP BY c.pharmacy_state ORDER BY c.pharmacy_state""",
+    "filters.drugs": f"""
+        SELECT DISTINCT d.drug_name FROM drug_info d
+        WHERE d.ndc IN (SELECT DISTINCT c.ndc FROM claims c WHERE {_BASE}) AND d.drug_name IS NOT NULL
+        ORDER BY d.drug_name""",
+    "filters.groups": f"""
+        SELECT DISTINCT c.group_id FROM claims c
+        WHERE {_BASE} AND c.group_id IS NOT NULL ORDER BY c.group_id""",
+}
+
+_COLUMNS = """
+    entity_id integer NOT NULL,
+    adjudicated boolean,
+    formulary varchar(20),
+    date_filled date,
+    ndc varchar(20),
+    days_supply integer,
+    group_id varchar(50),
+    pharmacy_state char(2),
+    mail_retail char(1),
+    net_claim_count smallint
+"""
+_INSERT_COLUMNS = ("adjudicated, formulary, date_filled, ndc, days_supply, group_id, "
+                   "pharmacy_state, mail_retail, net_claim_count")
+
+# The indexes declared in src/db/schema.ts
+SCHEMA_INDEXES = {
+    "entity": "(entity_id)",
+    "date": "(date_filled)",
+    "state": "(pharmacy_state)",
+    "formulary": "(formulary)",
+    "ndc": "(ndc)",
+    "group": "(group_id)",
+    "adjudicated": "(adjudicated)",
+    "entity_date": "(entity_id, date_filled)",
+    "entity_state": "(entity_id, pharmacy_state)",
+}
+
+_NOT_FLAGGED = "ndc NOT IN (" + ", ".join(f"'{n}'" for n in FLAGGED_NDCS) + ")"
+_COVERED = "INCLUDE (ndc, net_claim_count, pharmacy_state, formulary, group_id, days_supply, adjudicated)"
+
+
+@dataclass(frozen=True)
+class Design:
+    name: str
+    indexes: dict           # index suffix -> "USING ... (cols) ..." definition
+    partitioned: bool = False
+    order_by: str = ""      # physical load order
+    description: str = ""
+
+
+DESIGNS = {
+    "schema": Design("schema", SCHEMA_INDEXES, description="indexes as declared in schema.ts"),
+    "brin": Design(
+        "brin",
+        {**{k: v for k, v in SCHEMA_INDEXES.items() if k not in ("date", "entity_date")},
+         "date_brin": "USING brin (date_filled)"},
+        order_by="date_filled, entity_id",
+        description="BRIN on date_filled over date-ordered rows instead of the date b-trees",
+    ),
+    "partial": Design(
+        "partial",
+        {**SCHEMA_INDEXES,
+         "entity_date_real": f"(entity_id, date_filled) WHERE {_NOT_FLAGGED}",
+         "entity_state_real": f"(entity_id, pharmacy_state) WHERE {_NOT_FLAGGED}"},
+        description="schema.ts plus composites that exclude flagged NDCs",
+    ),
+    "covering": Design(
+        "covering",
+        {**{k: v for k, v in SCHEMA_INDEXES.items() if k != "entity_date"},
+         "entity_date_covering": f"(entity_id, date_filled) {_COVERED}"},
+        description="(entity_id, date_filled) covering every aggregated column (index-only scans)",
+    ),
+    "partitioned": Design(
+        "partitioned", SCHEMA_INDEXES, partitioned=True,
+        description="schema.ts indexes on a table range-partitioned by month",
+    ),
+}
+
+
+def _months(start, end):
+    """First days of every month touching [start, end], plus the month after."""
+    first = pd.Timestamp(start).to_period("M")
+    last = pd.Timestamp(end).to_period("M")
+    return [p.to_timestamp().date() for p in pd.period_range(first, last + 1, freq="M")]
+
+
+def design_ddl(design, schema, date_range):
+    """CREATE statements for one design's claims table and indexes."""
+    if design.partitioned:
+        statements = [f"CREATE TABLE {schema}.claims (id bigserial, {_COLUMNS}, PRIMARY KEY (id, date_filled)) "
+                      "PARTITION BY RANGE (date_filled)"]
+        bounds = _months(*date_range)
+        for lo, hi in zip(bounds, bounds[1:]):
+            statements.append(f"CREATE TABLE {schema}.claims_{lo:%Y_%m} PARTITION OF {schema}.claims "
+                              f"FOR VALUES FROM ('{lo}') TO ('{hi}')")
+        statements.append(f"CREATE TABLE {schema}.claims_default PARTITION OF {schema}.claims DEFAULT")
+    else:
+        statements = [f"CREATE TABLE {schema}.claims (id bigserial PRIMARY KEY, {_COLUMNS})"]
+    for suffix, definition in design.indexes.items():
+        statements.append(f"CREATE INDEX idx_claims_{suffix} ON {schema}.claims {definition}")
+    return statements
+
+
+async def load_source(conn, claims, drugs):
+    """Copy the extract (one entity's rows) and drug_info into the qp_data schema."""
+    await conn.execute(f"DROP SCHEMA IF EXISTS {DATA_SCHEMA} CASCADE; CREATE SCHEMA {DATA_SCHEMA}")
+    await conn.execute(f"""
+        CREATE TABLE {DATA_SCHEMA}.source (
+            adjudicated boolean, formulary varchar(20), date_filled date, ndc varchar(20),
+            days_supply integer, group_id varchar(50), pharmacy_state char(2), mail_retail char(1),
+            net_claim_count smallint);
+        CREATE TABLE {DATA_SCHEMA}.drug_info (
+            ndc varchar(20) PRIMARY KEY, drug_name varchar(255), label_name text,
+            mony char(1), manufacturer_name varchar(255));
+        CREATE INDEX ON {DATA_SCHEMA}.drug_info (mony);
+        CREATE INDEX ON {DATA_SCHEMA}.drug_info (manufacturer_name);
+        CREATE INDEX ON {DATA_SCHEMA}.drug_info (drug_name);
+    """)
+    records = zip(
+        claims["ADJUDICATED"].astype(bool), claims["FORMULARY"], claims["DATE"].dt.date,
+        claims["NDC"].astype(str), claims["DAYS_SUPPLY"].astype(int), claims["GROUP_ID"].astype(str),
+        claims["PHARMACY_STATE"], claims["MAILRETAIL"], claims["NET_CLAIM_COUNT"].astype(int),
+    )
+    await conn.copy_records_to_table("source", schema_name=DATA_SCHEMA, records=list(records))
+    drugs = drugs[DRUG_COLUMNS].drop_duplicates("NDC")
+    drug_records = [
+        (str(ndc), *(None if pd.isna(v) else str(v) for v in rest))
+        for ndc, *rest in drugs.itertuples(index=False)
+    ]
+    await conn.copy_records_to_table("drug_info", schema_name=DATA_SCHEMA, records=drug_records)
+    await conn.execute(f"ANALYZE {DATA_SCHEMA}.drug_info")
+
+
+async def build_design(conn, design, scale):
+    """(Re)create qp_<design> with `scale` entities and vacuum/analyze it."""
+    schema = f"qp_{design.name}"
+    date_range = await conn.fetchrow(f"SELECT MIN(date_filled), MAX(date_filled) FROM {DATA_SCHEMA}.source")
+    await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+    order = f"ORDER BY {design.order_by}" if design.order_by else ""
+    # Indexes after the load: faster, and what a bulk re-seed would do
+    ddl = design_ddl(design, schema, tuple(date_range))
+    tables = [s for s in ddl if not s.startswith("CREATE INDEX")]
+    for statement in tables:
+        await conn.execute(statement)
+    await conn.execute(f"""
+        INSERT INTO {schema}.claims (entity_id, {_INSERT_COLUMNS})
+        SELECT e AS entity_id, {_INSERT_COLUMNS} FROM {DATA_SCHEMA}.source CROSS JOIN generate_series(1, {int(scale)}) e
+        {order}
+    """)
+    for statement in ddl[len(tables):]:
+        await conn.execute(statement)
+    await conn.execute(f"VACUUM ANALYZE {schema}.claims")
+
+
+def plan_summary(plan):
+    """Node types and index names used anywhere in an EXPLAIN (FORMAT JSON) plan tree.
+
+    Per-partition indexes are reported once, as claims_*_<columns>_idx.
+    """
+    nodes, indexes = [], []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        nodes.append(node["Node Type"])
+        if "Index Name" in node:
+            indexes.append(_PARTITION.sub("claims_*_", node["Index Name"]))
+        stack.extend(node.get("Plans", []))
+    return nodes, sorted(set(indexes))
+
+
+@dataclass(frozen=True)
+class Run:
+    scale: int
+    design: str
+    query: str
+    ms: float               # planning + execution
+    shared_hit: int
+    shared_read: int
+    scans: str              # distinct scan node types
+    indexes: str
+
+
+async def explain(conn, sql, params):
+    raw = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *params)
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]
+
+
+async def run_queries(conn, design, scale, runs, entity_id=1, queries=QUERIES):
+    """`runs` timed executions of every query (after one warm-up) against one design."""
+    await conn.execute(f"SET search_path TO qp_{design.name}, {DATA_SCHEMA}")
+    params = [entity_id, *(str(n) for n in FLAGGED_NDCS)]
+    results = []
+    for name, sql in queries.items():
+        await explain(conn, sql, params)
+        for _ in range(runs):
+            out = await explain(conn, sql, params)
+            plan = out["Plan"]
+            nodes, indexes = plan_summary(plan)
+            scans = sorted({n for n in nodes if "Scan" in n})
+            results.append(Run(
+                scale, design.name, name,
+                out.get("Planning Time", 0.0) + out["Execution Time"],
+                plan.get("Shared Hit Blocks", 0), plan.get("Shared Read Blocks", 0),
+                ", ".join(scans), ", ".join(indexes),
+            ))
+    return results
+
+
+async def benchmark(dsn, claims, drugs, designs=tuple(DESIGNS), scales=(1,), runs=20, keep=False):
+    """Every query on every design at every scale; one Run per timed execution."""
+    conn = await asyncpg.connect(dsn, statement_cache_size=0)
+    results = []
+    try:
+        await load_source(conn, claims, drugs)
+        for scale in scales:
+            for name in designs:
+                design = DESIGNS[name]
+                await build_design(conn, design, scale)
+                results.extend(await run_queries(conn, design, scale, runs))
+                await conn.execute("RESET search_path")
+                if not keep:
+                    await conn.execute(f"DROP SCHEMA qp_{name} CASCADE")
+    finally:
+        if not keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {DATA_SCHEMA} CASCADE")
+        await conn.close()
+    return results
+
+
+def summarize(results, percentiles=(50, 95, 99)):
+    """Latency percentiles (ms), median buffers and the indexes used per (scale, query, design)."""
+    frame = pd.DataFrame([r.__dict__ for r in results])
+    grouped = frame.groupby(["scale", "query", "design"], sort=False)
+    summary = pd.DataFrame({f"p{p}_ms": grouped["ms"].quantile(p / 100) for p in percentiles})
+    summary["hit"] = grouped["shared_hit"].median()
+    summary["read"] = grouped["shared_read"].median()
+    summary["indexes"] = grouped["indexes"].agg(lambda s: s.mode().iloc[0])
+    return summary.round(2)
+
+
+def design_totals(results, percentiles=(50, 95, 99)):
+    """Per (scale, design): percentiles over all runs of all queries, and the sum of query medians."""
+    frame = pd.DataFrame([r.__dict__ for r in results])
+    grouped = frame.groupby(["scale", "design"], sort=False)
+    totals = pd.DataFrame({f"p{p}_ms": grouped["ms"].quantile(p / 100) for p in percentiles})
+    medians = frame.groupby(["scale", "design", "query"], sort=False)["ms"].median()
+    totals["sum_of_medians_ms"] = medians.groupby(level=["scale", "design"], sort=False).sum()
+    return totals.round(2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--scale", type=int, action="append", help="Entities to load; repeatable (default: 1)")
+    parser.add_argument("--design", action="append", choices=list(DESIGNS), help="Repeatable (default: all)")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--claims", default=CLAIMS_PATH)
+    parser.add_argument("--drugs", default=DRUGS_PATH)
+    parser.add_argument("--keep", action="store_true", help="Leave the qp_* schemas in place")
+    parser.add_argument("--json", help="Also write every run to this file")
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    results = asyncio.run(benchmark(
+        args.dsn, load_claims(args.claims), load_drugs(args.drugs),
+        tuple(args.design or DESIGNS), tuple(args.scale or (1,)), args.runs, args.keep,
+    ))
+    with pd.option_context("display.max_rows", None, "display.width", 250, "display.max_colwidth", 60):
+        print(summarize(results).to_string())
+        print()
+        print(design_totals(results).to_string())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([r.__dict__ for r in results], f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Refill cadence and adherence per group / NDC series.
+
+The extract has no member ID, so a series is every paid fill of one NDC in one
+group (plus entity when the frame has one). Fills of the same series on the
+same day collapse into one fill event with the longest days supply. The claims
+are sorted by (series, date) once; each refill is then compared with the run-out
+date of the previous fill (previous date + days supply) using shifted arrays:
+
+    early    refilled before EARLY_FRACTION of the previous supply was used
+    on_time  refilled between that point and run-out + GRACE_DAYS
+    lapsed   refilled more than GRACE_DAYS after run-out
+
+Adherence is the proportion of days covered (PDC): the union of the fills'
+supply intervals, from the first fill to the end of the extract, with
+overlapping supply not carried forward. The union is a per-series running max
+of interval ends, so nothing loops per series in Python.
+
+    python -m analytics.refills                   # rates per group
+    python -m analytics.refills --by DRUG_NAME --state KS
+    python -m analytics.refills --by MONTH
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import exclude_flagged, load_claims, load_drugs, merge_drugs
+from analytics.periods import month_keys
+from analytics.reversals import UNMATCHED, match_reversals
+
+KEY = ["GROUP_ID", "NDC"]
+STATUSES = ["early", "on_time", "lapsed"]
+
+EARLY_FRACTION = 0.8
+GRACE_DAYS = 7
+ADHERENT_PDC = 0.8
+
+
+def _days(dates):
+    return (dates.to_numpy() - np.datetime64("1970-01-01")) // np.timedelta64(1, "D")
+
+
+def _segment_starts(sorted_keys):
+    starts = np.ones(len(sorted_keys), dtype=bool)
+    starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    return starts
+
+
+def paid_fills(claims):
+    """Incurred claims that were not later reversed (see analytics.reversals)."""
+    matches = match_reversals(claims)
+    reversed_ = matches.loc[matches["original"] != UNMATCHED, "original"]
+    incurred = claims[claims["NET_CLAIM_COUNT"] == 1]
+    return incurred[~incurred.index.isin(reversed_)]
+
+
+def fill_events(fills, key=KEY):
+    """One row per (series, fill date), sorted by series then date.
+
+    SERIES is a dense series id; FILLS the collapsed claim count.
+    """
+    key = (["ENTITY_ID"] if "ENTITY_ID" in fills.columns and "ENTITY_ID" not in key else []) + list(key)
+    series = fills.groupby(key, sort=False, dropna=False).ngroup().to_numpy()
+    day = _days(fills["DATE"])
+    order = np.lexsort((day, series))
+    s, d = series[order], day[order]
+    new = _segment_starts(s)
+    new[1:] |= d[1:] != d[:-1]
+    starts = np.flatnonzero(new)
+    rows = order[starts]
+    events = fills.iloc[rows][key].reset_index(drop=True)
+    events["SERIES"] = s[starts]
+    events["DATE"] = fills["DATE"].to_numpy()[rows]
+    supply = fills["DAYS_SUPPLY"].to_numpy()[order]
+    events["DAYS_SUPPLY"] = np.maximum.reduceat(supply, starts) if len(starts) else supply[:0]
+    events["FILLS"] = np.diff(np.append(starts, len(s)))
+    return events
+
+
+def refill_intervals(fills, key=KEY, early_fraction=EARLY_FRACTION, grace_days=GRACE_DAYS):
+    """One row per refill: gap to the previous fill, slack against its run-out, and status.
+
+    `slack` is days after the previous fill's run-out date (negative = early).
+    """
+    events = fill_events(fills, key)
+    series = events["SERIES"].to_numpy()
+    day = _days(events["DATE"])
+    supply = events["DAYS_SUPPLY"].to_numpy()
+    refill = np.zeros(len(events), dtype=bool)
+    refill[1:] = series[1:] == series[:-1]
+
+    idx = np.flatnonzero(refill)
+    gap = day[idx] - day[idx - 1]
+    expected = supply[idx - 1]
+    slack = gap - expected
+    status = np.select([gap < early_fraction * expected, slack > grace_days], [0, 2], 1)
+
+    out = events.iloc[idx].reset_index(drop=True)
+    out["gap"] = gap
+    out["expected"] = expected
+    out["slack"] = slack
+    out["status"] = pd.Categorical.from_codes(status, STATUSES)
+    return out
+
+
+def summarize(intervals, by="GROUP_ID"):
+    """Refill counts, early / on-time / lapsed rates (%) and median gap and slack per `by` value."""
+    grouped = intervals.groupby(by, sort=True, observed=True)
+    rates = pd.crosstab(intervals[by], intervals["status"], normalize="index", dropna=False) * 100
+    summary = pd.DataFrame({"refills": grouped.size()})
+    for status in STATUSES:
+        summary[f"{status}_rate"] = rates[status] if status in rates else 0.0
+    summary["gap_p50"] = grouped["gap"].median()
+    summary["slack_p50"] = grouped["slack"].median()
+    return summary.round(1)
+
+
+def adherence(fills, key=KEY, end=None):
+    """Proportion of days covered per series, from its first fill to `end` (default: last fill date).
+
+    Coverage is the union of [fill day, fill day + days supply) intervals, clipped at `end`.
+    """
+    events = fill_events(fills, key)
+    series = events["SERIES"].to_numpy()
+    start = _days(events["DATE"])
+    end = int(start.max(initial=0)) if end is None else (pd.Timestamp(end) - pd.Timestamp(0)).days
+    end += 1
+    stop = np.minimum(start + events["DAYS_SUPPLY"].to_numpy(), end)
+
+    # Running max of interval ends, restarted per series by an offset that grows with the series id
+    shift = series * (end + 1)
+    reach = np.maximum.accumulate(stop + shift) - shift
+    prior = np.empty_like(reach)
+    prior[1:] = reach[:-1]
+    first = _segment_starts(series)
+    prior[first] = start[first]
+    covered = np.maximum(stop - np.maximum(start, prior), 0)
+
+    cols = [c for c in events.columns if c not in ("SERIES", "DATE", "DAYS_SUPPLY", "FILLS")]
+    out = events.loc[first, cols].reset_index(drop=True)
+    seg = np.cumsum(first) - 1
+    out["fills"] = np.bincount(seg, weights=events["FILLS"].to_numpy()).astype(int)
+    out["first_fill"] = events["DATE"].to_numpy()[first]
+    out["days"] = end - start[first]
+    out["covered"] = np.bincount(seg, weights=covered).astype(int)
+    out["pdc"] = out["covered"] / out["days"]
+    return out
+
+
+def adherence_summary(pdc, by="GROUP_ID", min_fills=2, threshold=ADHERENT_PDC):
+    """Series count, mean PDC and share of series at or above `threshold` per `by` value."""
+    pdc = pdc[pdc["fills"] >= min_fills]
+    grouped = pdc.assign(_a=pdc["pdc"] >= threshold).groupby(by, sort=True, observed=True)
+    return pd.DataFrame({
+        "series": grouped.size(),
+        "pdc_mean": grouped["pdc"].mean() * 100,
+        "adherent_rate": grouped["_a"].mean() * 100,
+    }).round(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--by", default="GROUP_ID", help="GROUP_ID, NDC, DRUG_NAME, PHARMACY_STATE or MONTH")
+    parser.add_argument("--state", help="Only fills from this pharmacy state")
+    parser.add_argument("--early-fraction", type=float, default=EARLY_FRACTION)
+    parser.add_argument("--grace-days", type=int, default=GRACE_DAYS)
+    args = parser.parse_args(argv)
+
+    claims = exclude_flagged(load_claims())
+    if args.state:
+        claims = claims[claims["PHARMACY_STATE"] == args.state]
+    fills = paid_fills(claims)
+    if args.by in ("DRUG_NAME", "MANUFACTURER_NAME", "MONY"):
+        fills = merge_drugs(fills, load_drugs())
+    key = KEY + ([args.by] if args.by not in KEY + ["MONTH"] else [])
+
+    intervals = refill_intervals(fills, key, args.early_fraction, args.grace_days)
+    intervals["MONTH"] = month_keys(intervals)
+    counts = intervals["status"].value_counts(normalize=True)
+    print(f"{len(fills):,} paid fills, {len(intervals):,} refills: "
+          + ", ".join(f"{counts.get(s, 0):.1%} {s}" for s in STATUSES))
+    summary = summarize(intervals, args.by)
+    if args.by != "MONTH":
+        summary = summary.join(adherence_summary(adherence(fills, key), args.by))
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(summary.sort_values("refills", ascending=False).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""Content-addressed result cache for the validation suite (pytest plugin).
+
+With `--result-cache`, each test is keyed on digests of the data files
+(Claims_Export.csv, Drug_Info.csv), its code, its parameters, and the Python /
+pandas / numpy versions. Its code is the test function, the rest of its
+module minus the other tests (helpers, constants, fixtures), tests/conftest.py,
+and every analytics module the test module imports, followed transitively —
+all compared as ASTs, so comments and moved lines don't count. A test that
+passed under the same key is reported as passed without running, and without
+loading the data; only tests whose data or logic changed run again.
+
+Tests with skipif markers depend on the environment (a live database, a
+daemon) and always run. Failures are never cached. File digests are memoized
+on (size, mtime), so an unchanged extract isn't re-read either.
+
+    python -m pytest --result-cache            # reuse passing results
+    python -m pytest --result-cache-clear      # forget them first
+"""
+import ast
+import hashlib
+import json
+import os
+import platform
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from _pytest.reports import TestReport
+
+from analytics.data import CLAIMS_PATH, DRUGS_PATH
+
+DEFAULT_PATH = Path(".cache/validation/results.json")
+PACKAGE_DIR = Path(__file__).parent
+DATA_FILES = (CLAIMS_PATH, DRUGS_PATH)
+CHUNK = 1 << 20
+KEYS_PER_TEST = 4  # passing keys kept per test, so reverting an edit is still a hit
+
+_CACHE = pytest.StashKey()
+_ITEM_KEY = pytest.StashKey()
+
+
+def _hash(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode() if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_digest(path, memo):
+    """Content digest of `path`, reused from `memo` while its size and mtime are unchanged."""
+    path = Path(path).resolve()
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return "missing"
+    entry = memo.get(str(path))
+    if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            h.update(chunk)
+    memo[str(path)] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+    return h.hexdigest()
+
+
+def analytics_imports(tree):
+    """Names of the analytics modules imported anywhere in `tree` (including function-level imports)."""
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(a.name.split(".")[1] for a in node.names if a.name.startswith("analytics."))
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            if node.module == "analytics":
+                found.update(a.name for a in node.names)
+            elif node.module.startswith("analytics."):
+                found.add(node.module.split(".")[1])
+    return found
+
+
+def _is_test(node, prefix):
+    return getattr(node, "name", "").startswith(prefix)
+
+
+def item_code(tree, function, cls=None):
+    """AST dump of a test module reduced to one test: other tests are dropped, everything else kept."""
+    kept = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and _is_test(node, "test"):
+            if cls is None and node.name == function:
+                kept.append(node)
+        elif isinstance(node, ast.ClassDef) and _is_test(node, "Test"):
+            if node.name == cls:
+                body = [n for n in node.body if not _is_test(n, "test") or n.name == function]
+                kept.append(ast.ClassDef(node.name, node.bases, node.keywords, body, node.decorator_list))
+        else:
+            kept.append(node)
+    return ast.dump(ast.Module(kept, []))
+
+
+class ResultCache:
+    def __init__(self, path, root):
+        self.path = Path(path)
+        self.root = Path(root)
+        try:
+            stored = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            stored = {}
+        self.files = stored.get("files", {})
+        self.passed = stored.get("passed", {})
+        self.hits = self.recorded = 0
+        self._trees = {}
+        self._modules = {}
+        self._environment = None
+
+    def _tree(self, path):
+        if path not in self._trees:
+            self._trees[path] = ast.parse(Path(path).read_text())
+        return self._trees[path]
+
+    def _module_digest(self, name, seen):
+        """Digest of analytics/<name>.py and, transitively, the analytics modules it imports."""
+        if name in self._modules:
+            return self._modules[name]
+        path = PACKAGE_DIR / f"{name}.py"
+        if not path.exists() or name in seen:
+            return ""
+        seen.add(name)
+        deps = sorted(analytics_imports(self._tree(path)) - {name})
+        digest = _hash(ast.dump(self._tree(path)), *(self._module_digest(d, seen) for d in deps))
+        self._modules[name] = digest
+        return digest
+
+    def environment(self):
+        """Data files, conftest and its analytics imports, and library versions — shared by every test."""
+        if self._environment is None:
+            conftest = self.root / "tests" / "conftest.py"
+            parts = [file_digest(p, self.files) for p in DATA_FILES]
+            if conftest.exists():
+                parts.append(ast.dump(self._tree(conftest)))
+                parts += [self._module_digest(m, set()) for m in sorted(analytics_imports(self._tree(conftest)))]
+            parts += [platform.python_version(), pd.__version__, np.__version__]
+            self._environment = _hash(*parts)
+        return self._environment
+
+    def key(self, item):
+        """The item's cache key, or None if it must always run."""
+        if not isinstance(item, pytest.Function) or any(item.iter_markers("skipif")):
+            return None
+        path = str(item.path)
+        tree = self._tree(path)
+        cls = item.cls.__name__ if item.cls else None
+        code = item_code(tree, item.originalname, cls)
+        modules = [self._module_digest(m, set()) for m in sorted(analytics_imports(tree))]
+        params = repr(sorted(item.callspec.params.items())) if hasattr(item, "callspec") else ""
+        return _hash(self.environment(), code, *modules, params)
+
+    def hit(self, item, key):
+        return key is not None and key in self.passed.get(item.nodeid, ())
+
+    def record(self, nodeid, key):
+        keys = [k for k in self.passed.get(nodeid, ()) if k != key]
+        self.passed[nodeid] = [key, *keys][:KEYS_PER_TEST]
+        self.recorded += 1
+
+    def forget(self, nodeid):
+        self.passed.pop(nodeid, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"files": self.files, "passed": self.passed}, sort_keys=True))
+        os.replace(tmp, self.path)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("result-cache")
+    group.addoption("--result-cache", action="store_true",
+                    help="Report tests whose data, code and parameters are unchanged since they passed as passed "
+                         "without running them")
+    group.addoption("--result-cache-clear", action="store_true", help="Discard cached results first")
+    group.addoption("--result-cache-path", default=str(DEFAULT_PATH))
+
+
+def pytest_configure(config):
+    if not (config.getoption("result_cache") or config.getoption("result_cache_clear")):
+        return
+    path = Path(config.getoption("result_cache_path"))
+    if not path.is_absolute():
+        path = config.rootpath / path
+    if config.getoption("result_cache_clear") and path.exists():
+        path.unlink()
+    config.stash[_CACHE] = ResultCache(path, config.rootpath)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_protocol(item, nextitem):
+    cache = item.config.stash.get(_CACHE, None)
+    if cache is None:
+        return None
+    key = cache.key(item)
+    if not cache.hit(item, key):
+        item.stash[_ITEM_KEY] = key
+        return None
+    cache.hits += 1
+    ihook = item.ihook
+    ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+    for when in ("setup", "call", "teardown"):
+        report = TestReport(item.nodeid, item.location, {k: 1 for k in item.keywords}, "passed", None, when,
+                            user_properties=[("result_cache", "hit")])
+        ihook.pytest_runtest_logreport(report=report)
+    # What the skipped teardown phase would have done: drop fixtures `nextitem` doesn't share
+    item.session._setupstate.teardown_exact(nextitem)
+    ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+    return True
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    cache = item.config.stash.get(_CACHE, None)
+    key = item.stash.get(_ITEM_KEY, None)
+    if cache is None or key is None:
+        return
+    report = outcome.get_result()
+    if not report.passed:
+        cache.forget(item.nodeid)
+        item.stash[_ITEM_KEY] = None
+    elif report.when == "teardown":
+        cache.record(item.nodeid, key)
+
+
+def pytest_sessionfinish(session):
+    cache = session.config.stash.get(_CACHE, None)
+    if cache is not None:
+        cache.save()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    cache = config.stash.get(_CACHE, None)
+    if cache is not None:
+        terminalreporter.write_line(f"result cache: {cache.hits} reused, {cache.recorded} recorded -> {cache.path}")
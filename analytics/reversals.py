@@ -0,0 +1,167 @@
+"""Link each reversal to the claim it reverses and to the rebill that replaces it.
+
+Claims are keyed on (group, NDC, days supply, state) — plus entity when the
+frame has one. Within a key, a reversal (NET_CLAIM_COUNT == -1) is paired with
+the most recent not-yet-reversed incurred claim on or before its date, and with
+the first incurred claim on a later date not already claimed as the rebill of a
+more recent reversal. Both pairings are one-to-one and are computed as bracket
+matching over the key-and-date sorted claims: the nesting depth is a floored
+cumulative sum, and each closing event pairs with the preceding opening event
+at the same depth. No pairwise comparison and no per-key loop.
+
+    python -m analytics.reversals                     # per-group match rates and lags
+    python -m analytics.reversals --state KS --month 8
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import load_claims
+
+KEY = ["GROUP_ID", "NDC", "DAYS_SUPPLY", "PHARMACY_STATE"]
+UNMATCHED = -1
+
+DEFAULT_ORIGINAL_DAYS = 90
+DEFAULT_REBILL_DAYS = 90
+
+
+def _segment_starts(sorted_keys):
+    starts = np.ones(len(sorted_keys), dtype=bool)
+    starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    return starts
+
+
+def bracket_pairs(key, order_key, is_open):
+    """Pair every close with an open earlier in the same key, innermost first.
+
+    `order_key` orders events within a key (ties must already be broken).
+    Returns `partner`, aligned with the inputs: for each matched close the
+    index of its open, else UNMATCHED. Closes with no open left are unmatched.
+    """
+    n = len(key)
+    partner = np.full(n, UNMATCHED, dtype=np.int64)
+    if n == 0:
+        return partner
+    order = np.lexsort((order_key, key))
+    k = key[order]
+    step = np.where(is_open[order], 1, -1)
+    seg = np.cumsum(_segment_starts(k)) - 1
+
+    c = np.cumsum(step)
+    first = np.flatnonzero(_segment_starts(k))
+    c -= np.repeat(c[first] - step[first], np.diff(np.append(first, n)))
+    # Depth floored at zero within each key: c - running min(min(c, 0)).
+    # Later keys are shifted down by (n + 1) so the running min restarts per key.
+    shift = seg * (n + 1)
+    floor = np.minimum.accumulate(np.minimum(c, 0) - shift) + shift
+    depth = c - floor
+
+    prev_depth = np.concatenate([[0], depth[:-1]])
+    prev_depth[first] = 0
+    opened = step > 0
+    matched_close = ~opened & (prev_depth > 0)
+
+    level = np.where(opened, depth, prev_depth)
+    take = opened | matched_close
+    pos = np.flatnonzero(take)
+    # Within (key, level), events alternate open, close, open, close, ...
+    by_level = pos[np.lexsort((pos, level[pos], k[pos]))]
+    closes = np.flatnonzero(matched_close[by_level])
+    partner[order[by_level[closes]]] = order[by_level[closes - 1]]
+    return partner
+
+
+def match_reversals(claims, original_days=DEFAULT_ORIGINAL_DAYS, rebill_days=DEFAULT_REBILL_DAYS,
+                    key=KEY):
+    """One row per reversal: its original and rebill claim (index labels) and lags in days.
+
+    The original is within `original_days` on or before the reversal date; the
+    rebill is on a later date within `rebill_days`. Unmatched sides get
+    UNMATCHED and a NaN lag.
+    """
+    key = (["ENTITY_ID"] if "ENTITY_ID" in claims.columns and "ENTITY_ID" not in key else []) + list(key)
+    key_id = claims.groupby(key, sort=False, dropna=False).ngroup().to_numpy()
+    day = (claims["DATE"].to_numpy() - np.datetime64("1970-01-01")) // np.timedelta64(1, "D")
+    reversal = claims["NET_CLAIM_COUNT"].to_numpy() == -1
+    incurred = claims["NET_CLAIM_COUNT"].to_numpy() == 1
+    rows = np.flatnonzero(reversal | incurred)
+    key_id, day, reversal = key_id[rows], day[rows], reversal[rows]
+
+    # Same-day ties: incurred sorts before reversal, so a same-day fill can be
+    # the reversed claim but never the rebill
+    order_key = day * 2 + reversal
+    original = bracket_pairs(key_id, order_key, ~reversal)
+    billed = bracket_pairs(key_id, order_key, reversal)  # incurred -> reversal it rebills
+    rebill = np.full(len(rows), UNMATCHED, dtype=np.int64)
+    rebilled = np.flatnonzero(billed != UNMATCHED)
+    rebill[billed[rebilled]] = rebilled
+
+    rev = np.flatnonzero(reversal)
+    out = {}
+    for name, partner, window, sign in (("original", original, original_days, 1),
+                                        ("rebill", rebill, rebill_days, -1)):
+        p = partner[rev]
+        lag = np.where(p == UNMATCHED, np.nan, sign * (day[rev] - day[np.maximum(p, 0)])).astype(float)
+        ok = (p != UNMATCHED) & (lag <= window)
+        out[name] = np.where(ok, claims.index.to_numpy()[rows[np.maximum(p, 0)]], UNMATCHED)
+        out[f"{name}_lag"] = np.where(ok, lag, np.nan)
+
+    result = pd.DataFrame({"reversal": claims.index.to_numpy()[rows[rev]], **out})
+    for col in key:
+        result[col] = claims[col].to_numpy()[rows[rev]]
+    result["DATE"] = claims["DATE"].to_numpy()[rows[rev]]
+    return result
+
+
+def summarize(matches, by="GROUP_ID", quantiles=(0.1, 0.5, 0.9)):
+    """Match rates (%) and lag quantiles (days) per `by` value."""
+    matched_original = matches["original"] != UNMATCHED
+    matched_rebill = matches["rebill"] != UNMATCHED
+    grouped = matches.assign(_o=matched_original, _r=matched_rebill).groupby(by, sort=True, observed=True)
+    summary = pd.DataFrame({
+        "reversals": grouped.size(),
+        "original_rate": grouped["_o"].mean() * 100,
+        "rebill_rate": grouped["_r"].mean() * 100,
+    })
+    for side in ("original", "rebill"):
+        lags = grouped[f"{side}_lag"].quantile(list(quantiles)).unstack()
+        lags.columns = [f"{side}_lag_p{int(q * 100)}" for q in quantiles]
+        summary = summary.join(lags)
+    return summary.round(1)
+
+
+def lag_histogram(matches, side="rebill", by="GROUP_ID", bin_days=7, max_days=DEFAULT_REBILL_DAYS):
+    """Counts of matched lags in `bin_days` buckets per `by` value (columns are bucket starts)."""
+    lag = matches[f"{side}_lag"]
+    present = matches[lag.notna()]
+    bucket = (present[f"{side}_lag"] // bin_days * bin_days).astype(int).clip(upper=max_days)
+    table = present.groupby([by, bucket], observed=True).size().unstack(fill_value=0)
+    table.columns.name = f"{side}_lag_days"
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--state", help="Only reversals from this pharmacy state")
+    parser.add_argument("--month", type=int, help="Only reversals filled in this month")
+    parser.add_argument("--original-days", type=int, default=DEFAULT_ORIGINAL_DAYS)
+    parser.add_argument("--rebill-days", type=int, default=DEFAULT_REBILL_DAYS)
+    args = parser.parse_args(argv)
+
+    matches = match_reversals(load_claims(), args.original_days, args.rebill_days)
+    if args.state:
+        matches = matches[matches["PHARMACY_STATE"] == args.state]
+    if args.month:
+        matches = matches[matches["DATE"].dt.month == args.month]
+    print(f"{len(matches):,} reversals: "
+          f"{(matches['original'] != UNMATCHED).mean():.1%} matched to an original, "
+          f"{(matches['rebill'] != UNMATCHED).mean():.1%} rebilled")
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(summarize(matches).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
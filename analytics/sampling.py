@@ -0,0 +1,260 @@
+"""Stratified claim samples with confidence intervals, for fast approximate analytics.
+
+Claims are stratified by (entity,) state, formulary, month and group, and
+each stratum keeps max(fraction x size, min_per_stratum) random claims — all
+of them when it is smaller than that, so small groups are never lost and their
+answers are exact. Every metric is a stratified estimate over the sample
+alone:
+
+    volume        claims (or net claims) per key, expanded by N_h / n_h
+    rate          reversal / adjudication rate per key (ratio estimator)
+    top_drugs     the highest-volume NDCs (or any column)
+    deviations    monthly volume vs the same year's normal-month baseline
+
+with a standard error from the stratified variance (finite-population
+corrected, linearized for ratios) and a normal confidence interval. The
+knob is `fraction` (and `min_per_stratum`): the standard error shrinks with
+the square root of the sample while query time grows linearly with it.
+Queries take the API's filter query string and only touch sampled rows.
+
+    python -m analytics.sampling build --fraction 0.02
+    python -m analytics.sampling query "state=KS&formulary=OPEN"
+"""
+import argparse
+import gzip
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.data import CLAIMS_PATH, RATES, load_claims, load_drugs, merge_drugs, successes
+from analytics.filters import claims_mask, parse_filters
+from analytics.homogeneity import CONFIDENCE_Z
+from analytics.periods import ANOMALOUS_PERIODS, normal_baseline, period_labels, periods_of, year_of
+
+DEFAULT_PATH = Path(".cache/sampling/sample.csv.gz")
+STRATA = ["PHARMACY_STATE", "FORMULARY", "PERIOD", "GROUP_ID"]  # PERIOD must stay: deviations rely on it
+FRACTION = 0.01
+MIN_PER_STRATUM = 10
+TOP_LIMIT = 10
+
+
+@dataclass
+class Sample:
+    rows: pd.DataFrame        # sampled claims plus STRATUM
+    population: np.ndarray    # claims per stratum (N_h)
+    taken: np.ndarray         # sampled claims per stratum (n_h)
+    fraction: float
+
+    @property
+    def size(self):
+        return int(self.population.sum())
+
+
+def _strata(claims):
+    cols = (["ENTITY_ID"] if "ENTITY_ID" in claims.columns else []) + STRATA
+    keyed = claims.assign(PERIOD=periods_of(claims))
+    return keyed.groupby(cols, sort=True, dropna=False).ngroup().to_numpy(dtype=np.int64)
+
+
+def build(claims, fraction=FRACTION, min_per_stratum=MIN_PER_STRATUM, seed=0):
+    """Stratified random sample of `claims`."""
+    code = _strata(claims)
+    population = np.bincount(code)
+    taken = np.minimum(population, np.maximum(np.ceil(fraction * population).astype(np.int64), min_per_stratum))
+
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(code)), code))  # shuffled within each stratum
+    starts = np.concatenate([[0], np.cumsum(population)[:-1]])
+    rank = np.arange(len(code)) - starts[code[order]]
+    keep = np.sort(order[rank < taken[code[order]]])
+    rows = claims.iloc[keep].assign(STRATUM=code[keep]).reset_index(drop=True)
+    return Sample(rows, population, taken, fraction)
+
+
+def _estimate(sample, codes, n_keys, y, x=None):
+    """Stratified totals of `y` (or ratios of totals y / x) per domain code, and their standard errors.
+
+    Rows with code -1 are outside every domain; they still count as zeros in
+    their stratum's variance.
+    """
+    n_strata = len(sample.population)
+    inside = codes >= 0
+    pair = codes[inside] * n_strata + sample.rows["STRATUM"].to_numpy()[inside]
+    cells, inv = np.unique(pair, return_inverse=True)
+    key, h = cells // n_strata, cells % n_strata
+    big_n, n = sample.population[h].astype(float), sample.taken[h].astype(float)
+
+    y = np.asarray(y, dtype=float)[inside]
+    sy, syy = np.bincount(inv, y), np.bincount(inv, y * y)
+    total_y = np.bincount(key, big_n / n * sy, minlength=n_keys)
+    if x is None:
+        estimate, sz, szz, scale = total_y, sy, syy, 1.0
+    else:
+        x = np.asarray(x, dtype=float)[inside]
+        sx, sxx, sxy = np.bincount(inv, x), np.bincount(inv, x * x), np.bincount(inv, x * y)
+        total_x = np.bincount(key, big_n / n * sx, minlength=n_keys)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimate = total_y / total_x
+        r = np.nan_to_num(estimate)[key]
+        sz, szz = sy - r * sx, syy - 2 * r * sxy + r * r * sxx  # linearized residuals y - R x
+        scale = total_x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s2 = np.where(n > 1, (szz - sz * sz / n) / (n - 1), 0.0)
+        variance = np.bincount(key, big_n * big_n * (1 - n / big_n) * np.maximum(s2, 0) / n, minlength=n_keys)
+        return estimate, np.sqrt(variance) / scale
+
+
+def _domains(rows, by, mask):
+    """(codes, keys): one code per sampled row (-1 outside `mask`), and the key of each code."""
+    if by is None:
+        return np.where(mask, 0, -1), pd.Index(["all"])
+    grouped = rows[mask].groupby(by, sort=True, observed=True)
+    codes = np.full(len(rows), -1, dtype=np.int64)
+    codes[mask] = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    return codes, grouped.size().index
+
+
+def _mask(sample, query):
+    if query is None:
+        return np.ones(len(sample.rows), dtype=bool)
+    return claims_mask(sample.rows, parse_filters(query)).to_numpy()
+
+
+def _frame(keys, by, columns):
+    names = [by] if isinstance(by, str) else list(by or ["key"])
+    index = keys.to_frame(index=False, name=names) if isinstance(keys, pd.MultiIndex) else \
+        pd.DataFrame({names[0]: np.asarray(keys, dtype=object)})
+    return index.assign(**columns)
+
+
+def volume(sample, by=None, query=None, net=False, z=CONFIDENCE_Z):
+    """Estimated claims (or net claims) per `by` key: claims, se, ci_lo, ci_hi."""
+    mask = _mask(sample, query)
+    codes, keys = _domains(sample.rows, by, mask)
+    y = sample.rows["NET_CLAIM_COUNT"].to_numpy() if net else np.ones(len(sample.rows))
+    est, se = _estimate(sample, codes, len(keys), y)
+    return _frame(keys, by, {"claims": est, "se": se, "ci_lo": est - z * se, "ci_hi": est + z * se})
+
+
+def rate(sample, rate="reversal", by=None, query=None, z=CONFIDENCE_Z):
+    """Estimated reversal or adjudication rate (%) per `by` key: rate_pct, se, ci_lo, ci_hi."""
+    mask = _mask(sample, query)
+    codes, keys = _domains(sample.rows, by, mask)
+    est, se = _estimate(sample, codes, len(keys), successes(sample.rows, rate), np.ones(len(sample.rows)))
+    lo, hi = np.clip(est - z * se, 0, 1), np.clip(est + z * se, 0, 1)
+    return _frame(keys, by, {"rate_pct": est * 100, "se": se * 100, "ci_lo": lo * 100, "ci_hi": hi * 100})
+
+
+def top_drugs(sample, k=TOP_LIMIT, by="NDC", query=None, net=True, z=CONFIDENCE_Z):
+    """The `k` keys of `by` with the highest estimated (net) volume."""
+    table = volume(sample, by, query, net, z)
+    return table.nlargest(k, "claims").reset_index(drop=True)
+
+
+def deviations(sample, by=None, query=None, exclude=ANOMALOUS_PERIODS, z=CONFIDENCE_Z):
+    """Monthly claims per `by` key vs the mean of the same year's non-excluded months.
+
+    Months are strata, so a month's total only varies with its own strata:
+    the deviation ratio T_m / B is linearized over a (keys x periods)
+    variance matrix rather than over rows.
+    """
+    mask = _mask(sample, query)
+    codes, keys = _domains(sample.rows, by, mask)
+    p = periods_of(sample.rows).astype(np.int64)
+    periods = np.arange(p.min(), p.max() + 1)
+    n_periods = len(periods)
+    cell = np.where(codes >= 0, codes * n_periods + p - periods[0], -1)
+    totals, se = _estimate(sample, cell, len(keys) * n_periods, np.ones(len(sample.rows)))
+    totals, var = totals.reshape(len(keys), n_periods), (se ** 2).reshape(len(keys), n_periods)
+
+    normal = ~np.isin(periods, list(exclude))
+    per_year = pd.Series(normal).groupby(year_of(periods)).transform("sum").to_numpy()
+    baseline = normal_baseline(totals, periods, exclude)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = totals / baseline
+        share = ratio / per_year  # d(T_m / B) / d(T_m') for each normal month m' of the year
+        year_var = normal_baseline(var, periods, exclude) * per_year
+        ratio_var = (var * (1 - normal * share) ** 2 + share ** 2 * (year_var - normal * var)) / baseline ** 2
+    ratio_se = np.sqrt(ratio_var)
+
+    rows, cols = np.indices(totals.shape).reshape(2, -1)
+    pct = (ratio.ravel() - 1) * 100
+    table = _frame(keys[rows], by, {
+        "period": period_labels(periods[cols]),
+        "claims": totals.ravel(),
+        "baseline": baseline.ravel(),
+        "pct_vs_baseline": pct,
+        "ci_lo": pct - z * ratio_se.ravel() * 100,
+        "ci_hi": pct + z * ratio_se.ravel() * 100,
+    })
+    return table[totals.ravel() > 0].reset_index(drop=True)
+
+
+def read_sample(path=DEFAULT_PATH):
+    rows = pd.read_csv(path, parse_dates=["DATE"])
+    strata = rows.groupby("STRATUM")[["STRATUM_CLAIMS", "STRATUM_SAMPLED"]].first()
+    n_strata = int(strata.index.max()) + 1
+    population, taken = np.zeros(n_strata, dtype=np.int64), np.zeros(n_strata, dtype=np.int64)
+    population[strata.index], taken[strata.index] = strata["STRATUM_CLAIMS"], strata["STRATUM_SAMPLED"]
+    fraction = float(rows["FRACTION"].iloc[0])
+    return Sample(rows.drop(columns=["STRATUM_CLAIMS", "STRATUM_SAMPLED", "FRACTION"]), population, taken, fraction)
+
+
+def write_sample(sample, path=DEFAULT_PATH):
+    """Atomic write (temp file + rename); per-stratum sizes ride along on each row."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    code = sample.rows["STRATUM"].to_numpy()
+    rows = sample.rows.assign(STRATUM_CLAIMS=sample.population[code], STRATUM_SAMPLED=sample.taken[code],
+                              FRACTION=sample.fraction)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        rows.to_csv(f, index=False)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("claims", nargs="?", default=CLAIMS_PATH)
+    b.add_argument("--fraction", type=float, default=FRACTION)
+    b.add_argument("--min-per-stratum", type=int, default=MIN_PER_STRATUM)
+    b.add_argument("--seed", type=int, default=0)
+    q = sub.add_parser("query")
+    q.add_argument("query", nargs="?", default="", help="Filter query string, e.g. state=KS&formulary=OPEN")
+    q.add_argument("--by", help="Column to break the metrics down by, e.g. PHARMACY_STATE")
+    q.add_argument("--top", type=int, default=TOP_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        claims = merge_drugs(load_claims(args.claims), load_drugs())
+        sample = build(claims, args.fraction, args.min_per_stratum, args.seed)
+        write_sample(sample, args.sample)
+        print(f"{len(sample.rows):,} of {sample.size:,} claims in {len(sample.population):,} strata -> {args.sample}")
+        return 0
+
+    sample = read_sample(args.sample)
+    print(f"sample: {len(sample.rows):,} of {sample.size:,} claims ({sample.fraction:g} per stratum)")
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.precision", 2):
+        print(volume(sample, args.by, args.query).to_string(index=False))
+        print()
+        print(volume(sample, args.by, args.query, net=True).to_string(index=False))
+        for name in RATES:
+            print()
+            print(rate(sample, name, args.by, args.query).assign(rate=name).to_string(index=False))
+        print()
+        print(top_drugs(sample, args.top, query=args.query).to_string(index=False))
+        print()
+        found = deviations(sample, args.by, args.query)
+        print(found[(found["ci_lo"] > 0) | (found["ci_hi"] < 0)].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
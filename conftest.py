@@ -0,0 +1,3 @@
+"""Root conftest — puts the repo root on sys.path so tests can import analytics."""
+
+pytest_plugins = ["analytics.result_cache"]
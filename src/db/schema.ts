@@ -7,8 +7,10 @@ import {
   date,
   integer,
   smallint,
+  bigint,
   timestamp,
   index,
+  uniqueIndex,
   char,
 } from 'drizzle-orm/pg-core';
 
@@ -51,6 +53,7 @@ export const claims = pgTable(
     pharmacyState: char('pharmacy_state', { length: 2 }),
     mailRetail: char('mail_retail', { length: 1 }), // M or R
     netClaimCount: smallint('net_claim_count'), // +1 or -1
+    fingerprint: bigint('fingerprint', { mode: 'bigint' }), // row hash — see analytics/ingest.py
   },
   (table) => [
     index('idx_claims_entity').on(table.entityId),
@@ -63,5 +66,7 @@ export const claims = pgTable(
     // Composite index for common filter combinations
     index('idx_claims_entity_date').on(table.entityId, table.dateFilled),
     index('idx_claims_entity_state').on(table.entityId, table.pharmacyState),
+    // Idempotent re-ingestion: one row per (entity, fingerprint)
+    uniqueIndex('idx_claims_entity_fingerprint').on(table.entityId, table.fingerprint),
   ],
 );
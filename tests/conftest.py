@@ -1,40 +1,48 @@
 """Shared fixtures for EDA validation tests.
 
-Loads raw CSVs once per session so all tests share the same dataframes.
+Loads raw CSVs once per session so all tests share the same dataframes. With
+ANALYTICS_SOCKET pointing at a running `python -m analytics.daemon serve`, the
+frames are fetched already parsed from the daemon instead.
 """
-import pandas as pd
+import os
+
 import pytest
-from pathlib import Path
 
-DATA_DIR = Path(__file__).parent.parent / "Case Study - Data"
+from analytics.data import exclude_flagged, load_claims, load_drugs, merge_drugs
+
+
+def _load(frame, loader):
+    socket_path = os.environ.get("ANALYTICS_SOCKET")
+    if socket_path:
+        from analytics.daemon import Client
+
+        try:
+            with Client(socket_path) as client:
+                return client.fetch(frame)
+        except OSError:
+            pass  # daemon not running — fall back to parsing
+    return loader()
 
 
 @pytest.fixture(scope="session")
 def claims_df():
     """Raw claims dataframe with parsed dates."""
-    df = pd.read_csv(DATA_DIR / "Claims_Export.csv", sep="~", encoding="utf-8-sig")
-    df["DATE"] = pd.to_datetime(df["DATE_FILLED"], format="%Y%m%d")
-    df["MONTH"] = df["DATE"].dt.month
-    return df
+    return _load("claims", load_claims)
 
 
 @pytest.fixture(scope="session")
 def drugs_df():
     """Raw drug_info dataframe."""
-    return pd.read_csv(DATA_DIR / "Drug_Info.csv", sep="~", encoding="utf-8-sig")
+    return _load("drugs", load_drugs)
 
 
 @pytest.fixture(scope="session")
 def real_claims_df(claims_df):
     """Claims excluding flagged NDCs (Kryptonite XR)."""
-    return claims_df[claims_df["NDC"] != 65862020190]
+    return exclude_flagged(claims_df)
 
 
 @pytest.fixture(scope="session")
 def merged_df(claims_df, drugs_df):
     """Claims joined to drug_info on NDC."""
-    return claims_df.merge(
-        drugs_df[["NDC", "DRUG_NAME", "LABEL_NAME", "MONY", "MANUFACTURER_NAME"]],
-        on="NDC",
-        how="left",
-    )
+    return _load("merged", lambda: merge_drugs(claims_df, drugs_df))
@@ -0,0 +1,67 @@
+"""
+Dataframe backends — every engine must return the pandas results.
+"""
+
+import pandas as pd
+import pytest
+
+from analytics.backends import BACKENDS, OPERATIONS, available_backends, benchmark
+
+
+@pytest.fixture(scope="module", params=["pandas", "duckdb"])
+def backend(request):
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb")
+    engine = BACKENDS[request.param]()
+    engine.load()
+    return engine
+
+
+@pytest.fixture(scope="module")
+def reference():
+    engine = BACKENDS["pandas"]()
+    engine.load()
+    return engine
+
+
+def test_join_coverage(backend):
+    row = backend.join_coverage().iloc[0]
+    assert row["unmatched_rows"] == 321
+    assert row["unmatched_ndcs"] == 30
+    assert row["matched_rows"] == 596_090 - 321
+
+
+def test_ks_august_filter(backend):
+    row = backend.filtered("state=KS&dateStart=2021-08-01&dateEnd=2021-08-31").iloc[0]
+    assert row["rows"] == 6_029
+    assert row["net_claims"] == -3_813
+
+
+def test_ks_august_full_reversal_groups(backend):
+    groups = backend.group_reversals("KS", 8)
+    full = groups[groups["rate"] == 100.0]
+    assert len(full) == 18
+    assert full["total"].sum() == 4_790
+
+
+def test_september_spike(backend):
+    monthly = backend.monthly_baselines("FORMULARY")
+    sep = monthly[monthly["MONTH"] == 9]
+    assert sep["pct_vs_baseline"].between(38, 45).all()
+
+
+@pytest.mark.parametrize("method,args", [op for op in OPERATIONS if op[0] != "load"])
+def test_matches_pandas(backend, reference, method, args):
+    if backend.name == "pandas":
+        pytest.skip("reference")
+    expected = getattr(reference, method)(*args)
+    result = getattr(backend, method)(*args)
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_benchmark_reports_every_operation():
+    timings = benchmark(available_backends(), repeat=1)
+    assert len(timings) == len(OPERATIONS) * len(available_backends())
+    assert all(t.matches for t in timings)
+    assert all(t.seconds > 0 for t in timings)
@@ -0,0 +1,64 @@
+"""Verify vectorized change-point detection finds the Sep spike and Nov dip."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.changepoints import cycle_fill_factor, detect
+
+STATES = ["CA", "IN", "PA", "KS", "MN"]
+
+
+@pytest.fixture(scope="session")
+def episodes(real_claims_df):
+    return detect(real_claims_df)
+
+
+def _episode(episodes, key, direction, month):
+    ep = episodes[(episodes["key"] == key) & (episodes["direction"] == direction)]
+    ep = ep[ep["onset"].between(f"2021-{month - 1:02d}-25", f"2021-{month:02d}-05")]
+    assert len(ep) == 1, f"{key}: no single {direction} starting around month {month}"
+    return ep.iloc[0]
+
+
+def _days_from(ts, date):
+    return abs((ts - pd.Timestamp(date)).days)
+
+
+@pytest.mark.parametrize("state", STATES)
+def test_november_dip_detected_per_state(episodes, state):
+    ep = _episode(episodes, state, "dip", 11)
+    assert _days_from(ep["onset"], "2021-11-01") <= 3
+    assert _days_from(ep["recovery"], "2021-12-01") <= 3
+    assert -65 <= ep["shift_pct"] <= -45, f"{state} Nov shift {ep['shift_pct']}%"
+
+
+@pytest.mark.parametrize("state", STATES)
+def test_september_spike_detected_per_state(episodes, state):
+    ep = _episode(episodes, state, "spike", 9)
+    assert _days_from(ep["onset"], "2021-09-01") <= 3
+    assert _days_from(ep["recovery"], "2021-10-01") <= 5
+    assert 30 <= ep["shift_pct"] <= 55, f"{state} Sep shift {ep['shift_pct']}%"
+
+
+@pytest.mark.parametrize("formulary", ["OPEN", "MANAGED", "HMF"])
+def test_november_dip_detected_per_formulary(episodes, formulary):
+    _episode(episodes, formulary, "dip", 11)
+
+
+def test_exact_onset_and_recovery_on_step_series():
+    """A clean 50% step down on days 100-129 is located exactly."""
+    days = pd.date_range("2021-01-01", "2021-12-31")
+    per_day = np.where((np.arange(len(days)) >= 100) & (np.arange(len(days)) < 130), 10, 20)
+    claims = pd.DataFrame({"DATE": np.repeat(days, per_day), "GROUP_ID": "G1"})
+    ep = detect(claims, dimensions=("GROUP_ID",))
+    assert len(ep) == 1
+    assert ep.loc[0, "onset"] == days[100]
+    assert ep.loc[0, "recovery"] == days[130]
+    assert ep.loc[0, "shift_pct"] == -50.0
+
+
+def test_cycle_fill_factor_uses_every_year():
+    days = pd.date_range("2021-01-01", "2022-12-31", freq="D")
+    counts = np.full((1, len(days)), 10)
+    counts[0, days.day == 1] = np.where(days[days.day == 1].year == 2021, 20, 40)
+    assert cycle_fill_factor(counts, days) == pytest.approx(3.0)
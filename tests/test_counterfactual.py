@@ -0,0 +1,68 @@
+"""
+Counterfactual exclusions — subtracted contributions match re-filtering the claims.
+"""
+
+import pandas as pd
+import pytest
+
+from analytics.counterfactual import breakdown, build, compare, excluded_cells, kpis
+from analytics.data import FLAGGED_NDCS
+
+
+@pytest.fixture(scope="module")
+def contrib(claims_df):
+    return build(claims_df)
+
+
+def _kpis(claims):
+    reversed_ = claims["NET_CLAIM_COUNT"] == -1
+    return {
+        "claims": len(claims),
+        "net_claims": int(claims["NET_CLAIM_COUNT"].sum()),
+        "reversal_rate": round(reversed_.mean() * 100, 2),
+        "unique_drugs": claims["NDC"].nunique(),
+    }
+
+
+def _ks_batch(claims):
+    aug = claims[(claims["PHARMACY_STATE"] == "KS") & (claims["MONTH"] == 8)]
+    rate = aug.groupby("GROUP_ID")["NET_CLAIM_COUNT"].apply(lambda s: (s == -1).mean())
+    return list(rate[rate == 1].index)
+
+
+def test_flagged_exclusion_matches_real_claims(contrib, claims_df, real_claims_df):
+    got = kpis(contrib, {"NDC": FLAGGED_NDCS})
+    assert {k: got[k] for k in _kpis(real_claims_df)} == _kpis(real_claims_df)
+    assert {k: kpis(contrib)[k] for k in _kpis(claims_df)} == _kpis(claims_df)
+
+
+def test_mixed_exclusion_matches_filtering(contrib, claims_df):
+    batch = _ks_batch(claims_df)
+    exclude = {"NDC": FLAGGED_NDCS, "GROUP_ID": batch, "PERIOD": "2021-11"}
+    kept = claims_df[~claims_df["NDC"].isin(FLAGGED_NDCS) & ~claims_df["GROUP_ID"].isin(batch)
+                     & (claims_df["MONTH"] != 11)]
+    got = kpis(contrib, exclude)
+    assert {k: got[k] for k in _kpis(kept)} == _kpis(kept)
+    states = breakdown(contrib, "PHARMACY_STATE", exclude).set_index("PHARMACY_STATE")
+    assert states["claims"].to_dict() == kept.groupby("PHARMACY_STATE").size().to_dict()
+    assert states["adjudicated"].to_dict() == kept.groupby("PHARMACY_STATE")["ADJUDICATED"].sum().to_dict()
+
+
+def test_compare_shows_the_may_drop(contrib, claims_df, real_claims_df):
+    table, months = compare(contrib, {"NDC": FLAGGED_NDCS})
+    assert table.loc["claims", "change"] == len(real_claims_df) - len(claims_df)
+    may = months.set_index("PERIOD").loc["2021-05"]
+    assert may["claims"] == (claims_df["MONTH"] == 5).sum()
+    assert may["claims_without"] == (real_claims_df["MONTH"] == 5).sum()
+
+
+def test_unknown_values_and_dimensions(contrib):
+    assert len(excluded_cells(contrib, {"GROUP_ID": ["no-such-group"], "NDC": []})) == 0
+    assert kpis(contrib, {"PERIOD": "1999-01"}) == kpis(contrib)
+    with pytest.raises(KeyError):
+        kpis(contrib, {"DRUG_NAME": ["KRYPTONITE XR"]})
+
+
+def test_entities_are_a_dimension(claims_df):
+    both = build(pd.concat([claims_df.assign(ENTITY_ID=1), claims_df.assign(ENTITY_ID=2)], ignore_index=True))
+    assert kpis(both, {"ENTITY_ID": 2}) == kpis(build(claims_df))
@@ -0,0 +1,118 @@
+"""
+Warm analytics daemon — frames and aggregates served over the Unix socket
+must match what the session fixtures load directly.
+"""
+
+import asyncio
+import shutil
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from analytics.daemon import Client, Daemon, decode_frame, encode_frame
+from analytics.data import CLAIMS_PATH, DRUGS_PATH
+
+
+def _start(daemon, path):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    future = asyncio.run_coroutine_threadsafe(daemon.serve(path), loop)
+    deadline = time.monotonic() + 120
+    while not path.exists():
+        if future.done():
+            future.result()
+        assert time.monotonic() < deadline, "daemon did not start"
+        time.sleep(0.05)
+    return loop, future
+
+
+def _stop(loop, future):
+    async def shutdown():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=10)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    path = tmp_path_factory.mktemp("daemon") / "analytics.sock"
+    loop, future = _start(Daemon(), path)
+    with Client(path) as c:
+        yield c
+    _stop(loop, future)
+
+
+class TestFrames:
+    def test_claims_frame_identical(self, client, claims_df):
+        pd.testing.assert_frame_equal(client.fetch("claims"), claims_df)
+
+    def test_drugs_frame_identical(self, client, drugs_df):
+        pd.testing.assert_frame_equal(client.fetch("drugs"), drugs_df)
+
+    def test_merged_frame_identical(self, client, merged_df):
+        pd.testing.assert_frame_equal(client.fetch("merged"), merged_df)
+
+    def test_roundtrip_with_nulls_and_categories(self):
+        df = pd.DataFrame({
+            "s": ["a", None, "b", "a"],
+            "c": pd.Categorical(["x", "y", None, "x"]),
+            "n": [1.5, float("nan"), 2.0, 3.0],
+        })
+        pd.testing.assert_frame_equal(decode_frame(*encode_frame(df)), df)
+
+
+class TestQueries:
+    def test_status(self, client):
+        status = client.status()
+        assert status["claims"] == 596_090
+        assert status["drugs"] == 246_955
+
+    def test_ks_august(self, client):
+        result = client.aggregate("state=KS&dateStart=2021-08-01&dateEnd=2021-08-31")
+        assert result["claims"].item() == 6_029
+        assert result["reversals"].item() == 3_813
+
+    def test_monthly_matches_pandas(self, client, real_claims_df):
+        result = client.aggregate(by=["MONTH"]).set_index("MONTH")
+        expected = real_claims_df.groupby("MONTH")["NET_CLAIM_COUNT"].agg(["size", "sum"])
+        assert result["claims"].tolist() == expected["size"].tolist()
+        assert result["net_claims"].tolist() == expected["sum"].tolist()
+
+    def test_distinct_manufacturers(self, client, merged_df):
+        expected = sorted(merged_df["MANUFACTURER_NAME"].dropna().unique())
+        assert client.distinct("manufacturer") == expected
+
+    def test_errors_reported(self, client):
+        with pytest.raises(ValueError, match="Unknown op"):
+            client._call(op="nope")
+        with pytest.raises(ValueError, match="Unknown metrics"):
+            client.aggregate(metrics=["bogus"])
+        assert client.status()["generation"] >= 1  # connection still usable
+
+
+def test_background_reload(tmp_path):
+    claims, drugs = tmp_path / "claims.csv", tmp_path / "drugs.csv"
+    shutil.copy(DRUGS_PATH, drugs)
+    with open(CLAIMS_PATH, "rb") as f:
+        lines = f.readlines()
+    claims.write_bytes(b"".join(lines[:1001]))
+
+    loop, future = _start(Daemon(claims, drugs, poll=0.05), tmp_path / "a.sock")
+    try:
+        with Client(tmp_path / "a.sock") as c:
+            assert c.status() == {**c.status(), "generation": 1, "claims": 1000}
+            claims.write_bytes(b"".join(lines[:501]))
+            deadline = time.monotonic() + 30
+            while c.status()["generation"] == 1:
+                assert time.monotonic() < deadline, "daemon did not reload"
+                time.sleep(0.05)
+            assert c.status()["claims"] == 500
+            assert len(c.fetch("claims")) == 500
+    finally:
+        _stop(loop, future)
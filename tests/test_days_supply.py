@@ -0,0 +1,53 @@
+"""
+Days-supply sketches — merged cells must reproduce the distribution of the filtered claims.
+"""
+
+import pandas as pd
+import pytest
+
+from analytics.days_supply import bins, build, histogram, merge, quantile, summary
+from analytics.filters import claims_mask, parse_filters
+
+
+@pytest.fixture(scope="module")
+def sketch(claims_df):
+    return build(claims_df)
+
+
+QUERIES = ["", "state=KS", "formulary=OPEN&state=CA", "dateStart=2021-09-01&dateEnd=2021-10-31",
+           "flagged=true&dateStart=2021-05-01&dateEnd=2021-05-31"]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_quantiles_match_filtered_claims(sketch, claims_df, query):
+    days = claims_df.loc[claims_mask(claims_df, parse_filters(query)), "DAYS_SUPPLY"]
+    hist = histogram(sketch, query)
+    assert hist["claims"].sum() == len(days)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert quantile(hist, q) == pytest.approx(days.quantile(q))
+
+
+def test_bins_match_route(sketch, claims_df):
+    rows = claims_df[claims_mask(claims_df, parse_filters("state=KS"))]
+    labels = pd.cut(rows["DAYS_SUPPLY"], [0, 7, 14, 30, 60, 90, float("inf")],
+                    labels=["7", "14", "30", "60", "90", "Other"])
+    want = rows.groupby(labels, observed=True)["NET_CLAIM_COUNT"].sum()
+    assert {b["bin"]: b["count"] for b in bins(histogram(sketch, "state=KS"))} == want.to_dict()
+
+
+def test_distribution_facts_from_sketch(sketch):
+    hist = histogram(sketch, "")
+    assert hist["claims"].nlargest(3).index.tolist() == [14, 7, 30]
+    assert summary(hist)["short_share"] > 70
+
+
+def test_merge_equals_single_build(claims_df, sketch):
+    half = len(claims_df) // 2
+    merged = merge(build(claims_df.iloc[:half]), build(claims_df.iloc[half:]))
+    pd.testing.assert_frame_equal(merged, sketch)
+
+
+def test_unanswerable_filters(sketch):
+    assert histogram(sketch, "mony=N") is None
+    assert histogram(sketch, "dateStart=2021-09-15") is None
+    assert histogram(sketch, "dateStart=2021-09-01&dateEnd=2021-09-15") is None
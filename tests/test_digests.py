@@ -0,0 +1,96 @@
+"""
+Chat-tool digests — every slice must equal the tools' aggregates over the filtered claims.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.data import merge_drugs
+from analytics.digests import DIMENSIONS, build, checksums, lookup, slice_key
+from analytics.filters import claims_mask, parse_filters
+
+
+@pytest.fixture(scope="module")
+def digest(claims_df, drugs_df):
+    return build(claims_df, drugs_df, pairs=[("formulary", "state")])[0]
+
+
+@pytest.fixture(scope="module")
+def merged(claims_df, drugs_df):
+    return merge_drugs(claims_df, drugs_df)
+
+
+def _reference_kpis(merged, query):
+    rows = merged[claims_mask(merged, parse_filters(query))]
+    reversed_ = int((rows["NET_CLAIM_COUNT"] == -1).sum())
+    return {
+        "totalClaims": len(rows),
+        "netClaims": int(rows["NET_CLAIM_COUNT"].sum()),
+        "reversalRate": round(reversed_ / len(rows) * 100, 2),
+        "uniqueDrugs": int(rows["NDC"].nunique()),
+    }
+
+
+@pytest.mark.parametrize("filters", [
+    {}, {"state": "KS"}, {"formulary": "HMF"}, {"mony": "N"}, {"formulary": "OPEN", "state": "MN"},
+])
+def test_kpis_match_filtered_claims(digest, merged, filters):
+    got = lookup(digest, "kpis", filters)
+    want = _reference_kpis(merged, slice_key(filters))
+    assert got["totalClaims"] == want["totalClaims"]
+    assert got["netClaims"] == want["netClaims"]
+    assert got["uniqueDrugs"] == want["uniqueDrugs"]
+    assert got["reversalRate"] == pytest.approx(want["reversalRate"], abs=0.01)
+
+
+def test_every_dimension_value_has_a_slice(digest, merged):
+    for param, column in DIMENSIONS.items():
+        values = merged.loc[claims_mask(merged, parse_filters("")), column].dropna().astype(str).unique()
+        missing = [v for v in values if slice_key({param: v}) not in digest["slices"]]
+        assert not missing, (param, missing[:5])
+
+
+def test_monthly_sums_to_kpis(digest):
+    for key in ("", "state=KS", "formulary=OPEN&state=CA"):
+        entry = digest["slices"][key]
+        assert sum(m["net"] for m in entry["monthly"]) == entry["kpis"]["netClaims"]
+        assert sum(m["incurred"] + m["reversed"] for m in entry["monthly"]) == entry["kpis"]["totalClaims"]
+
+
+def test_top_drugs_ranked_by_net_claims(digest, merged):
+    top = lookup(digest, "topDrugs", {"state": "KS"}, limit=5)
+    rows = merged[claims_mask(merged, parse_filters("state=KS"))]
+    want = rows.groupby("DRUG_NAME")["NET_CLAIM_COUNT"].sum().sort_values(ascending=False).head(5)
+    assert [d["netClaims"] for d in top] == want.tolist()
+
+
+def test_date_filters_only_answer_month_aligned_trends(digest):
+    months = lookup(digest, "monthly", {"state": "KS", "dateStart": "2021-08-01", "dateEnd": "2021-08-31"})
+    assert [m["month"] for m in months] == ["2021-08"]
+    assert lookup(digest, "monthly", {"state": "KS", "dateStart": "2021-08-15"}) is None
+    assert lookup(digest, "kpis", {"state": "KS", "dateStart": "2021-08-01"}) is None
+    assert lookup(digest, "kpis", {"groupId": "no-such-group"}) is None
+
+
+def test_rebuild_recomputes_only_changed_slices(claims_df, drugs_df, digest):
+    group = claims_df["GROUP_ID"].astype(str).iloc[0]
+    changed = claims_df[claims_df["GROUP_ID"].astype(str) != group]
+    pairs = [("formulary", "state")]
+    incremental, stats = build(changed, drugs_df, previous=digest, pairs=pairs)
+    full, _ = build(changed, drugs_df, pairs=pairs)
+    assert incremental["slices"] == full["slices"]
+    assert stats.removed == 1  # groupId=<group>
+    assert 0 < stats.recomputed < stats.slices
+
+
+def test_checksums_are_exact_and_order_independent():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**64, size=5000, dtype=np.uint64)
+    ids = pd.Series(np.where(np.arange(5000) % 3 == 0, "a", "b"))
+    df = pd.DataFrame({"ROW_HASH": hashes})
+    order = rng.permutation(5000)
+    got = checksums(df, ids)
+    assert got == checksums(df.iloc[order].reset_index(drop=True), ids.iloc[order].reset_index(drop=True))
+    want = sum(int(h) for h in hashes[ids.to_numpy() == "a"]) % 2**64
+    assert got["a"] == f"{want:016x}"
@@ -0,0 +1,55 @@
+"""Verify the dictionary-encoded drug dimension against the raw join."""
+import pytest
+
+from analytics.drug_dimension import MISSING, DrugDimension, encode_claims
+
+KRYPTONITE_NDC = 65862020190
+
+
+@pytest.fixture(scope="session")
+def dimension(drugs_df):
+    return DrugDimension.build(drugs_df)
+
+
+@pytest.fixture(scope="session")
+def encoded_df(claims_df, dimension):
+    return encode_claims(claims_df, dimension)
+
+
+def test_dimension_covers_drug_info(dimension):
+    assert len(dimension) == 246_955
+
+
+def test_pruned_to_referenced_ndcs(claims_df, dimension):
+    """Only the 5,610 matched claim NDCs survive pruning."""
+    assert len(dimension.pruned(claims_df["NDC"])) == 5_610
+
+
+def test_unmatched_claim_rows(encoded_df):
+    assert (encoded_df["DRUG_ROW"] == MISSING).sum() == 321
+
+
+def test_kryptonite_decodes(dimension):
+    row = dimension.rows([KRYPTONITE_NDC])
+    assert dimension.decode("drug", dimension.codes["drug"][row])[0] == "KRYPTONITE XR"
+    assert dimension.decode("manufacturer", dimension.codes["manufacturer"][row])[0] == "LEX LUTHER INC."
+
+
+def test_manufacturer_filter_matches_join(encoded_df, merged_df, dimension):
+    code = dimension.code("manufacturer", "LEX LUTHER INC.")
+    assert (encoded_df["MANUFACTURER_CODE"] == code).sum() == 49_567
+    assert (merged_df["MANUFACTURER_NAME"] == "LEX LUTHER INC.").sum() == 49_567
+
+
+def test_distinct_drugs_match_join(encoded_df, merged_df, dimension):
+    """Filter-dropdown lists from codes equal the sorted distinct joined names."""
+    assert dimension.distinct("drug", encoded_df["DRUG_CODE"]) == sorted(merged_df["DRUG_NAME"].dropna().unique())
+    assert dimension.distinct("manufacturer", encoded_df["MANUFACTURER_CODE"]) == sorted(
+        merged_df["MANUFACTURER_NAME"].dropna().unique()
+    )
+
+
+def test_pruned_round_trips(claims_df, dimension):
+    pruned = dimension.pruned(claims_df["NDC"])
+    full = dimension.to_frame().set_index("NDC").loc[pruned.ndc].reset_index()
+    assert pruned.to_frame().equals(full)
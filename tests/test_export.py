@@ -0,0 +1,55 @@
+"""Verify the streaming claim exporter and its parseFilters mirror."""
+import gzip
+import io
+from datetime import date
+
+from analytics.export import EXPORT_COLUMNS, export_extract
+from analytics.filters import Filters, parse_filters
+
+KS_AUGUST = "state=KS&dateStart=2021-08-01&dateEnd=2021-08-31&flagged=true"
+
+
+def test_parse_filters_matches_route_params():
+    f = parse_filters("entityId=2&state=KS&dateStart=20210801&dateEnd=2021-08-31&flagged=true")
+    assert f.entity_id == 2
+    assert f.state == "KS"
+    assert f.date_start == date(2021, 8, 1)
+    assert f.date_end == date(2021, 8, 31)
+    assert f.include_flagged_ndcs is True
+
+
+def test_parse_filters_invalid_falls_back_to_defaults():
+    assert parse_filters("state=XX&formulary=OPEN") == Filters()
+
+
+def test_parse_filters_limit_is_range_checked():
+    assert parse_filters("limit=50&state=KS").limit == 50
+    assert parse_filters("state=KS").limit == 20
+    for bad in ("0", "101", "2.5", "ten"):
+        assert parse_filters(f"limit={bad}&state=KS") == Filters()
+
+
+def test_parse_filters_impossible_date_falls_back_to_defaults():
+    assert parse_filters("dateStart=2021-02-30&state=KS") == Filters()
+
+
+def test_export_ks_august_rows(drugs_df):
+    out = io.BytesIO()
+    rows = export_extract(parse_filters(KS_AUGUST), out, drugs=drugs_df)
+    assert rows == 6_029
+    lines = out.getvalue().decode("utf-8").splitlines()
+    assert lines[0].split(",") == EXPORT_COLUMNS
+    assert len(lines) == 6_029 + 1
+
+
+def test_export_gzip_roundtrip(drugs_df):
+    plain, compressed = io.BytesIO(), io.BytesIO()
+    export_extract(parse_filters(KS_AUGUST), plain, drugs=drugs_df)
+    export_extract(parse_filters(KS_AUGUST), compressed, compress=True, drugs=drugs_df)
+    assert gzip.decompress(compressed.getvalue()) == plain.getvalue()
+
+
+def test_export_excludes_kryptonite_by_default(drugs_df):
+    out = io.BytesIO()
+    rows = export_extract(parse_filters("dateStart=2021-05-01&dateEnd=2021-05-31"), out, drugs=drugs_df)
+    assert rows == 5
@@ -0,0 +1,63 @@
+"""
+Rate homogeneity — per-cell rates and tests for adjudication and reversal rates.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.homogeneity import bh_adjust, chi2_sf, homogeneity, outliers, rate_table, wilson_interval
+
+DIMENSIONS = ("PHARMACY_STATE", "FORMULARY", "PERIOD", "GROUP_ID", ("PHARMACY_STATE", "PERIOD"))
+
+
+@pytest.fixture(scope="module")
+def table(real_claims_df):
+    return rate_table(real_claims_df, DIMENSIONS)
+
+
+def test_wilson_interval():
+    lo, hi = wilson_interval(np.array([5, 0]), np.array([10, 10]))
+    assert lo == pytest.approx([0.2366, 0.0], abs=1e-4)
+    assert hi == pytest.approx([0.7634, 0.2775], abs=1e-4)
+
+
+def test_chi2_sf_approximation():
+    assert chi2_sf(18.307, 10) == pytest.approx(0.05, abs=0.002)
+    assert chi2_sf(124.342, 100) == pytest.approx(0.05, abs=0.001)
+
+
+def test_bh_adjust():
+    p = np.array([0.01, 0.04, np.nan, 0.03, 0.5])
+    q = bh_adjust(p)
+    assert np.isnan(q[2])
+    assert q[[0, 3, 1, 4]] == pytest.approx([0.04, 0.0533, 0.0533, 0.5], abs=1e-4)
+
+
+def test_counts_match_groupby(table, real_claims_df):
+    states = table[(table["dimension"] == "PHARMACY_STATE") & (table["rate"] == "reversal")].set_index("value")
+    grouped = real_claims_df.groupby("PHARMACY_STATE")["NET_CLAIM_COUNT"]
+    assert states["claims"].to_dict() == grouped.size().to_dict()
+    assert states["events"].to_dict() == grouped.apply(lambda s: int((s == -1).sum())).to_dict()
+
+
+def test_formulary_rates_are_homogeneous(table):
+    tests = homogeneity(table).loc[(slice(None), "FORMULARY"), :]
+    assert (tests["p_value"] > 0.01).all()
+    assert (tests["spread_pp"] < 1).all()
+
+
+def test_ks_august_is_the_top_reversal_outlier(table):
+    found = outliers(table)
+    reversal = found[found["rate"] == "reversal"]
+    assert reversal.iloc[0][["dimension", "value"]].tolist() == ["PHARMACY_STATE+PERIOD", "KS|2021-08"]
+    assert (found.loc[found["rate"] == "adjudication", "dimension"] != "FORMULARY").all()
+
+
+def test_baselines_are_per_entity(real_claims_df):
+    single = rate_table(real_claims_df, ("PHARMACY_STATE",))
+    both = rate_table(pd.concat([real_claims_df.assign(ENTITY_ID=1), real_claims_df.assign(ENTITY_ID=2)]),
+                      ("PHARMACY_STATE",))
+    for entity in (1, 2):
+        part = both[both["ENTITY_ID"] == entity].drop(columns="ENTITY_ID").reset_index(drop=True)
+        pd.testing.assert_frame_equal(part, single)
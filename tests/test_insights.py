@@ -0,0 +1,123 @@
+"""
+Insight cards — the Python port must produce the TypeScript engine's cards, and the
+precomputed slices must carry the same response fields the routes return.
+"""
+
+import pytest
+
+from analytics.insights import abbreviate_number, build_cache, build_cube, format_percent, generate_insights, slice_data
+
+KPIS = {"totalClaims": 55000, "netClaims": 50000, "reversalRate": 10.8, "uniqueDrugs": 1200}
+
+STATES = [
+    {"state": "CA", "netClaims": 15000, "totalClaims": 16800, "reversalRate": 10.0, "groupCount": 40},
+    {"state": "IN", "netClaims": 12000, "totalClaims": 13400, "reversalRate": 10.0, "groupCount": 35},
+    {"state": "KS", "netClaims": 8000, "totalClaims": 8900, "reversalRate": 10.0, "groupCount": 30},
+    {"state": "MN", "netClaims": 9000, "totalClaims": 10000, "reversalRate": 10.0, "groupCount": 44},
+    {"state": "PA", "netClaims": 6000, "totalClaims": 6700, "reversalRate": 10.2, "groupCount": 40},
+]
+
+# Same fixtures as src/lib/__tests__/generate-insights.test.ts
+OVERVIEW = {
+    "kpis": KPIS,
+    "unfilteredKpis": KPIS,
+    "monthly": [{"month": f"2021-{m:02d}", "incurred": inc, "reversed": inc // 10}
+                for m, inc in enumerate([5000, 4800, 5100, 4900, 3, 5000, 5050, 4700, 7100, 5200, 2300, 5000], 1)],
+    "formulary": [
+        {"type": "OPEN", "netClaims": 25000, "reversalRate": 10.8},
+        {"type": "MANAGED", "netClaims": 18000, "reversalRate": 10.7},
+        {"type": "HMF", "netClaims": 7000, "reversalRate": 10.7},
+    ],
+    "states": STATES,
+    "allStates": STATES,
+    "adjudication": {"adjudicated": 12500, "notAdjudicated": 37500, "rate": 25.0},
+}
+
+CLAIMS = {
+    "kpis": KPIS,
+    "unfilteredKpis": KPIS,
+    "monthly": OVERVIEW["monthly"],
+    "drugs": [
+        {"drugName": "ATORVASTATIN", "labelName": "Atorvastatin 40mg", "ndc": "111", "netClaims": 10000,
+         "reversalRate": 10.5, "formulary": "OPEN", "topState": "CA"},
+        {"drugName": "PANTOPRAZOLE", "labelName": "Pantoprazole 40mg", "ndc": "222", "netClaims": 9000,
+         "reversalRate": 9.8, "formulary": "MANAGED", "topState": "IN"},
+    ],
+    "daysSupply": [{"bin": "7", "count": 7300}, {"bin": "14", "count": 10400}, {"bin": "30", "count": 3600},
+                   {"bin": "60", "count": 2400}, {"bin": "90", "count": 300}],
+    "mony": [{"type": "Y", "netClaims": 42000}, {"type": "N", "netClaims": 6800},
+             {"type": "O", "netClaims": 750}, {"type": "M", "netClaims": 450}],
+    "topGroups": [{"groupId": "6P6002", "netClaims": 17000}],
+    "topManufacturers": [{"manufacturer": "AUROBINDO", "netClaims": 43000}],
+}
+
+
+def _card(cards, id_):
+    return next(c for c in cards if c["id"] == id_)
+
+
+def test_formatters_match_typescript():
+    assert format_percent(10.25) == "10.3%"
+    assert abbreviate_number(531988) == "532K"
+
+
+def test_unfiltered_overview():
+    cards = generate_insights({}, OVERVIEW)
+    assert [c["id"] for c in cards] == ["portfolio-summary", "distribution-channel", "ltc-pattern"]
+    body = _card(cards, "portfolio-summary")["body"]
+    assert "5 states" in body and "3 formulary types" in body
+
+
+def test_state_filters():
+    ks = generate_insights({"state": "KS"}, OVERVIEW)
+    assert [c["id"] for c in ks[:2]] == ["ltc-pattern", "state-ks-warning"]
+    assert "18 Kansas groups" in ks[1]["body"]
+    rank = _card(generate_insights({"state": "CA"}, OVERVIEW), "state-rank")
+    assert "California" in rank["title"] and "1st" in rank["title"]
+    assert "30.0%" in rank["body"]
+    assert "4th" in _card(generate_insights({"state": "KS"}, OVERVIEW, max_cards=5), "state-rank")["title"]
+
+
+def test_month_and_formulary_filters():
+    sep = _card(generate_insights({"dateStart": "2021-09-01"}, OVERVIEW), "month-sep")
+    assert sep["severity"] == "warning" and "September Surge" in sep["title"]
+    f = _card(generate_insights({"formulary": "OPEN"}, OVERVIEW), "formulary-active")
+    assert "OPEN formulary" in f["body"] and "25,000" in f["body"]
+
+
+def test_explorer_cards():
+    cards = generate_insights({}, CLAIMS, "explorer")
+    assert [c["id"] for c in cards] == ["exp-generic-mix", "exp-supply-cycles", "exp-top-drug-profile"]
+    assert "86%" in cards[0]["body"]
+    assert "74%" in cards[1]["body"]
+    group = _card(generate_insights({"groupId": "6P6002"}, CLAIMS, "explorer"), "exp-group-detail")
+    assert group["severity"] == "info" and "Group 6P6002" in group["body"]
+
+
+def test_max_cards():
+    assert [c["id"] for c in generate_insights({}, OVERVIEW, max_cards=1)] == ["portfolio-summary"]
+
+
+@pytest.fixture(scope="module")
+def cube(claims_df, drugs_df):
+    return build_cube(claims_df, drugs_df)
+
+
+def test_slices_carry_route_totals(cube):
+    unfiltered = slice_data(cube, ())[""][1]
+    states = slice_data(cube, ("state",))
+    for filters, data in states.values():
+        # allStates ignores the state filter, so every state slice sees the full breakdown
+        assert sum(s["netClaims"] for s in data["allStates"]) == unfiltered["kpis"]["netClaims"]
+        own = next(s for s in data["allStates"] if s["state"] == filters["state"])
+        assert own["netClaims"] == data["kpis"]["netClaims"]
+    assert sum(d["count"] for d in unfiltered["daysSupply"]) == unfiltered["kpis"]["netClaims"]
+
+
+def test_cache_covers_every_slice(claims_df, drugs_df):
+    cache = build_cache(claims_df, drugs_df, combinations=[(), ("state",), ("state", "month")])
+    overview, explorer = cache["cards"]["overview"], cache["cards"]["explorer"]
+    assert overview.keys() == explorer.keys()
+    assert [c["id"] for c in overview[""]][0] == "portfolio-summary"
+    assert any(c["id"] == "state-ks-warning" for c in overview["state=KS"])
+    assert any(c["id"] == "month-sep" for c in overview["dateEnd=2021-09-30&dateStart=2021-09-01&state=CA"])
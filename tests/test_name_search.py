@@ -0,0 +1,45 @@
+"""Verify the type-ahead name index over the drug catalog."""
+import pytest
+
+from analytics.drug_dimension import DrugDimension
+from analytics.name_search import NameIndex, build
+
+
+@pytest.fixture(scope="session")
+def name_index(tmp_path_factory, claims_df, drugs_df):
+    path = tmp_path_factory.mktemp("name-index")
+    build(DrugDimension.build(drugs_df), {1: claims_df}, path)
+    return NameIndex.open(path)
+
+
+def test_kryptonite_found_by_substring(name_index):
+    matches = name_index.search("ptonite", kinds=("drug",))
+    assert [(m.name, m.volume) for m in matches] == [("KRYPTONITE XR", 49_567)]
+
+
+def test_label_search_is_case_insensitive(name_index):
+    matches = name_index.search("kingslayer", kinds=("label",))
+    assert len(matches) == 1
+    assert matches[0].volume == 49_567
+
+
+def test_manufacturer_prefix(name_index):
+    matches = name_index.search("LEX L", kinds=("manufacturer",), prefix=True)
+    assert matches[0].name == "LEX LUTHER INC."
+
+
+def test_ranked_by_volume(name_index):
+    matches = name_index.search("a", kinds=("drug",), limit=20)
+    volumes = [m.volume for m in matches]
+    assert volumes == sorted(volumes, reverse=True)
+    assert all(m.name.upper().startswith("A") for m in matches)
+
+
+def test_covers_full_catalog(name_index, drugs_df):
+    """Every distinct drug, label and manufacturer name is indexed, not only claimed ones."""
+    expected = sum(drugs_df[c].nunique() for c in ["DRUG_NAME", "LABEL_NAME", "MANUFACTURER_NAME"])
+    assert len(name_index) == expected
+
+
+def test_no_match(name_index):
+    assert name_index.search("zzzqqq") == []
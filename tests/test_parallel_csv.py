@@ -0,0 +1,60 @@
+"""
+Byte-range parallel parser — must reproduce pd.read_csv exactly.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.data import CLAIMS_PATH, DRUGS_PATH, load_claims
+from analytics.parallel_csv import (
+    BOM, CLAIMS_SCHEMA, DRUGS_SCHEMA, byte_ranges, read_header, read_tilde,
+)
+
+SMALL_RANGE = 256 * 1024  # forces many ranges on the real extracts
+
+
+class TestRanges:
+    def test_ranges_are_newline_aligned_and_contiguous(self):
+        names, start = read_header(CLAIMS_PATH)
+        ranges = byte_ranges(CLAIMS_PATH, start, SMALL_RANGE)
+        assert len(ranges) > 4
+        assert ranges[0][0] == start
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+        with open(CLAIMS_PATH, "rb") as f:
+            for _, end in ranges[:-1]:
+                f.seek(end - 1)
+                assert f.read(1) == b"\n"
+
+    def test_bom_stripped_from_header(self):
+        with open(CLAIMS_PATH, "rb") as f:
+            assert f.read(3) == BOM
+        names, _ = read_header(CLAIMS_PATH)
+        assert names == list(CLAIMS_SCHEMA)
+
+
+class TestEquivalence:
+    def test_claims_match_read_csv(self, claims_df):
+        df = read_tilde(str(CLAIMS_PATH), CLAIMS_SCHEMA, workers=4, range_bytes=SMALL_RANGE)
+        expected = claims_df.drop(columns=["DATE", "MONTH", "PERIOD", "DAY"])
+        pd.testing.assert_frame_equal(df, expected)
+
+    def test_drugs_match_read_csv(self, drugs_df):
+        df = read_tilde(str(DRUGS_PATH), DRUGS_SCHEMA, workers=4, range_bytes=SMALL_RANGE)
+        pd.testing.assert_frame_equal(df, drugs_df)
+
+    def test_category_strings(self, claims_df):
+        df = read_tilde(str(CLAIMS_PATH), CLAIMS_SCHEMA, workers=2, strings="category")
+        assert isinstance(df["GROUP_ID"].dtype, pd.CategoricalDtype)
+        assert df["GROUP_ID"].nunique() == 189
+        assert np.array_equal(df["GROUP_ID"].astype(str).to_numpy(), claims_df["GROUP_ID"].to_numpy())
+
+    def test_load_claims_parallel(self, claims_df):
+        pd.testing.assert_frame_equal(load_claims(workers=2), claims_df)
+
+
+def test_missing_schema_column(tmp_path):
+    path = tmp_path / "extra.csv"
+    path.write_bytes(BOM + b"NDC~EXTRA\n1~a\n")
+    with pytest.raises(ValueError, match="EXTRA"):
+        read_tilde(str(path), DRUGS_SCHEMA)
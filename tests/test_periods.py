@@ -0,0 +1,72 @@
+"""
+Integer period encoding and period-aware baselines.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.periods import (
+    ANOMALOUS_PERIODS, anomalies, calendar_month, encode, month_keys, normal_baseline, parse_period,
+    period, period_labels, period_matrix, seasonal_baseline, trailing_baseline, year_of,
+)
+
+
+def _two_years(claims):
+    """The extract plus a copy shifted one year later."""
+    both = pd.concat([claims, claims.assign(DATE=claims["DATE"] + pd.DateOffset(years=1))], ignore_index=True)
+    both["PERIOD"], both["DAY"] = encode(both["DATE"])
+    return both
+
+
+def test_encoding_round_trips():
+    p = period(2021, 9)
+    assert p == parse_period("2021-09") == parse_period("2021-09-15")
+    assert (year_of(p), calendar_month(p)) == (2021, 9)
+    assert period_labels([p, p + 4]).tolist() == ["2021-09", "2022-01"]
+    periods, days = encode(pd.Series(pd.to_datetime(["1970-01-01", "2021-09-30"])))
+    assert periods.tolist() == [0, p]
+    assert days.tolist() == [0, (pd.Timestamp("2021-09-30") - pd.Timestamp("1970-01-01")).days]
+
+
+def test_loaded_columns_match_dates(claims_df):
+    assert (calendar_month(claims_df["PERIOD"]) == claims_df["MONTH"]).all()
+    assert claims_df["PERIOD"].dtype == np.int32 and claims_df["DAY"].dtype == np.int32
+    assert month_keys(claims_df).equals(claims_df["DATE"].dt.strftime("%Y-%m").astype(object))
+
+
+def test_normal_baseline_matches_nine_month_average(real_claims_df):
+    keys, periods, matrix = period_matrix(real_claims_df)
+    normal = ~real_claims_df["PERIOD"].isin(ANOMALOUS_PERIODS)
+    want = normal.sum() / 9
+    assert normal_baseline(matrix, periods)[0] == pytest.approx(np.full(12, want))
+
+
+def test_matrix_spans_years_contiguously(real_claims_df):
+    keys, periods, matrix = period_matrix(_two_years(real_claims_df), "PHARMACY_STATE")
+    assert len(periods) == 24 and np.all(np.diff(periods) == 1)
+    assert matrix.sum() == 2 * len(real_claims_df)
+    assert np.array_equal(matrix[:, :12], matrix[:, 12:])
+
+
+def test_seasonal_baseline_uses_other_years(real_claims_df):
+    keys, periods, matrix = period_matrix(_two_years(real_claims_df))
+    seasonal = seasonal_baseline(matrix, periods, exclude=())
+    assert np.allclose(seasonal, np.concatenate([matrix[:, 12:], matrix[:, :12]], axis=1))
+    # each year's normal baseline only sees its own year; 2022 has no excluded months
+    normal = normal_baseline(matrix, periods)
+    assert np.allclose(normal[0, 12:], matrix[0, 12:].mean())
+
+
+def test_trailing_baseline():
+    periods = np.arange(period(2021, 1), period(2021, 7))
+    matrix = np.array([[10.0, 20, 30, 1000, 40, 50]])
+    trailing = trailing_baseline(matrix, periods, window=2, exclude=[period(2021, 4)])
+    assert np.isnan(trailing[0, 0])
+    assert trailing[0, 1:].tolist() == [10, 15, 25, 30, 40]
+
+
+def test_anomalies_flag_september_and_november(real_claims_df):
+    keys, periods, matrix = period_matrix(real_claims_df)
+    found = anomalies(keys, periods, matrix, normal_baseline(matrix, periods), threshold_pct=25)
+    assert {"2021-09", "2021-11"} <= set(found["period"])
@@ -0,0 +1,60 @@
+"""
+Monthly-profile index — nearest neighbours and atypical profiles.
+"""
+
+import numpy as np
+import pytest
+
+from analytics.profiles import atypical, build, similar
+
+
+@pytest.fixture(scope="module")
+def groups(real_claims_df):
+    claims = real_claims_df.assign(GROUP_ID=real_claims_df["GROUP_ID"].astype(str))
+    return build(claims, "GROUP_ID")
+
+
+@pytest.fixture(scope="module")
+def ndcs(claims_df):
+    return build(claims_df, "NDC")
+
+
+def test_shares_are_normalized(groups, real_claims_df):
+    assert np.allclose(groups.volume.sum(axis=1), 1, atol=1e-5)
+    has_reversals = groups.reversals > 0
+    assert np.allclose(groups.reversal[has_reversals].sum(axis=1), 1, atol=1e-5)
+    assert groups.claims.sum() == len(real_claims_df)
+
+
+def test_similar_matches_brute_force(groups):
+    queries = list(groups.keys[:5])
+    got = similar(groups, queries, k=7)
+    for q in queries:
+        i = groups.keys.get_loc(q)
+        scores = groups.matrix @ groups.matrix[i]
+        scores[i] = -np.inf
+        want = groups.keys[np.argsort(-scores, kind="stable")[:7]]
+        assert set(got.loc[got["query"] == q, "GROUP_ID"]) == set(want)
+        assert q not in set(got.loc[got["query"] == q, "GROUP_ID"])
+    assert got.groupby("query")["similarity"].apply(lambda s: s.is_monotonic_decreasing).all()
+
+
+def test_ks_batch_groups_are_each_others_neighbours(groups, real_claims_df):
+    """Groups with 100% August reversals share the Jul/Aug/Sep shape."""
+    aug = real_claims_df[(real_claims_df["PHARMACY_STATE"] == "KS") & (real_claims_df["MONTH"] == 8)]
+    rate = aug.groupby(aug["GROUP_ID"].astype(str))["NET_CLAIM_COUNT"].apply(lambda s: (s == -1).mean())
+    batch = sorted(rate[rate == 1].index)
+    assert len(batch) >= 2
+    found = similar(groups, [batch[0]], k=len(batch) - 1)
+    assert sorted(found["GROUP_ID"]) == batch[1:]
+
+
+def test_kryptonite_is_the_most_atypical_ndc(ndcs):
+    top = atypical(ndcs, k=5, min_claims=50)
+    assert top.iloc[0]["NDC"] == 65862020190
+    assert top.iloc[0]["peak_month"] == "2021-05"
+
+
+def test_unknown_key(groups):
+    with pytest.raises(KeyError):
+        similar(groups, ["no-such-group"])
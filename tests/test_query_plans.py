@@ -0,0 +1,59 @@
+"""
+Query-plan harness — design DDL, plan parsing, and (with BENCH_DATABASE_URL) a live run.
+"""
+
+import asyncio
+import os
+import re
+
+import pytest
+
+from analytics.query_plans import DESIGNS, QUERIES, SCHEMA_INDEXES, Run, benchmark, design_ddl, plan_summary, summarize
+
+
+def test_queries_use_entity_and_flagged_placeholders():
+    for name, sql in QUERIES.items():
+        assert "c.entity_id = $1" in sql, name
+        assert "c.ndc NOT IN ($2)" in sql, name
+        assert max(int(n) for n in re.findall(r"\$(\d+)", sql)) == 2, name
+
+
+def test_schema_design_mirrors_schema_ts():
+    ddl = design_ddl(DESIGNS["schema"], "qp_schema", ("2021-01-01", "2021-12-31"))
+    assert ddl[0].startswith("CREATE TABLE qp_schema.claims (id bigserial PRIMARY KEY")
+    assert len(ddl) == 1 + len(SCHEMA_INDEXES)
+
+
+def test_partitioned_design_has_one_partition_per_month():
+    ddl = design_ddl(DESIGNS["partitioned"], "qp_partitioned", ("2021-01-01", "2021-12-31"))
+    partitions = [s for s in ddl if "PARTITION OF" in s]
+    assert len(partitions) == 13  # 12 months + default
+    assert "FOR VALUES FROM ('2021-12-01') TO ('2022-01-01')" in partitions[11]
+
+
+def test_plan_summary_walks_the_tree():
+    plan = {"Node Type": "Aggregate", "Plans": [
+        {"Node Type": "Append", "Plans": [
+            {"Node Type": "Index Only Scan", "Index Name": "claims_2021_01_entity_id_date_filled_idx"},
+            {"Node Type": "Index Only Scan", "Index Name": "claims_2021_02_entity_id_date_filled_idx"},
+            {"Node Type": "Bitmap Index Scan", "Index Name": "drug_info_pkey"},
+        ]},
+    ]}
+    nodes, indexes = plan_summary(plan)
+    assert nodes.count("Index Only Scan") == 2
+    assert indexes == ["claims_*_entity_id_date_filled_idx", "drug_info_pkey"]
+
+
+def test_summarize_percentiles():
+    runs = [Run(1, "schema", "overview.kpis", ms, 10, 0, "Seq Scan", "") for ms in range(1, 101)]
+    row = summarize(runs).loc[(1, "overview.kpis", "schema")]
+    assert row["p50_ms"] == pytest.approx(50.5)
+    assert row["p99_ms"] == pytest.approx(99.01)
+
+
+@pytest.mark.skipif(not os.environ.get("BENCH_DATABASE_URL"), reason="BENCH_DATABASE_URL not set")
+def test_live_run_covers_every_design_and_query(claims_df, drugs_df):
+    pytest.importorskip("asyncpg")
+    results = asyncio.run(benchmark(os.environ["BENCH_DATABASE_URL"], claims_df, drugs_df, runs=1))
+    assert {(r.design, r.query) for r in results} == {(d, q) for d in DESIGNS for q in QUERIES}
+    assert all(r.ms > 0 for r in results)
@@ -0,0 +1,84 @@
+"""
+Refill cadence and proportion of days covered.
+"""
+
+import numpy as np
+import pandas as pd
+
+from analytics.refills import adherence, fill_events, paid_fills, refill_intervals, summarize
+
+
+def _fills(rows, group="G001", ndc=1):
+    """Paid fills from (date, days_supply) tuples in one series."""
+    df = pd.DataFrame(rows, columns=["DATE", "DAYS_SUPPLY"])
+    df["DATE"] = pd.to_datetime(df["DATE"])
+    return df.assign(GROUP_ID=group, NDC=ndc, NET_CLAIM_COUNT=1, PHARMACY_STATE="KS")
+
+
+def _pdc_reference(fills, end):
+    """Covered days from a per-series day set."""
+    out = {}
+    for (group, ndc), part in fills.groupby(["GROUP_ID", "NDC"]):
+        days = set()
+        for date, supply in zip(part["DATE"], part["DAYS_SUPPLY"]):
+            days.update(pd.date_range(date, periods=supply))
+        out[(group, ndc)] = sum(d <= end for d in days)
+    return out
+
+
+def test_statuses():
+    fills = _fills([("2021-01-01", 30), ("2021-01-20", 30), ("2021-02-21", 30), ("2021-04-10", 30)])
+    intervals = refill_intervals(fills)
+    assert intervals["gap"].tolist() == [19, 32, 48]
+    assert intervals["slack"].tolist() == [-11, 2, 18]
+    assert intervals["status"].tolist() == ["early", "on_time", "lapsed"]
+
+
+def test_series_do_not_leak():
+    fills = pd.concat([_fills([("2021-01-01", 30)], ndc=1), _fills([("2021-01-05", 30)], ndc=2)])
+    assert refill_intervals(fills).empty
+
+
+def test_same_day_fills_collapse():
+    fills = _fills([("2021-01-01", 7), ("2021-01-01", 30), ("2021-01-29", 30)])
+    events = fill_events(fills)
+    assert events["FILLS"].tolist() == [2, 1]
+    assert events["DAYS_SUPPLY"].tolist() == [30, 30]
+    assert refill_intervals(fills)["status"].tolist() == ["on_time"]
+
+
+def test_reversed_fills_are_not_paid():
+    fills = _fills([("2021-01-01", 30), ("2021-01-01", 30), ("2021-01-31", 30)])
+    fills.loc[1, "NET_CLAIM_COUNT"] = -1
+    assert paid_fills(fills).index.tolist() == [2]
+
+
+def test_pdc_overlap_is_not_carried_forward():
+    fills = _fills([("2021-01-01", 30), ("2021-01-11", 30), ("2021-03-01", 10)])
+    row = adherence(fills, end="2021-03-31").iloc[0]
+    assert row["days"] == 90
+    assert row["covered"] == 40 + 10
+    assert row["fills"] == 3
+
+
+def test_pdc_matches_reference():
+    rng = np.random.default_rng(3)
+    n = 400
+    start = pd.Timestamp("2021-01-01")
+    fills = pd.DataFrame({
+        "GROUP_ID": rng.choice(["G1", "G2", "G3"], n),
+        "NDC": rng.integers(0, 8, n),
+        "DATE": start + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+        "DAYS_SUPPLY": rng.choice([1, 7, 14, 30, 90], n),
+    })
+    end = pd.Timestamp("2021-12-31")
+    got = adherence(fills, end=end).set_index(["GROUP_ID", "NDC"])["covered"].to_dict()
+    assert got == _pdc_reference(fills, end)
+
+
+def test_summary_rates(claims_df):
+    intervals = refill_intervals(paid_fills(claims_df))
+    summary = summarize(intervals)
+    assert summary["refills"].sum() == len(intervals)
+    rates = summary[["early_rate", "on_time_rate", "lapsed_rate"]].sum(axis=1)
+    assert np.allclose(rates, 100, atol=0.2)
@@ -0,0 +1,95 @@
+"""
+Validation result cache — keys change only with the data, the test's own code, or its imports.
+"""
+
+import ast
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from analytics.result_cache import analytics_imports, file_digest, item_code
+
+ROOT = Path(__file__).parent.parent
+
+MODULE = '''
+import pytest
+from analytics.filters import parse_filters
+from analytics import data
+
+LIMIT = 3
+
+
+def helper():
+    return LIMIT
+
+
+def test_one():
+    assert helper() == 3
+
+
+def test_two():
+    assert parse_filters("state=KS").state == "KS"
+
+
+class TestGroup:
+    def test_a(self):
+        assert True
+
+    def test_b(self):
+        assert True
+'''
+
+
+def test_item_code_drops_other_tests_only():
+    tree = ast.parse(MODULE)
+    one = item_code(tree, "test_one")
+    assert "test_two" not in one and "TestGroup" not in one and "helper" in one
+    assert item_code(ast.parse(MODULE.replace("assert True", "assert 1")), "test_one") == one
+    edited = ast.parse(MODULE.replace("== 3", "== 4"))
+    assert item_code(edited, "test_one") != one
+    assert item_code(edited, "test_two") == item_code(tree, "test_two")
+    assert item_code(ast.parse(MODULE.replace("LIMIT = 3", "LIMIT = 4")), "test_two") != item_code(tree, "test_two")
+    a = item_code(tree, "test_a", "TestGroup")
+    assert "test_b" not in a and "test_a" in a
+
+
+def test_analytics_imports():
+    assert analytics_imports(ast.parse(MODULE)) == {"filters", "data"}
+
+
+def test_file_digest_is_memoized(tmp_path):
+    path = tmp_path / "extract.csv"
+    path.write_text("a~b\n1~2\n")
+    memo = {}
+    digest = file_digest(path, memo)
+    assert memo[str(path.resolve())][2] == digest
+    memo[str(path.resolve())][2] = "memoized"
+    assert file_digest(path, memo) == "memoized"
+    path.write_text("a~b\n1~23\n")
+    assert file_digest(path, memo) not in (digest, "memoized")
+
+
+def _run(directory, cache):
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    env.pop("ANALYTICS_SOCKET", None)
+    out = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "analytics.result_cache", "--result-cache",
+         "--result-cache-path", str(cache), "-p", "no:cacheprovider", "--rootdir", str(directory), str(directory)],
+        capture_output=True, text=True, cwd=directory, env=env,
+    ).stdout
+    return next(line for line in out.splitlines() if line.startswith("result cache:"))
+
+
+def test_reuses_only_unchanged_passing_tests(tmp_path):
+    tests = tmp_path / "checks"
+    tests.mkdir()
+    module = tests / "test_checks.py"
+    module.write_text(MODULE + "\n\ndef test_fails():\n    assert False\n")
+    cache = tmp_path / "results.json"
+    assert _run(tests, cache).startswith("result cache: 0 reused, 4 recorded")
+    assert _run(tests, cache).startswith("result cache: 4 reused, 0 recorded")
+    module.write_text(module.read_text().replace("== 3", "== 3  # same check"))
+    assert _run(tests, cache).startswith("result cache: 4 reused, 0 recorded")
+    module.write_text(module.read_text().replace('"KS"', '"KS" or True'))
+    assert _run(tests, cache).startswith("result cache: 3 reused, 1 recorded")
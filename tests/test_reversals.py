@@ -0,0 +1,118 @@
+"""
+Reversal -> original / rebill matching.
+"""
+
+import numpy as np
+import pandas as pd
+
+from analytics.reversals import UNMATCHED, bracket_pairs, lag_histogram, match_reversals, summarize
+
+
+def _claims(rows):
+    """Frame from (date, net_claim_count[, ndc]) tuples in one group/state."""
+    df = pd.DataFrame(rows, columns=["DATE", "NET_CLAIM_COUNT", "NDC"][:len(rows[0])])
+    if "NDC" not in df:
+        df["NDC"] = 1
+    df["DATE"] = pd.to_datetime(df["DATE"])
+    return df.assign(GROUP_ID="400127", DAYS_SUPPLY=30, PHARMACY_STATE="KS")
+
+
+def _stack_reference(key, order_key, is_open):
+    """Straightforward per-key stack simulation."""
+    partner = np.full(len(key), UNMATCHED)
+    stacks = {}
+    for i in np.lexsort((order_key, key)):
+        stack = stacks.setdefault(key[i], [])
+        if is_open[i]:
+            stack.append(i)
+        elif stack:
+            partner[i] = stack.pop()
+    return partner
+
+
+class TestBracketPairs:
+    def test_matches_stack_reference(self):
+        rng = np.random.default_rng(7)
+        for _ in range(20):
+            n = rng.integers(1, 400)
+            key = rng.integers(0, 12, n)
+            order_key = rng.permutation(n)
+            is_open = rng.random(n) < rng.uniform(0.2, 0.8)
+            assert np.array_equal(bracket_pairs(key, order_key, is_open),
+                                  _stack_reference(key, order_key, is_open))
+
+    def test_empty(self):
+        empty = np.array([], dtype=np.int64)
+        assert len(bracket_pairs(empty, empty, empty.astype(bool))) == 0
+
+
+class TestMatchReversals:
+    def test_fill_reverse_rebill(self):
+        claims = _claims([("2021-07-10", 1), ("2021-08-05", -1), ("2021-09-02", 1)])
+        m = match_reversals(claims).iloc[0]
+        assert (m["original"], m["original_lag"]) == (0, 26)
+        assert (m["rebill"], m["rebill_lag"]) == (2, 28)
+
+    def test_most_recent_original_wins(self):
+        claims = _claims([("2021-06-01", 1), ("2021-07-01", 1), ("2021-07-20", -1)])
+        assert match_reversals(claims)["original"].tolist() == [1]
+
+    def test_one_to_one(self):
+        claims = _claims([("2021-07-01", 1), ("2021-08-01", -1), ("2021-08-02", -1), ("2021-09-01", 1)])
+        m = match_reversals(claims)
+        assert m["original"].tolist() == [0, UNMATCHED]
+        assert m["rebill"].tolist() == [UNMATCHED, 3]
+
+    def test_same_day_fill_is_original_not_rebill(self):
+        claims = _claims([("2021-08-01", 1), ("2021-08-01", -1)])
+        m = match_reversals(claims).iloc[0]
+        assert (m["original"], m["original_lag"]) == (0, 0)
+        assert m["rebill"] == UNMATCHED
+
+    def test_key_must_match(self):
+        claims = _claims([("2021-07-01", 1, 111), ("2021-08-01", -1, 222), ("2021-09-01", 1, 111)])
+        m = match_reversals(claims).iloc[0]
+        assert m["original"] == UNMATCHED and m["rebill"] == UNMATCHED
+
+    def test_windows(self):
+        claims = _claims([("2021-01-01", 1), ("2021-08-01", -1), ("2021-12-31", 1)])
+        m = match_reversals(claims, original_days=90, rebill_days=90).iloc[0]
+        assert m["original"] == UNMATCHED and np.isnan(m["original_lag"])
+        assert m["rebill"] == UNMATCHED
+        m = match_reversals(claims, original_days=365, rebill_days=365).iloc[0]
+        assert (m["original"], m["rebill"]) == (0, 2)
+
+    def test_index_labels_returned(self):
+        claims = _claims([("2021-07-10", 1), ("2021-08-05", -1)]).set_axis([500, 900])
+        m = match_reversals(claims).iloc[0]
+        assert (m["reversal"], m["original"]) == (900, 500)
+
+    def test_summary_and_histogram(self):
+        claims = _claims([("2021-07-10", 1), ("2021-08-05", -1), ("2021-09-02", 1), ("2021-08-06", -1)])
+        m = match_reversals(claims)
+        s = summarize(m).loc["400127"]
+        assert s["reversals"] == 2
+        assert s["original_rate"] == 50.0
+        assert s["rebill_rate"] == 50.0
+        assert lag_histogram(m).loc["400127"].sum() == 1
+
+
+class TestRealData:
+    def test_every_reversal_has_a_row(self, claims_df):
+        m = match_reversals(claims_df)
+        assert len(m) == 64_102
+        assert m["reversal"].is_unique
+
+    def test_matches_are_consistent(self, claims_df):
+        m = match_reversals(claims_df)
+        for side in ("original", "rebill"):
+            matched = m[m[side] != UNMATCHED]
+            assert matched[side].is_unique
+            partners = claims_df.loc[matched[side]]
+            assert (partners["NET_CLAIM_COUNT"] == 1).all()
+            for col in ["GROUP_ID", "NDC", "DAYS_SUPPLY", "PHARMACY_STATE"]:
+                assert (partners[col].to_numpy() == matched[col].to_numpy()).all()
+        original = m[m["original"] != UNMATCHED]
+        assert (claims_df.loc[original["original"], "DATE"].to_numpy() <= original["DATE"].to_numpy()).all()
+        rebill = m[m["rebill"] != UNMATCHED]
+        assert (claims_df.loc[rebill["rebill"], "DATE"].to_numpy() > rebill["DATE"].to_numpy()).all()
@@ -0,0 +1,75 @@
+"""
+Stratified samples — estimates and confidence intervals against the exact answers.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.sampling import build, deviations, rate, read_sample, top_drugs, volume, write_sample
+
+
+@pytest.fixture(scope="module")
+def sample(merged_df):
+    return build(merged_df, fraction=0.05, min_per_stratum=5)
+
+
+def _covered(table, key, truth):
+    table = table.set_index(key)
+    truth = truth.reindex(table.index)
+    return ((table["ci_lo"] <= truth + 1e-9) & (truth - 1e-9 <= table["ci_hi"])).mean()
+
+
+def test_every_stratum_is_sampled(sample, merged_df):
+    assert sample.size == len(merged_df)
+    assert (sample.taken >= np.minimum(sample.population, 5)).all()
+    assert set(sample.rows["GROUP_ID"]) == set(merged_df["GROUP_ID"])
+    assert len(sample.rows) < len(merged_df) / 2
+
+
+def test_stratum_totals_are_exact(sample, merged_df):
+    states = volume(sample, "PHARMACY_STATE").set_index("PHARMACY_STATE")
+    assert states["claims"].to_dict() == pytest.approx(merged_df.groupby("PHARMACY_STATE").size().to_dict())
+    assert (states["se"] == 0).all()
+
+
+def test_full_sample_is_exact(merged_df):
+    full = build(merged_df, fraction=1.0)
+    got = rate(full, "reversal", "MANUFACTURER_NAME").set_index("MANUFACTURER_NAME")
+    want = merged_df.groupby("MANUFACTURER_NAME")["NET_CLAIM_COUNT"].apply(lambda s: (s == -1).mean() * 100)
+    assert got["rate_pct"].to_dict() == pytest.approx(want.to_dict())
+    assert (got["se"] == 0).all()
+
+
+def test_intervals_cover_drug_volumes_and_rates(sample, merged_df):
+    ndc = volume(sample, "NDC")
+    big = merged_df.groupby("NDC").size()
+    assert _covered(ndc[ndc["NDC"].isin(big[big >= 50].index)], "NDC", big) >= 0.85
+    adjudicated = merged_df.groupby("MANUFACTURER_NAME")["ADJUDICATED"].mean() * 100
+    assert _covered(rate(sample, "adjudication", "MANUFACTURER_NAME"), "MANUFACTURER_NAME", adjudicated) >= 0.85
+    reversed_ = merged_df.groupby("GROUP_ID")["NET_CLAIM_COUNT"].apply(lambda s: (s == -1).mean() * 100)
+    assert _covered(rate(sample, "reversal", "GROUP_ID"), "GROUP_ID", reversed_) >= 0.85
+
+
+def test_filters_and_top_drugs(sample, merged_df):
+    ks = merged_df[(merged_df["PHARMACY_STATE"] == "KS") & (merged_df["NDC"] != 65862020190)]
+    got = rate(sample, "reversal", query="state=KS").iloc[0]
+    assert got["ci_lo"] <= (ks["NET_CLAIM_COUNT"] == -1).mean() * 100 <= got["ci_hi"]
+    top = top_drugs(sample, 3, query="flagged=true")
+    assert top.iloc[0]["NDC"] == 65862020190
+    assert top["claims"].is_monotonic_decreasing
+
+
+def test_deviations_flag_september_and_november(sample):
+    found = deviations(sample, query="").set_index("period")
+    assert found.loc["2021-09", "ci_lo"] > 0 and found.loc["2021-11", "ci_hi"] < 0
+    mony = deviations(sample, "MONY")
+    assert ((mony["ci_lo"] <= mony["pct_vs_baseline"]) & (mony["pct_vs_baseline"] <= mony["ci_hi"])).all()
+
+
+def test_round_trip(sample, tmp_path):
+    path = tmp_path / "sample.csv.gz"
+    write_sample(sample, path)
+    loaded = read_sample(path)
+    assert np.array_equal(loaded.population, sample.population) and np.array_equal(loaded.taken, sample.taken)
+    pd.testing.assert_frame_equal(volume(loaded, "NDC"), volume(sample, "NDC"))